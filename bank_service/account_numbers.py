@@ -0,0 +1,112 @@
+# -------------------- account_numbers.py -------------------- #
+"""
+Collision-free account numbers.
+
+Each worker process reserves a block of serials from a row in `tabSeries`
+(on its own connection, committed immediately, so a rolled back request can
+never hand the same block out twice) and then issues numbers from memory.
+An account number is a 10-digit body derived from the serial plus a Luhn
+check digit, e.g. 1000000042 -> 10000000424.
+"""
+import os
+import threading
+
+import frappe
+
+from bank_service.banks import get_bank_settings
+
+SERIES_KEY = "BANK-ACCOUNT-NUMBER"
+NUMBER_BASE = 10**9
+DEFAULT_BLOCK_SIZE = 100
+
+
+def luhn_check_digit(digits: str) -> str:
+    total = 0
+    for i, d in enumerate(reversed(digits)):
+        n = int(d)
+        if i % 2 == 0:
+            n *= 2
+            if n > 9:
+                n -= 9
+        total += n
+    return str((10 - total % 10) % 10)
+
+
+def is_valid_account_number(number: str) -> bool:
+    """Check the Luhn digit of an allocated account number."""
+    number = str(number or "")
+    return number.isdigit() and len(number) > 1 and luhn_check_digit(number[:-1]) == number[-1]
+
+
+def format_account_number(serial: int) -> str:
+    body = str(NUMBER_BASE + serial)
+    return body + luhn_check_digit(body)
+
+
+def reserve_block(size: int):
+    """
+    Reserve `size` serials and return the range (start, end).
+    Runs on a dedicated connection and commits before returning.
+    """
+    from frappe.database import get_db
+
+    db = get_db()
+    db.connect()
+    try:
+        for _ in range(2):
+            current = db.sql("select `current` from `tabSeries` where `name` = %s for update", SERIES_KEY)
+            if current:
+                start = current[0][0] or 0
+                db.sql("update `tabSeries` set `current` = %s where `name` = %s", (start + size, SERIES_KEY))
+                db.commit()
+                return start, start + size
+            try:
+                db.sql("insert into `tabSeries` (`name`, `current`) values (%s, %s)", (SERIES_KEY, size))
+                db.commit()
+                return 0, size
+            except Exception as e:
+                # Another worker created the row first; lock it and reserve from there
+                db.rollback()
+                if not db.is_duplicate_entry(e):
+                    raise
+        raise frappe.ValidationError("Could not reserve an account number block")
+    finally:
+        db.close()
+
+
+class AccountNumberAllocator:
+    """Hands out account numbers from per-process reserved blocks, one allocator per site."""
+
+    def __init__(self, block_size=DEFAULT_BLOCK_SIZE):
+        self.block_size = block_size
+        self._next = self._end = 0
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def allocate(self) -> str:
+        with self._lock:
+            # A forked worker must not reuse the block inherited from its parent
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._next = self._end = 0
+            if self._next >= self._end:
+                self._next, self._end = reserve_block(self.block_size)
+            serial = self._next
+            self._next += 1
+        return format_account_number(serial)
+
+
+_allocators = {}
+_allocators_lock = threading.Lock()
+
+
+def get_allocator() -> AccountNumberAllocator:
+    site = frappe.local.site
+    allocator = _allocators.get(site)
+    if not allocator:
+        with _allocators_lock:
+            allocator = _allocators.get(site)
+            if not allocator:
+                block_size = get_bank_settings().account_number_block_size or DEFAULT_BLOCK_SIZE
+                allocator = _allocators[site] = AccountNumberAllocator(block_size)
+    return allocator
@@ -0,0 +1,93 @@
+# -------------------- accounts.py -------------------- #
+"""
+Hot account metadata cache.
+
+A handful of accounts take most transfers, so the few HDFC Customer fields a
+request needs are cached in two tiers: a bounded per-worker LRU with a short
+TTL in front of Frappe's Redis cache. The doc_events on HDFC Customer drop an
+account from this worker and from Redis; other workers pick the change up
+when their local entry expires (Bank Settings -> Account Cache TTL).
+Unknown accounts are never cached, so a new account is usable immediately.
+"""
+import frappe
+
+from bank_service.banks import get_bank_settings, get_generation
+from bank_service.cache import LRUCache
+
+ACCOUNT_FIELDS = ["name", "account_type", "bank_name", "erpnext_bank_account", "client_key_fingerprint"]
+ACCOUNT_CACHE_KEY = "bank_service:account:"
+DEFAULT_ACCOUNT_CACHE_SIZE = 4096
+DEFAULT_ACCOUNT_CACHE_TTL = 60
+# Redis copies are dropped on every change, so their expiry only bounds memory
+REDIS_TTL = 24 * 60 * 60
+
+_accounts = None
+
+
+def _account_cache():
+    """
+    This worker's LRU. Its size and TTL are re-read once per registry
+    generation, and the LRU is only rebuilt when they change, so a Bank
+    Settings or keyring change elsewhere does not empty it.
+    """
+    global _accounts
+
+    generation = get_generation()
+    if _accounts is not None and _accounts[0] == generation:
+        return _accounts[2]
+
+    settings = get_bank_settings()
+    config = (
+        settings.account_cache_size or DEFAULT_ACCOUNT_CACHE_SIZE,
+        settings.account_cache_ttl or DEFAULT_ACCOUNT_CACHE_TTL,
+    )
+    cache = _accounts[2] if _accounts is not None and _accounts[1] == config else LRUCache(*config)
+    _accounts = (generation, config, cache)
+    return cache
+
+
+def get_account(account_number: str):
+    """Cached metadata of an HDFC Customer (see ACCOUNT_FIELDS), or None if it does not exist."""
+    if not account_number:
+        return None
+    cache = _account_cache()
+    account = cache.get(account_number)
+    if account is not None:
+        return account
+
+    account = frappe.cache().get_value(ACCOUNT_CACHE_KEY + account_number)
+    if account is None:
+        account = frappe.db.get_value("HDFC Customer", account_number, ACCOUNT_FIELDS, as_dict=True)
+        if not account:
+            return None
+        frappe.cache().set_value(ACCOUNT_CACHE_KEY + account_number, account, expires_in_sec=REDIS_TTL)
+
+    account = frappe._dict(account)
+    cache.set(account_number, account)
+    return account
+
+
+def missing_accounts(*account_numbers) -> list:
+    """The given account numbers that are not HDFC Customers."""
+    return [account for account in account_numbers if not get_account(account)]
+
+
+def _forget(names):
+    for name in names:
+        _account_cache().pop(name)
+        frappe.cache().delete_value(ACCOUNT_CACHE_KEY + name)
+
+
+def invalidate_account(doc, method=None, *args, **kwargs):
+    """doc_events hook for HDFC Customer: forget the account here and in Redis."""
+    # after_rename passes the old and new names as well
+    names = {doc.name, *(arg for arg in args if isinstance(arg, str))}
+    _forget(names)
+    # A request that read the old row before this commit may re-populate Redis; drop it again once committed
+    after_commit = getattr(frappe.db, "after_commit", None)
+    if after_commit is not None:
+        after_commit.add(lambda: _forget(names))
+
+
+def get_account_cache_stats() -> dict:
+    return _accounts[2].stats() if _accounts else {}
@@ -0,0 +1,105 @@
+# -------------------- admission.py -------------------- #
+"""
+Admission control for the encrypted endpoints.
+
+Runs right after the request JSON is parsed and before any decryption, so a
+client over its limits costs one or two Redis round trips instead of an RSA
+operation. Two token buckets apply (tokens per second and burst, set per bank
+in Bank Settings; a rate of 0 disables a bucket):
+
+* per client IP, for every request;
+* per client key fingerprint, when the client is known without decrypting:
+  the key sent to create_bank_account, or the account behind a session_id.
+
+Buckets live in the shared store (Redis, or the in-process LocalStore used
+by tests). Throttled requests get a 429 with Retry-After.
+"""
+import json
+import math
+
+import frappe
+from werkzeug.wrappers import Response
+
+from bank_service.accounts import get_account
+from bank_service.banks import canonical_bank, get_bank_settings
+from bank_service.cache import get_store
+from bank_service.instrumentation import incr
+from bank_service.utils import get_public_key_fingerprint, get_session
+
+BUCKET_KEY_PREFIX = "bank_service:bucket:"
+DEFAULT_LIMITS = {
+    "ip": (50.0, 100),
+    "client": (10.0, 30),
+}
+
+
+def get_limits(bank_name=None) -> dict:
+    """{scope: (rate, burst)} for a bank; unset fields fall back to DEFAULT_LIMITS."""
+    settings = get_bank_settings(bank_name)
+    limits = {}
+    for scope, (default_rate, default_burst) in DEFAULT_LIMITS.items():
+        rate = settings.get(f"rate_limit_{scope}_rate")
+        burst = settings.get(f"rate_limit_{scope}_burst")
+        limits[scope] = (
+            default_rate if rate is None else float(rate),
+            default_burst if not burst else int(burst),
+        )
+    return limits
+
+
+def _client_identity(endpoint, data, session):
+    """Key fingerprint of the client, if it can be known before decrypting; else None."""
+    if session:
+        account = get_account(session["account"])
+        return account and account.client_key_fingerprint
+
+    if endpoint == "create_bank_account":
+        pem = (data.get("client_public_key") or data.get("client_public_key_file") or "").strip()
+        try:
+            return get_public_key_fingerprint(pem) if pem else None
+        except (ValueError, TypeError):
+            # An unparseable key is rejected by the endpoint's own validation
+            return None
+    return None
+
+
+def _throttled(endpoint, scope, wait):
+    incr("admission", {"endpoint": endpoint, "scope": scope, "decision": "throttled"})
+    retry_after = max(1, math.ceil(wait))
+    return Response(
+        json.dumps({"status": "fail", "message": "Too many requests", "retry_after": retry_after}),
+        status=429,
+        mimetype="application/json",
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+def admit(endpoint: str, data: dict, bank_name=None):
+    """
+    Charge the request to its buckets. Returns None when admitted, otherwise
+    a 429 Response for the endpoint to return as is. Buckets and limits are
+    those of the registered bank (see banks.canonical_bank).
+    """
+    session = None
+    if data.get("session_id"):
+        session = get_session(data["session_id"])
+    # Clients choose bank_name, so an unknown one must not open fresh buckets
+    bank_name = canonical_bank(bank_name or (session and session["bank"]))
+    limits = get_limits(bank_name)
+    store = get_store()
+
+    identities = [("ip", frappe.local.request_ip or "unknown")]
+    client = _client_identity(endpoint, data, session)
+    if client:
+        identities.append(("client", client))
+
+    for scope, identity in identities:
+        rate, burst = limits[scope]
+        if rate <= 0:
+            continue
+        allowed, wait = store.take(f"{BUCKET_KEY_PREFIX}{bank_name}:{scope}:{identity}", rate, burst)
+        if not allowed:
+            return _throttled(endpoint, scope, wait)
+
+    incr("admission", {"endpoint": endpoint, "decision": "admitted"})
+    return None
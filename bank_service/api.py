@@ -1,37 +1,110 @@
 # -------------------- api.py -------------------- #
-import json
 import base64
+import hmac
+import json
+
 import frappe
-from frappe.utils import validate_email_address
+from frappe.utils import cint, now, validate_email_address
+from werkzeug.wrappers import Response
+
+from bank_service.accounts import get_account, get_account_cache_stats, missing_accounts
+from bank_service.admission import admit
+from bank_service.balances import (
+    apply_balance_deltas,
+    create_balance_account,
+    get_account_balance,
+    transfer_deltas,
+)
+from bank_service.banks import bank_link, get_bank_settings, get_default_bank, is_registered_bank
+from bank_service.idempotency import (
+    IdempotencyConflict,
+    claim,
+    get_cached_response,
+    payload_hash,
+    store_response,
+    transfer_hash,
+)
+from bank_service.instrumentation import (
+    collect,
+    get_logger,
+    instrumented,
+    log_payload,
+    render_prometheus,
+    stage,
+)
+from bank_service.jobs import enqueue_posting, requeue_failed
+from bank_service.ledger import append_ledger_entries, get_ledger_stats
+from bank_service.locks import run_locked
+from bank_service.posting import (
+    CASH_ACCOUNT,
+    existing_accounts,
+    insert_transactions,
+    journal_entry_lines,
+    make_journal_entry,
+    new_transaction_id,
+    post_transfers,
+    transfer_accounts,
+    validate_transfer,
+)
+from bank_service.rollups import apply_rollup_deltas, get_rollups, rollup_deltas
+from bank_service.statements import (
+    DEFAULT_EXPORT_CHUNK_SIZE,
+    EXPORT_FORMATS,
+    MAX_EXPORT_CHUNK_SIZE,
+    get_statement_page,
+    new_export_encryptor,
+    serialize_statement_row,
+    stream_statement_export,
+)
+from bank_service.transfers import execute_transfer
 from bank_service.utils import (
+    cache_client_public_key,
+    decrypt_envelope,
+    decrypt_with_session_key,
+    encrypt_with_client_key,
+    encrypt_with_session_key,
+    envelope_version,
     generate_account_number,
-    validate_phone,
     generate_bank_keypair,
+    get_client_key_cache_stats,
+    get_customer_public_key,
+    get_keyring_stats,
     get_public_key_pem_pkcs8,
-    encrypt_with_client_key,
+    get_session,
+    open_session,
+    validate_phone,
 )
+from bank_service.velocity import VelocityLimitExceeded, charge_velocity, refund_velocity
 
-from frappe.utils import now
-from bank_service.utils import (
-    decrypt_with_bank_key,
-    encrypt_with_client_key,
-)
+DEFAULT_MAX_BATCH_SIZE = 5000
 
 
 
 @frappe.whitelist(allow_guest=True)
+@instrumented("create_bank_account")
 def create_bank_account():
+    endpoint = "create_bank_account"
     try:
         # ---------------- Parse request ----------------
-        raw_data = frappe.request.data or b""
-        print("Raw request data:", raw_data)
-
-        try:
-            data = json.loads(raw_data.decode("utf-8"))
-        except Exception as e:
-            return {"status": "fail", "message": f"Invalid JSON: {e}"}
-
-        print("Parsed JSON data:", data)
+        with stage(endpoint, "parse"):
+            raw_data = frappe.request.data or b""
+            try:
+                data = json.loads(raw_data.decode("utf-8"))
+            except Exception as e:
+                return {"status": "fail", "message": f"Invalid JSON: {e}"}
+
+        # Reject clients over their limits before any RSA work
+        throttled = admit(endpoint, data, bank_name=(data.get("bank_name") or "").strip() or None)
+        if throttled:
+            return throttled
+
+        log_payload("create_bank_account request", data)
+
+        # A byte-identical retry of a completed request is answered from the idempotency record
+        idempotency_key = data.get("idempotency_key")
+        cached = get_cached_response(endpoint, idempotency_key, raw_data)
+        if cached:
+            return cached
 
         # ---------------- Extract inputs ----------------
         account_name = (data.get("account_name") or "").strip()
@@ -39,172 +112,633 @@ def create_bank_account():
         email = (data.get("email") or "").strip()
         address = (data.get("address") or "").strip()
         account_type = (data.get("account_type") or "").strip()
+        bank_name = (data.get("bank_name") or "").strip() or get_default_bank()
         client_public_key = (data.get("client_public_key") or data.get("client_public_key_file") or "").strip()
 
-        print("Inputs extracted:", {
-            "account_name": account_name,
-            "phone": phone,
-            "email": email,
-            "address": address,
-            "account_type": account_type,
-            "client_public_key": client_public_key[:30] + "..." if client_public_key else ""
-        })
-
         # ---------------- Validations ----------------
-        print("Validating inputs...")
-        if not account_name:
-            return {"status": "fail", "message": "Account name required"}
-        validate_phone(phone)
-        if email:
-            validate_email_address(email, throw=True)
-        if account_type not in ("Savings", "Current"):
-            return {"status": "fail", "message": "Invalid account type"}
-        if not client_public_key.startswith("-----BEGIN"):
-            return {"status": "fail", "message": "client_public_key must be PEM format"}
-
-        # ---------------- Generate bank keypair ----------------
-        print("Generating bank keypair...")
-        bank_pub, bank_priv = generate_bank_keypair("HDFC")
-        bank_pub_pem = get_public_key_pem_pkcs8(bank_pub)
-        print("Bank public key generated.")
-        print(bank_pub_pem)
-        if client_public_key == bank_pub_pem:
-            frappe.throw("Client public key cannot be the same as bank public key")
-
-        account_no = generate_account_number()
-        while frappe.db.exists("HDFC Customer", {"account_number": account_no}):
-            account_no = generate_account_number()
-        print("Generated account number:", account_no)
-
-
-
-        print("Creating HDFC Customer record...")
+        with stage(endpoint, "validate"):
+            if not account_name:
+                return {"status": "fail", "message": "Account name required"}
+            validate_phone(phone)
+            if email:
+                validate_email_address(email, throw=True)
+            if account_type not in ("Savings", "Current"):
+                return {"status": "fail", "message": "Invalid account type"}
+            if not is_registered_bank(bank_name):
+                return {"status": "fail", "message": "Unknown bank"}
+            if not client_public_key.startswith("-----BEGIN"):
+                return {"status": "fail", "message": "client_public_key must be PEM format"}
+
+        # ---------------- Load bank keypair ----------------
+        with stage(endpoint, "keypair_load"):
+            bank_pub, bank_priv = generate_bank_keypair(bank_name)
+            bank_pub_pem = get_public_key_pem_pkcs8(bank_pub)
+            if client_public_key == bank_pub_pem:
+                frappe.throw("Client public key cannot be the same as bank public key")
+            client_key_fingerprint, client_key = cache_client_public_key(client_public_key, bank_name)
+
+        if idempotency_key:
+            request_hash = payload_hash({
+                "account_name": account_name,
+                "phone": phone,
+                "email": email,
+                "address": address,
+                "account_type": account_type,
+                "bank_name": bank_name,
+                "client_key_fingerprint": client_key_fingerprint,
+            })
+            cached = claim(endpoint, idempotency_key, client_key_fingerprint, request_hash, raw_data, bank_name)
+            if cached:
+                return cached
+
         bank_acc = frappe.new_doc("HDFC Customer")
         bank_acc.update({
             "account_name": account_name,
-            "account_number": account_no,
             "account_type": account_type,
+            "bank_name": bank_link(bank_name),
             "phone": phone,
             "email": email,
             "address": address,
-            "client_public_key": client_public_key,  
+            "client_public_key": client_public_key,
+            "client_key_fingerprint": client_key_fingerprint,
         })
-        bank_acc.insert(ignore_permissions=True)
-        print("HDFC Customer inserted:", account_no)
-
-        print("Creating ERPNext Bank Account...")
-        erp_bank_acc = frappe.new_doc("Bank Account")
-        erp_bank_acc.update({
-            "account_name": account_name,
-            "bank": "HDFC",
-            "account_type": account_type,
-            "bank_account_no": account_no,
-        })
-        erp_bank_acc.insert(ignore_permissions=True)
-        bank_acc.db_set("erpnext_bank_account", erp_bank_acc.name)
-        print("ERPNext Bank Account inserted:", erp_bank_acc.name)
+        # Allocated numbers never repeat; a clash is only possible with a legacy random number
+        for attempt in range(3):
+            with stage(endpoint, "account_number"):
+                account_no = generate_account_number()
+            bank_acc.account_number = account_no
+            frappe.db.savepoint("hdfc_customer_insert")
+            try:
+                with stage(endpoint, "insert"):
+                    bank_acc.insert(ignore_permissions=True)
+                break
+            except (frappe.DuplicateEntryError, frappe.UniqueValidationError):
+                frappe.db.rollback(save_point="hdfc_customer_insert")
+                bank_acc.name = None
+                if attempt == 2:
+                    raise
+
+        with stage(endpoint, "insert"):
+            erp_bank_acc = frappe.new_doc("Bank Account")
+            erp_bank_acc.update({
+                "account_name": account_name,
+                "bank": bank_name,
+                "account_type": account_type,
+                "bank_account_no": account_no,
+            })
+            erp_bank_acc.insert(ignore_permissions=True)
+            bank_acc.db_set("erpnext_bank_account", erp_bank_acc.name)
+            create_balance_account(account_no, bank_name)
+        get_logger().info("Bank account %s created (%s)", account_no, erp_bank_acc.name)
 
         response_payload = {
             "account_number": account_no,
             "account_name": account_name,
             "account_type": account_type,
+            "bank_name": bank_name,
             "erpnext_bank_account": erp_bank_acc.name,
             "bank_public_key": bank_pub_pem,
         }
-        print("Response payload prepared:", {k: v if k != "bank_public_key" else "PEM..." for k, v in response_payload.items()})
 
-        encrypted_response = encrypt_with_client_key(client_public_key, response_payload)
-        print("Response encrypted successfully.")
-        print("Client public key:", client_public_key[:100])
-        print("Bank public key:", bank_pub_pem[:100])
+        with stage(endpoint, "encrypt"):
+            # There is no request envelope to match here; clients opt in with "envelope": 1
+            encrypted_response = encrypt_with_client_key(client_key, response_payload, envelope=cint(data.get("envelope")))
 
-        return {"status": "success", "encrypted_response": encrypted_response}
-    
-        
+        response = {"status": "success", "encrypted_response": encrypted_response}
+        if idempotency_key:
+            store_response(endpoint, idempotency_key, client_key_fingerprint, response)
+        return response
 
+    except IdempotencyConflict as e:
+        frappe.db.rollback()
+        return {"status": "fail", "message": str(e)}
 
     except Exception as e:
+        frappe.db.rollback()
         frappe.log_error(frappe.get_traceback(), "Create Bank Account Error")
-        print("Exception occurred:", str(e))
         return {"status": "error", "message": str(e)}
 
 
+def _parse_request() -> dict:
+    """
+    Fields of an encrypted request. An application/octet-stream body is a raw
+    binary envelope, with session_id and idempotency_key in the query string.
+    """
+    raw_data = frappe.request.data or b""
+    if frappe.request.mimetype == "application/octet-stream":
+        data = frappe.request.args.to_dict()
+        data["encrypted_payload"] = raw_data
+        return data
+    return json.loads(raw_data.decode("utf-8"))
+
+
+def _decrypt_request(data: dict):
+    """
+    Decrypt the payload of a transaction request.
+    With a session_id the payload is AES-GCM under the session key; otherwise an RSA envelope.
+    Returns (payload, session, bank name, error response).
+    """
+    encrypted_payload = data.get("encrypted_payload")
+    session_id = data.get("session_id")
+
+    if not encrypted_payload:
+        return None, None, None, {"status": "fail", "message": "Missing encrypted_payload"}
 
+    if session_id:
+        session = get_session(session_id)
+        if not session:
+            return None, None, None, {"status": "fail", "message": "Session expired or unknown"}
+        return decrypt_with_session_key(session, encrypted_payload), session, session["bank"], None
 
+    bank_name, payload = decrypt_envelope(encrypted_payload)
+    return payload, None, bank_name, None
+
+
+def _encrypt_response(session, account_number, response_payload, request=None):
+    # Responses go to the key registered for the account, never to a request-supplied one
+    if session:
+        return encrypt_with_session_key(session, response_payload)
+    # and use the envelope format the request came in
+    envelope = envelope_version(request.get("encrypted_payload")) if request else None
+    return encrypt_with_client_key(get_customer_public_key(account_number), response_payload, envelope=envelope)
 
 
 @frappe.whitelist(allow_guest=True)
+@instrumented("make_transaction")
 def make_transaction():
+    endpoint = "make_transaction"
+    # The transfer is only committed when this returns, so every error path below
+    # rolls it back and refunds its velocity charge. A failure of Frappe's own commit
+    # after that is not refunded; the charge then lapses with its windows.
+    charge = None
     try:
-        raw_data = frappe.request.data or b""
-        data = json.loads(raw_data.decode("utf-8"))
-        encrypted_payload = data.get("encrypted_payload")
-        client_public_key = (data.get("client_public_key") or "").strip()
-
-        if not encrypted_payload or not client_public_key:
-            return {"status": "fail", "message": "Missing encrypted_payload or client_public_key"}
-
-        payload = decrypt_with_bank_key(encrypted_payload)
-        print("Decrypted transaction payload:", payload)
-
-        transaction_type = payload.get("transaction_type")
-        from_account = payload.get("from_account")
-        to_account = payload.get("to_account")
-        amount = payload.get("amount")
-        remarks = payload.get("remarks", "")
-
-        if transaction_type not in ("Deposit", "Account Transfer"):
-            return {"status": "fail", "message": "Invalid transaction type"}
-        if transaction_type == "Deposit" and not to_account:
-            return {"status": "fail", "message": "Deposit requires to_account"}
-        if transaction_type == "Account Transfer" and (not from_account or not to_account):
-            return {"status": "fail", "message": "Account Transfer requires both from_account and to_account"}
-
-        if transaction_type == "Deposit":
-            from_account = "Cash In Hand" 
-
-        trx = frappe.new_doc("Transactions")
-        trx.update({
-            "transaction_type": transaction_type,
-            "from_account": from_account,
-            "to_account": to_account,
-            "amount": amount,
-            "status": "Initiated",
-            "date_time": now(),
-        })
-        trx.insert(ignore_permissions=True)
-        trx_id = trx.name
-
-        je = frappe.new_doc("Journal Entry")
-        je.update({
-            "voucher_type": "Bank Entry",
-            "posting_date": now(),
-            "user_remark": remarks,
-            "accounts": [
-                {"account": from_account, "credit_in_account_currency": amount},
-                {"account": to_account, "debit_in_account_currency": amount},
-            ],
-        })
-        je.insert(ignore_permissions=True)
-        je.submit()
-
-        trx.db_set("status", "Completed")
+        with stage(endpoint, "parse"):
+            data = _parse_request()
+        throttled = admit(endpoint, data)
+        if throttled:
+            return throttled
+
+        # A byte-identical retry of a completed request is answered without decrypting anything
+        idempotency_key = data.get("idempotency_key")
+        cached = get_cached_response(endpoint, idempotency_key, data.get("encrypted_payload"))
+        if cached:
+            return cached
+
+        with stage(endpoint, "decrypt"):
+            payload, session, bank_name, error = _decrypt_request(data)
+        if error:
+            return error
+        log_payload("make_transaction payload", payload)
+
+        with stage(endpoint, "validate"):
+            transfer, error = validate_transfer(payload)
+            if not error:
+                unknown = missing_accounts(
+                    *(account for account in (transfer.from_account, transfer.to_account) if account != CASH_ACCOUNT)
+                )
+                if unknown:
+                    error = f"Unknown account: {', '.join(unknown)}"
+        if error:
+            return {"status": "fail", "message": error}
+        if session and session["account"] != transfer.initiating_account:
+            return {"status": "fail", "message": "Session does not belong to the initiating account"}
+
+        with stage(endpoint, "velocity"):
+            charge = charge_velocity(transfer.initiating_account, transfer.amount, bank_name)
+
+        idempotency_key = idempotency_key or payload.get("idempotency_key")
+
+        def claim_key():
+            # Claimed inside the locked unit, so a deadlock retry claims it again. A retry
+            # re-encrypts the request, so it is matched on the transfer, not the ciphertext
+            if idempotency_key:
+                return claim(
+                    endpoint,
+                    idempotency_key,
+                    transfer.initiating_account,
+                    transfer_hash(transfer),
+                    data.get("encrypted_payload"),
+                    bank_name,
+                )
+
+        posted = execute_transfer(transfer, bank_name, endpoint, before=claim_key)
+        if "encrypted_response" in posted:
+            # Stored response of an earlier request with this idempotency key
+            refund_velocity(charge)
+            return posted
+        trx_id, status, journal_entry = posted.transaction_id, posted.status, posted.journal_entry
 
         response_payload = {
             "transaction_id": trx_id,
-            "transaction_type": transaction_type,
-            "from_account": from_account,
-            "to_account": to_account,
-            "amount": amount,
-            "status": "Completed",
-            "journal_entry": je.name,
+            "transaction_type": transfer.transaction_type,
+            "from_account": transfer.from_account,
+            "to_account": transfer.to_account,
+            "amount": transfer.amount,
+            "status": status,
+            "journal_entry": journal_entry,
             "timestamp": now(),
         }
 
-        encrypted_response = encrypt_with_client_key(client_public_key, response_payload)
+        with stage(endpoint, "encrypt"):
+            encrypted_response = _encrypt_response(session, transfer.initiating_account, response_payload, request=data)
 
-        return {"status": "success", "encrypted_response": encrypted_response}
+        response = {"status": "success", "encrypted_response": encrypted_response}
+        if idempotency_key:
+            store_response(endpoint, idempotency_key, transfer.initiating_account, response)
+        return response
+
+    except IdempotencyConflict as e:
+        frappe.db.rollback()
+        refund_velocity(charge)
+        return {"status": "fail", "message": str(e)}
+
+    except VelocityLimitExceeded as e:
+        return {"status": "fail", "message": str(e), "retry_after": e.retry_after}
 
     except Exception as e:
+        frappe.db.rollback()
+        refund_velocity(charge)
         frappe.log_error(frappe.get_traceback(), "Transaction API Error")
         return {"status": "error", "message": str(e)}
+
+
+@frappe.whitelist(allow_guest=True)
+@instrumented("make_transactions_batch")
+def make_transactions_batch():
+    """
+    Post many transfers from one envelope in one DB transaction.
+    The decrypted payload is {"account_number": ..., "transactions": [...]}; every
+    transfer must be initiated by that account (or the session's account).
+    Each transfer is counted against the account's velocity limits; one over a
+    limit fails on its own.
+    """
+    # Velocity charges by item index, refunded for items that end up not recorded
+    charges = {}
+    try:
+        data = _parse_request()
+        throttled = admit("make_transactions_batch", data)
+        if throttled:
+            return throttled
+
+        with stage("make_transactions_batch", "decrypt"):
+            payload, session, bank_name, error = _decrypt_request(data)
+        if error:
+            return error
+
+        items = payload.get("transactions") or []
+        account_number = session["account"] if session else payload.get("account_number")
+        max_batch_size = get_bank_settings(bank_name).max_batch_size or DEFAULT_MAX_BATCH_SIZE
+
+        if not account_number or not get_account(account_number):
+            return {"status": "fail", "message": "Unknown account"}
+        if not items or not isinstance(items, list):
+            return {"status": "fail", "message": "No transactions in batch"}
+        if len(items) > max_batch_size:
+            return {"status": "fail", "message": f"Batch exceeds {max_batch_size} transactions"}
+
+        # ---------------- Validate every item up front ----------------
+        results = [None] * len(items)
+        transfers = []
+        for idx, item in enumerate(items):
+            transfer, error = validate_transfer(item if isinstance(item, dict) else {})
+            if not error and transfer.initiating_account != account_number:
+                error = "Transfer is not initiated by the batch account"
+            if error:
+                results[idx] = {"index": idx, "status": "fail", "message": error}
+                continue
+            transfer.index = idx
+            transfers.append(transfer)
+
+        known = existing_accounts([a for t in transfers for a in (t.from_account, t.to_account)])
+        valid = []
+        for transfer in transfers:
+            unknown = [a for a in (transfer.from_account, transfer.to_account) if a != CASH_ACCOUNT and a not in known]
+            if unknown:
+                results[transfer.index] = {"index": transfer.index, "status": "fail", "message": f"Unknown account {unknown[0]}"}
+            else:
+                valid.append(transfer)
+
+        with stage("make_transactions_batch", "velocity"):
+            admitted = []
+            for transfer in valid:
+                try:
+                    charges[transfer.index] = charge_velocity(transfer.initiating_account, transfer.amount, bank_name)
+                except VelocityLimitExceeded as e:
+                    results[transfer.index] = {
+                        "index": transfer.index,
+                        "status": "fail",
+                        "message": str(e),
+                        "retry_after": e.retry_after,
+                    }
+                    continue
+                admitted.append(transfer)
+            valid = admitted
+
+        # ---------------- Insert and post ----------------
+        if valid:
+            internal_ledger = get_bank_settings(bank_name).internal_ledger
+
+            def post_batch():
+                # A deadlock retry starts over, so drop what an aborted attempt left on the transfers
+                for t in valid:
+                    t.pop("error", None)
+                    t.pop("journal_entry", None)
+                with stage("make_transactions_batch", "insert"):
+                    insert_transactions(valid, status="Completed" if internal_ledger else "Initiated")
+                if internal_ledger:
+                    with stage("make_transactions_batch", "ledger"):
+                        append_ledger_entries(valid)
+                else:
+                    with stage("make_transactions_batch", "journal_entry"):
+                        post_transfers(valid, remarks=payload.get("remarks", ""))
+
+                completed = [t for t in valid if not t.get("error")]
+                failed = [t for t in valid if t.get("error")]
+                by_journal_entry = {}
+                for t in completed:
+                    if t.journal_entry:
+                        by_journal_entry.setdefault(t.journal_entry, []).append(t.name)
+                for journal_entry, names in by_journal_entry.items():
+                    frappe.db.set_value(
+                        "Transactions",
+                        {"name": ("in", names)},
+                        {"status": "Completed", "journal_entry": journal_entry, "posting_attempts": 1},
+                    )
+                if completed:
+                    apply_balance_deltas(transfer_deltas(completed))
+                    apply_rollup_deltas(rollup_deltas(completed))
+                if failed:
+                    frappe.db.delete("Transactions", {"name": ("in", [t.name for t in failed])})
+
+            run_locked("make_transactions_batch", transfer_accounts(valid), post_batch, bank_name)
+
+            for t in valid:
+                if t.get("error"):
+                    refund_velocity(charges.pop(t.index, None))
+                    results[t.index] = {"index": t.index, "status": "fail", "message": t.error}
+                else:
+                    results[t.index] = {
+                        "index": t.index,
+                        "status": "success",
+                        "transaction_id": t.name,
+                        "journal_entry": t.journal_entry,
+                    }
+
+        response_payload = {
+            "account_number": account_number,
+            "succeeded": sum(1 for r in results if r["status"] == "success"),
+            "failed": sum(1 for r in results if r["status"] == "fail"),
+            "results": results,
+            "timestamp": now(),
+        }
+        with stage("make_transactions_batch", "encrypt"):
+            encrypted_response = _encrypt_response(session, account_number, response_payload, request=data)
+
+        return {"status": "success", "encrypted_response": encrypted_response}
+
+    except Exception as e:
+        # Nothing from a half-processed batch may be committed with the error response
+        frappe.db.rollback()
+        for charge in charges.values():
+            refund_velocity(charge)
+        frappe.log_error(frappe.get_traceback(), "Batch Transaction API Error")
+        return {"status": "error", "message": str(e)}
+
+
+@frappe.whitelist(allow_guest=True)
+@instrumented("get_transaction_status")
+def get_transaction_status():
+    """Report the posting progress of a transfer to one of its parties."""
+    try:
+        data = _parse_request()
+        throttled = admit("get_transaction_status", data)
+        if throttled:
+            return throttled
+
+        payload, session, _, error = _decrypt_request(data)
+        if error:
+            return error
+
+        account_number = session["account"] if session else (payload.get("account_number") or "").strip()
+        transaction_id = payload.get("transaction_id")
+        trx = transaction_id and frappe.db.get_value(
+            "Transactions",
+            transaction_id,
+            ["name", "from_account", "to_account", "status", "journal_entry", "posting_attempts", "date_time"],
+            as_dict=True,
+        )
+        if not trx or not account_number or account_number not in (trx.from_account, trx.to_account):
+            return {"status": "fail", "message": "Unknown transaction"}
+
+        response_payload = {
+            "transaction_id": trx.name,
+            "status": trx.status,
+            "journal_entry": trx.journal_entry,
+            "posting_attempts": trx.posting_attempts,
+            "date_time": str(trx.date_time),
+            "timestamp": now(),
+        }
+        encrypted_response = _encrypt_response(session, account_number, response_payload, request=data)
+
+        return {"status": "success", "encrypted_response": encrypted_response}
+
+    except Exception as e:
+        frappe.log_error(frappe.get_traceback(), "Transaction Status API Error")
+        return {"status": "error", "message": str(e)}
+
+
+@frappe.whitelist(allow_guest=True)
+@instrumented("get_account_statement")
+def get_account_statement():
+    """Return one keyset-paginated page of the requesting account's transactions."""
+    try:
+        data = _parse_request()
+        throttled = admit("get_account_statement", data)
+        if throttled:
+            return throttled
+
+        payload, session, _, error = _decrypt_request(data)
+        if error:
+            return error
+
+        account_number = session["account"] if session else (payload.get("account_number") or "").strip()
+        if not account_number or not get_account(account_number):
+            return {"status": "fail", "message": "Unknown account"}
+
+        rows, next_cursor = get_statement_page(account_number, payload.get("cursor"), payload.get("limit"))
+
+        response_payload = {
+            "account_number": account_number,
+            "transactions": [serialize_statement_row(row) for row in rows],
+            "next_cursor": next_cursor,
+            "timestamp": now(),
+        }
+        encrypted_response = _encrypt_response(session, account_number, response_payload, request=data)
+
+        return {"status": "success", "encrypted_response": encrypted_response}
+
+    except Exception as e:
+        frappe.log_error(frappe.get_traceback(), "Account Statement API Error")
+        return {"status": "error", "message": str(e)}
+
+
+@frappe.whitelist(allow_guest=True)
+@instrumented("export_account_statement")
+def export_account_statement():
+    """
+    Stream the full history of the requesting account as NDJSON or CSV,
+    chunk-encrypted so memory stays flat however long the history is.
+    """
+    try:
+        data = _parse_request()
+        throttled = admit("export_account_statement", data)
+        if throttled:
+            return throttled
+
+        payload, session, bank_name, error = _decrypt_request(data)
+        if error:
+            return error
+
+        account_number = session["account"] if session else (payload.get("account_number") or "").strip()
+        if not account_number or not get_account(account_number):
+            return {"status": "fail", "message": "Unknown account"}
+
+        fmt = payload.get("format") or "ndjson"
+        if fmt not in EXPORT_FORMATS:
+            return {"status": "fail", "message": "format must be ndjson or csv"}
+        chunk_size = cint(payload.get("chunk_size")) or get_bank_settings(bank_name).export_chunk_size or DEFAULT_EXPORT_CHUNK_SIZE
+        chunk_size = min(max(chunk_size, 1), MAX_EXPORT_CHUNK_SIZE)
+
+        client_key = None if session else get_customer_public_key(account_number)
+        encryptor = new_export_encryptor(fmt, client_key=client_key, session=session)
+
+        return Response(
+            stream_statement_export(account_number, fmt, chunk_size, encryptor),
+            mimetype="application/octet-stream",
+            headers={"Content-Disposition": f'attachment; filename="statement-{account_number}.{fmt}.bsx"'},
+            direct_passthrough=True,
+        )
+
+    except Exception as e:
+        frappe.log_error(frappe.get_traceback(), "Statement Export API Error")
+        return {"status": "error", "message": str(e)}
+
+
+@frappe.whitelist(allow_guest=True)
+@instrumented("get_balance")
+def get_balance():
+    """Return the maintained balance of the requesting account (one row read)."""
+    try:
+        data = _parse_request()
+        throttled = admit("get_balance", data)
+        if throttled:
+            return throttled
+
+        payload, session, _, error = _decrypt_request(data)
+        if error:
+            return error
+
+        account_number = session["account"] if session else (payload.get("account_number") or "").strip()
+        balance = get_account_balance(account_number) if account_number else None
+        if balance is None:
+            return {"status": "fail", "message": "Unknown account"}
+
+        response_payload = {
+            "account_number": account_number,
+            "balance": balance,
+            "timestamp": now(),
+        }
+        encrypted_response = _encrypt_response(session, account_number, response_payload, request=data)
+
+        return {"status": "success", "encrypted_response": encrypted_response}
+
+    except Exception as e:
+        frappe.log_error(frappe.get_traceback(), "Get Balance API Error")
+        return {"status": "error", "message": str(e)}
+
+
+@frappe.whitelist(allow_guest=True)
+@instrumented("establish_session")
+def establish_session():
+    try:
+        data = _parse_request()
+        throttled = admit("establish_session", data)
+        if throttled:
+            return throttled
+        encrypted_payload = data.get("encrypted_payload")
+
+        if not encrypted_payload:
+            return {"status": "fail", "message": "Missing encrypted_payload"}
+
+        bank_name, payload = decrypt_envelope(encrypted_payload)
+        account_number = (payload.get("account_number") or "").strip()
+        if not account_number or not get_account(account_number):
+            return {"status": "fail", "message": "Unknown account"}
+
+        # The session key only reaches the holder of the account's registered private key
+        client_key = get_customer_public_key(account_number)
+        session_id, session_key, ttl = open_session(account_number, bank_name)
+
+        response_payload = {
+            "session_id": session_id,
+            "session_key": base64.b64encode(session_key).decode(),
+            "algorithm": "AES-256-GCM",
+            "expires_in": ttl,
+        }
+        encrypted_response = encrypt_with_client_key(
+            client_key, response_payload, envelope=envelope_version(encrypted_payload)
+        )
+
+        return {"status": "success", "encrypted_response": encrypted_response}
+
+    except Exception as e:
+        frappe.log_error(frappe.get_traceback(), "Establish Session Error")
+        return {"status": "error", "message": str(e)}
+
+
+@frappe.whitelist()
+def bank_keyring_stats():
+    """Hit/miss counters of the bank keyring, client key and account caches in the worker serving this request."""
+    frappe.only_for("System Manager")
+    return {
+        **get_keyring_stats(),
+        "client_keys": get_client_key_cache_stats(),
+        "accounts": get_account_cache_stats(),
+    }
+
+
+@frappe.whitelist()
+def requeue_failed_postings(transaction_ids=None):
+    """Move dead-lettered transfers back to Initiated and enqueue their posting."""
+    frappe.only_for("System Manager")
+    if isinstance(transaction_ids, str):
+        transaction_ids = json.loads(transaction_ids)
+    return {"requeued": requeue_failed(transaction_ids)}
+
+
+@frappe.whitelist()
+def account_daily_rollups(account_number, from_date, to_date):
+    """Daily inflow, outflow, transfer count and largest transfer of an account, read from its rollups."""
+    frappe.only_for("System Manager")
+    return get_rollups(account_number, from_date, to_date)
+
+
+@frappe.whitelist()
+def internal_ledger_stats():
+    """Internal ledger entries still waiting for consolidation, and the oldest one."""
+    frappe.only_for("System Manager")
+    return get_ledger_stats()
+
+
+@frappe.whitelist(allow_guest=True)
+def metrics():
+    """
+    Stage latency histograms and request counters of all workers in Prometheus text format.
+    Scrapers authenticate with "Authorization: Bearer <bank_service_metrics_token>" from site config.
+    """
+    token = frappe.conf.get("bank_service_metrics_token")
+    supplied = frappe.get_request_header("Authorization") or ""
+    if not (token and hmac.compare_digest(supplied.encode(), f"Bearer {token}".encode())):
+        frappe.only_for("System Manager")
+
+    return Response(render_prometheus(collect()), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,109 @@
+# -------------------- balances.py -------------------- #
+import frappe
+from frappe.utils import flt
+
+from bank_service.banks import get_default_bank
+from bank_service.posting import CASH_ACCOUNT
+
+REBUILD_CHUNK_SIZE = 1000
+
+
+def transfer_deltas(transfers) -> dict:
+    """Net balance change per customer account for a list of transfers."""
+    deltas = {}
+    for transfer in transfers:
+        amount = flt(transfer.amount)
+        if transfer.from_account != CASH_ACCOUNT:
+            deltas[transfer.from_account] = deltas.get(transfer.from_account, 0) - amount
+        deltas[transfer.to_account] = deltas.get(transfer.to_account, 0) + amount
+    return deltas
+
+
+def apply_balance_deltas(deltas: dict):
+    """
+    Add deltas to `Customer Accounts`.balance in the current DB transaction.
+    Each update is a single atomic increment; rows are touched in account order
+    so concurrent transfers lock them in the same order.
+    """
+    for account in sorted(deltas):
+        if not deltas[account]:
+            continue
+        frappe.db.sql(
+            """update `tabCustomer Accounts` set balance = balance + %s where name = %s""",
+            (deltas[account], account),
+        )
+
+
+def get_account_balance(account_number: str):
+    return frappe.db.get_value("Customer Accounts", account_number, "balance")
+
+
+def create_balance_account(account_number: str, bank_name=None):
+    doc = frappe.new_doc("Customer Accounts")
+    doc.update({
+        "bank_account_number": account_number,
+        "bank_name": bank_name or get_default_bank(),
+        "balance": 0,
+    })
+    doc.insert(ignore_permissions=True)
+    return doc
+
+
+def rebuild_balances(chunk_size=REBUILD_CHUNK_SIZE, commit=True):
+    """
+    Recompute every balance from Completed `Transactions`, chunk by chunk of
+    accounts. Missing `Customer Accounts` rows are created first.
+
+    Each chunk's balance rows are locked by its first statement, before
+    anything else is read in that DB transaction. The InnoDB snapshot the sums
+    are read from is therefore taken only once the locks are held: a transfer
+    that committed earlier is in the sums, and one that commits later waits
+    for the locks and applies its delta on top of the rebuilt value. With
+    commit=False the caller must not have read anything in its transaction
+    yet, or the sums come from that older snapshot.
+    """
+    missing = frappe.db.sql(
+        """select c.name, c.bank_name from `tabHDFC Customer` c
+        left join `tabCustomer Accounts` a on a.name = c.name
+        where a.name is null"""
+    )
+    # An empty bank on the customer means the default bank, as in create_balance_account
+    for account_number, bank_name in missing:
+        create_balance_account(account_number, bank_name)
+    if commit:
+        frappe.db.commit()
+
+    rebuilt = 0
+    last = ""
+    while True:
+        # A locking read does not start the snapshot; the sums below do
+        accounts = frappe.db.sql(
+            """select name from `tabCustomer Accounts` where name > %s order by name limit %s for update""",
+            (last, chunk_size),
+            pluck=True,
+        )
+        if not accounts:
+            break
+        last = accounts[-1]
+
+        credits = dict(frappe.db.sql(
+            """select to_account, sum(amount) from `tabTransactions`
+            where status = 'Completed' and to_account in %s group by to_account""",
+            (tuple(accounts),),
+        ))
+        debits = dict(frappe.db.sql(
+            """select from_account, sum(amount) from `tabTransactions`
+            where status = 'Completed' and from_account in %s group by from_account""",
+            (tuple(accounts),),
+        ))
+        for account in accounts:
+            balance = flt(credits.get(account)) - flt(debits.get(account))
+            frappe.db.sql(
+                """update `tabCustomer Accounts` set balance = %s where name = %s""",
+                (balance, account),
+            )
+        rebuilt += len(accounts)
+        if commit:
+            frappe.db.commit()
+
+    return {"accounts": rebuilt, "created": len(missing)}
@@ -0,0 +1,8 @@
+// Copyright (c) 2026, nareshkanna and contributors
+// For license information, please see license.txt
+
+// frappe.ui.form.on("Account Daily Rollup", {
+// 	refresh(frm) {
+
+// 	},
+// });
@@ -0,0 +1,14 @@
+# Copyright (c) 2026, nareshkanna and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class AccountDailyRollup(Document):
+	pass
+
+
+def on_doctype_update():
+	# Analytics read an account's days by date range
+	frappe.db.add_index("Account Daily Rollup", ["account", "date"])
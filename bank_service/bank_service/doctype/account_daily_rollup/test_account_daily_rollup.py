@@ -0,0 +1,28 @@
+# Copyright (c) 2026, nareshkanna and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import getdate
+
+from bank_service.posting import CASH_ACCOUNT
+from bank_service.rollups import rollup_deltas
+
+
+class TestAccountDailyRollup(FrappeTestCase):
+	def test_rollup_deltas_per_account_and_day(self):
+		transfers = [
+			frappe._dict(from_account=CASH_ACCOUNT, to_account="A", amount=100, date_time="2026-10-16 23:59:00"),
+			frappe._dict(from_account="A", to_account="B", amount=30, date_time="2026-10-17 00:01:00"),
+			frappe._dict(from_account="A", to_account="B", amount=45, date_time="2026-10-17 09:30:00"),
+		]
+		day1, day2 = getdate("2026-10-16"), getdate("2026-10-17")
+
+		self.assertEqual(
+			rollup_deltas(transfers),
+			{
+				("A", day1): [100, 0, 1, 100],
+				("A", day2): [0, 75, 2, 45],
+				("B", day2): [75, 0, 2, 45],
+			},
+		)
@@ -1,9 +1,92 @@
 # Copyright (c) 2025, nareshkanna and Contributors
 # See license.txt
 
-# import frappe
+import itertools
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from bank_service.account_numbers import AccountNumberAllocator, is_valid_account_number, luhn_check_digit
+from bank_service.utils import generate_account_number
+
+
+def _allocate_in_process(site, sites_path, count):
+	frappe.init(site=site, sites_path=sites_path)
+	frappe.connect()
+	try:
+		allocator = AccountNumberAllocator(block_size=7)
+		return [allocator.allocate() for _ in range(count)]
+	finally:
+		frappe.destroy()
+
+
+def _generate_in_process(site, sites_path, count):
+	"""Issue `count` numbers the way create_bank_account does, through the site's allocator."""
+	frappe.init(site=site, sites_path=sites_path)
+	frappe.connect()
+	try:
+		# Small blocks so the workers' reservations interleave
+		with patch(
+			"bank_service.account_numbers.get_bank_settings",
+			return_value=frappe._dict(account_number_block_size=5),
+		):
+			return [generate_account_number() for _ in range(count)]
+	finally:
+		frappe.destroy()
+
 
 class TestHDFCCustomer(FrappeTestCase):
-	pass
+	def test_luhn_check_digit(self):
+		self.assertEqual(luhn_check_digit("7992739871"), "3")
+		self.assertTrue(is_valid_account_number("79927398713"))
+		self.assertFalse(is_valid_account_number("79927398710"))
+
+	def test_concurrent_allocation_is_unique(self):
+		processes, per_process = 6, 200
+		ctx = multiprocessing.get_context("spawn")
+		with ctx.Pool(processes) as pool:
+			batches = pool.starmap(
+				_allocate_in_process,
+				[(frappe.local.site, frappe.local.sites_path, per_process)] * processes,
+			)
+
+		numbers = [n for batch in batches for n in batch]
+		self.assertEqual(len(numbers), processes * per_process)
+		self.assertEqual(len(set(numbers)), len(numbers))
+		self.assertTrue(all(is_valid_account_number(n) for n in numbers))
+
+	def test_concurrent_generate_account_number_is_unique(self):
+		processes, per_process = 6, 100
+		ctx = multiprocessing.get_context("spawn")
+		with ctx.Pool(processes) as pool:
+			batches = pool.starmap(
+				_generate_in_process,
+				[(frappe.local.site, frappe.local.sites_path, per_process)] * processes,
+			)
+
+		numbers = [n for batch in batches for n in batch]
+		self.assertEqual(len(set(numbers)), processes * per_process)
+		self.assertTrue(all(is_valid_account_number(n) for n in numbers))
+		# Each worker issues increasing numbers from its own blocks
+		for batch in batches:
+			self.assertEqual(batch, sorted(batch))
+
+	def test_threads_share_an_allocator_without_collisions(self):
+		# gthread workers allocate from one process-wide allocator; blocks come from a fake series
+		blocks = itertools.count()
+
+		def reserve_block(size):
+			start = next(blocks) * size
+			return start, start + size
+
+		allocator = AccountNumberAllocator(block_size=3)
+		with patch("bank_service.account_numbers.reserve_block", side_effect=reserve_block):
+			with ThreadPoolExecutor(8) as pool:
+				numbers = list(pool.map(lambda _: allocator.allocate(), range(400)))
+
+		self.assertEqual(len(set(numbers)), 400)
+		# No serial was skipped either: every reserved block was used up in full
+		self.assertEqual(next(blocks), 134)
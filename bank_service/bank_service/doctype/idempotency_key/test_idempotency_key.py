@@ -0,0 +1,101 @@
+# Copyright (c) 2026, nareshkanna and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+import rsa
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa as crypto_rsa
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_to_date, now
+
+from bank_service.idempotency import (
+	IdempotencyConflict,
+	_key_name,
+	claim,
+	get_cached_response,
+	payload_hash,
+	purge_expired_keys,
+	store_response,
+	transfer_hash,
+)
+from bank_service.posting import validate_transfer
+from bank_service.utils import _load_rsa_private_key, open_envelope, seal_envelope
+
+ENDPOINT = "test_idempotency"
+RESPONSE = {"status": "success", "encrypted_response": "abc"}
+TRANSFER = {"transaction_type": "Account Transfer", "from_account": "ACC1", "to_account": "ACC2", "amount": 100}
+
+
+class TestIdempotencyKey(FrappeTestCase):
+	def setUp(self):
+		frappe.db.delete("Idempotency Key", {"endpoint": ENDPOINT})
+		self.request_hash = payload_hash({"amount": 100})
+
+	def test_claim_then_replay_stored_response(self):
+		self.assertIsNone(claim(ENDPOINT, "key-1", "ACC1", self.request_hash, b"envelope-1"))
+		self.assertTrue(frappe.db.exists("Idempotency Key", _key_name(ENDPOINT, "ACC1", "key-1")))
+		# No response yet: a duplicate must not be processed a second time
+		with self.assertRaises(IdempotencyConflict):
+			claim(ENDPOINT, "key-1", "ACC1", self.request_hash)
+
+		store_response(ENDPOINT, "key-1", "ACC1", RESPONSE)
+		self.assertEqual(claim(ENDPOINT, "key-1", "ACC1", self.request_hash), RESPONSE)
+		self.assertEqual(get_cached_response(ENDPOINT, "key-1", b"envelope-1"), RESPONSE)
+		self.assertEqual(get_cached_response(ENDPOINT, "key-1", b"envelope-1", account="ACC1"), RESPONSE)
+		self.assertIsNone(get_cached_response(ENDPOINT, "key-2", b"envelope-1"))
+		self.assertIsNone(get_cached_response(ENDPOINT, "key-1", b"envelope-2"))
+
+	def test_retry_with_fresh_envelope_replays(self):
+		crypto_key = crypto_rsa.generate_private_key(public_exponent=65537, key_size=2048)
+		bank_key = _load_rsa_private_key(
+			crypto_key.private_bytes(
+				serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+			)
+		)
+		payload = {**TRANSFER, "idempotency_key": "key-1"}
+		# Envelope encryption is randomized, so a retry never repeats the first request's bytes
+		envelopes = [seal_envelope(crypto_key.public_key(), payload) for _ in range(2)]
+		self.assertNotEqual(*envelopes)
+
+		with patch(
+			"bank_service.utils.load_bank_keys", return_value=(rsa.PublicKey(bank_key.n, bank_key.e), bank_key)
+		):
+			transfers = [validate_transfer(open_envelope(raw, "HDFC")[1])[0] for raw in envelopes]
+		first, retry = transfers
+		self.assertEqual(transfer_hash(first), transfer_hash(retry))
+
+		self.assertIsNone(claim(ENDPOINT, "key-1", first.initiating_account, transfer_hash(first), envelopes[0]))
+		store_response(ENDPOINT, "key-1", first.initiating_account, RESPONSE)
+		self.assertEqual(
+			claim(ENDPOINT, "key-1", retry.initiating_account, transfer_hash(retry), envelopes[1]), RESPONSE
+		)
+
+	def test_key_reused_for_other_request_conflicts(self):
+		claim(ENDPOINT, "key-1", "ACC1", self.request_hash)
+		store_response(ENDPOINT, "key-1", "ACC1", RESPONSE)
+		other_hash = transfer_hash(validate_transfer({**TRANSFER, "amount": 200})[0])
+
+		with self.assertRaises(IdempotencyConflict):
+			claim(ENDPOINT, "key-1", "ACC1", other_hash)
+
+	def test_keys_are_per_account(self):
+		claim(ENDPOINT, "key-1", "ACC1", self.request_hash, b"envelope-1")
+		store_response(ENDPOINT, "key-1", "ACC1", RESPONSE)
+
+		# Another client's key of the same value is its own record, and never sees ACC1's response
+		self.assertIsNone(claim(ENDPOINT, "key-1", "ACC2", self.request_hash, b"envelope-2"))
+		self.assertIsNone(get_cached_response(ENDPOINT, "key-1", b"envelope-1", account="ACC2"))
+		self.assertIsNone(get_cached_response(ENDPOINT, "key-1", b"envelope-2"))
+
+	def test_expired_key_is_purged_and_reusable(self):
+		claim(ENDPOINT, "key-1", "ACC1", self.request_hash, b"envelope-1")
+		store_response(ENDPOINT, "key-1", "ACC1", RESPONSE)
+		name = _key_name(ENDPOINT, "ACC1", "key-1")
+		frappe.db.set_value("Idempotency Key", name, "expires_on", add_to_date(now(), hours=-1))
+
+		self.assertIsNone(get_cached_response(ENDPOINT, "key-1", b"envelope-1"))
+		purge_expired_keys()
+		self.assertFalse(frappe.db.exists("Idempotency Key", name))
+		self.assertIsNone(claim(ENDPOINT, "key-1", "ACC1", payload_hash({"amount": 200})))
@@ -0,0 +1,14 @@
+# Copyright (c) 2026, nareshkanna and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class LedgerEntry(Document):
+	pass
+
+
+def on_doctype_update():
+	# Consolidation scans the Pending entries up to a cutoff
+	frappe.db.add_index("Ledger Entry", ["status", "posted_on"])
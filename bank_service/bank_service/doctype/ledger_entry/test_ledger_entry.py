@@ -0,0 +1,30 @@
+# Copyright (c) 2026, nareshkanna and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from bank_service.ledger import net_transfer
+from bank_service.posting import CASH_ACCOUNT
+
+
+class TestLedgerEntry(FrappeTestCase):
+	def test_net_transfer_per_account_pair(self):
+		entries = [
+			frappe._dict(from_account="A", to_account="B", amount=30),
+			frappe._dict(from_account="B", to_account="A", amount=45.5),
+			frappe._dict(from_account="A", to_account="B", amount=5),
+		]
+		self.assertEqual(net_transfer(entries, "A", "B"), {"from_account": "B", "to_account": "A", "amount": 10.5})
+		self.assertEqual(net_transfer(entries[:1], "A", "B"), {"from_account": "A", "to_account": "B", "amount": 30})
+
+		deposits = [frappe._dict(from_account=CASH_ACCOUNT, to_account="A", amount=0.1) for _ in range(3)]
+		self.assertEqual(net_transfer(deposits, "A", CASH_ACCOUNT)["amount"], 0.3)
+
+	def test_cancelling_transfers_net_to_nothing(self):
+		entries = [
+			frappe._dict(from_account="A", to_account="B", amount=0.1),
+			frappe._dict(from_account="A", to_account="B", amount=0.2),
+			frappe._dict(from_account="B", to_account="A", amount=0.3),
+		]
+		self.assertIsNone(net_transfer(entries, "A", "B"))
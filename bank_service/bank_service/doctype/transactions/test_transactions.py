@@ -4,6 +4,79 @@
 # import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from bank_service.posting import CASH_ACCOUNT
+from bank_service.reconcile import (
+	BALANCE_COLUMNS,
+	JOURNAL_ENTRY_COLUMNS,
+	JOURNAL_LINE_COLUMNS,
+	TRANSACTION_COLUMNS,
+	find_discrepancies,
+	iter_report_records,
+	to_columns,
+)
+
 
 class TestTransactions(FrappeTestCase):
-	pass
+	def test_reconciliation_flags_each_discrepancy(self):
+		transactions = to_columns(
+			[
+				# Consistent deposit and transfer sharing a consolidated entry
+				("T1", "Completed", CASH_ACCOUNT, "A", 100, "JE1", 0, 0),
+				("T2", "Completed", "A", "B", 40, "JE1", 0, 0),
+				# Completed without a Journal Entry, and with a cancelled one
+				("T3", "Completed", "A", "B", 5, None, 0, 0),
+				("T4", "Completed", "B", "A", 7, "JE2", 0, 0),
+				# Journal Entry posted 30 instead of 25
+				("T5", "Completed", "B", "C", 25, "JE3", 0, 0),
+				# Stuck after its Journal Entry was submitted, and recent (not stuck yet)
+				("T6", "Initiated", "C", "A", 3, "JE4", 1, 0),
+				("T7", "Initiated", "C", "A", 3, None, 0, 0),
+				# Internal ledger: netted to zero, pending (recent and stuck), consolidated into one netted entry
+				("T8", "Completed", "A", "B", 10, None, 0, 2),
+				("T9", "Completed", "B", "A", 10, None, 0, 2),
+				("T10", "Completed", "A", "B", 4, None, 0, 1),
+				("T11", "Completed", "B", "A", 4, None, 1, 1),
+				("T12", "Completed", "A", "C", 10, "JE6", 0, 0),
+				("T13", "Completed", "C", "A", 4, "JE6", 0, 0),
+			],
+			TRANSACTION_COLUMNS,
+		)
+		journal_entries = to_columns(
+			[("JE1", 1), ("JE2", 2), ("JE3", 1), ("JE4", 1), ("JE5", 1), ("JE6", 1)],
+			JOURNAL_ENTRY_COLUMNS,
+		)
+		journal_lines = to_columns(
+			[
+				("L1", "JE1", CASH_ACCOUNT, -100),
+				("L2", "JE1", "A", 100),
+				("L3", "JE1", "A", -40),
+				("L4", "JE1", "B", 40),
+				("L5", "JE3", "B", -30),
+				("L6", "JE3", "C", 30),
+				("L7", "JE4", "C", -3),
+				("L8", "JE4", "A", 3),
+				("L9", "JE5", "A", 1),
+				("L10", "JE6", "A", -6),
+				("L11", "JE6", "C", 6),
+			],
+			JOURNAL_LINE_COLUMNS,
+		)
+		# Ledger: A = 100 - 40 - 5 + 7 - 6 = 56, B = 40 + 5 - 7 - 25 = 13, C = 25 + 6 = 31
+		balances = to_columns([("A", 56), ("B", 13.5)], BALANCE_COLUMNS)
+
+		records = list(iter_report_records(find_discrepancies(transactions, journal_entries, journal_lines, balances)))
+
+		self.assertEqual(
+			records,
+			[
+				{"type": "missing_posting", "transaction": "T3", "journal_entry": None, "amount": 5.0},
+				{"type": "missing_posting", "transaction": "T4", "journal_entry": "JE2", "amount": 7.0},
+				{"type": "stuck", "transaction": "T6", "journal_entry_submitted": True},
+				{"type": "stuck", "transaction": "T11", "journal_entry_submitted": False},
+				{"type": "amount_mismatch", "journal_entry": "JE3", "account": "B", "expected": -25.0, "posted": -30.0},
+				{"type": "amount_mismatch", "journal_entry": "JE3", "account": "C", "expected": 25.0, "posted": 30.0},
+				{"type": "orphaned_journal_entry", "journal_entry": "JE5"},
+				{"type": "balance_drift", "account": "B", "stored": 13.5, "ledger": 13.0},
+				{"type": "balance_drift", "account": "C", "stored": None, "ledger": 31.0},
+			],
+		)
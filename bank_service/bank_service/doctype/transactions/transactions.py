@@ -1,9 +1,15 @@
 # Copyright (c) 2025, nareshkanna and contributors
 # For license information, please see license.txt
 
-# import frappe
+import frappe
 from frappe.model.document import Document
 
 
 class Transactions(Document):
 	pass
+
+
+def on_doctype_update():
+	# Per-account history is read by (account, date_time) in both directions
+	frappe.db.add_index("Transactions", ["from_account", "date_time"])
+	frappe.db.add_index("Transactions", ["to_account", "date_time"])
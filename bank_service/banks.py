@@ -0,0 +1,174 @@
+# -------------------- banks.py -------------------- #
+"""
+Registry of the banks hosted on this site.
+
+Each bank is a Bank Settings record (named by bank_name). Settings and the
+key id -> bank index are cached in two tiers: a per-worker dict in front of
+Frappe's Redis cache. Both tiers are keyed by a shared generation that the
+Bank Settings doc_events bump, so a change is picked up by every worker on
+its next lookup without any per-request DB read.
+"""
+import threading
+
+import frappe
+
+DEFAULT_BANK = "HDFC"
+GENERATION_KEY = "bank_service:keyring_generation"
+SETTINGS_CACHE_KEY = "bank_service:bank_settings"
+KEY_INDEX_CACHE_KEY = "bank_service:bank_key_ids"
+# Redis entries are per generation, so they only need to outlive a quiet period
+REDIS_TTL = 24 * 60 * 60
+
+# The generation is None until the first bump, so "not built" needs its own marker
+_NOT_BUILT = object()
+
+_settings = {}
+_key_index = {"generation": _NOT_BUILT, "banks": {}}
+_bank_names = {"generation": _NOT_BUILT, "names": {}}
+_lock = threading.Lock()
+
+
+def get_default_bank() -> str:
+    """Bank used when a request does not name one ("bank_service_default_bank" in site_config.json)."""
+    return frappe.conf.get("bank_service_default_bank") or DEFAULT_BANK
+
+
+def get_generation():
+    return frappe.cache().get_value(GENERATION_KEY)
+
+
+def bump_generation():
+    """Invalidate every worker's registry and keyring entries."""
+    frappe.cache().set_value(GENERATION_KEY, frappe.generate_hash(length=10))
+
+
+def _load_settings(bank_name):
+    settings = frappe.db.get_value("Bank Settings", bank_name, "*", as_dict=True) or frappe._dict()
+    # The private key never leaves the DB row; only whether keys are configured is cached
+    settings.has_keys = bool(settings.get("bank_public_key") and settings.get("bank_private_key"))
+    settings.pop("bank_private_key", None)
+    settings.velocity_limits = frappe.get_all(
+        "Bank Velocity Limit",
+        filters={"parenttype": "Bank Settings", "parent": bank_name},
+        fields=["account_type", "window", "max_count", "max_amount"],
+        order_by="idx asc",
+    )
+    return settings
+
+
+def get_bank_settings(bank_name=None):
+    """Bank Settings of a bank as a dict (empty for an unknown bank), without the private key."""
+    bank_name = bank_name or get_default_bank()
+    generation = get_generation()
+    cached = _settings.get(bank_name)
+    if cached and cached[0] == generation:
+        return cached[1]
+
+    cache_key = f"{SETTINGS_CACHE_KEY}:{generation}:{bank_name}"
+    settings = frappe.cache().get_value(cache_key)
+    if settings is None:
+        settings = _load_settings(bank_name)
+        # Only registered names (and the default bank, looked up on every request) are
+        # cached, so unknown or case-variant names from requests cannot grow the caches
+        if settings.get("name") != bank_name and bank_name != get_default_bank():
+            return settings
+        frappe.cache().set_value(cache_key, settings, expires_in_sec=REDIS_TTL)
+    settings = frappe._dict(settings)
+
+    _settings[bank_name] = (generation, settings)
+    return settings
+
+
+def get_bank_keypair_pems(bank_name):
+    """(public PEM, private PEM) configured on the Bank Settings record, or (None, None)."""
+    pems = frappe.db.get_value("Bank Settings", bank_name, ["bank_public_key", "bank_private_key"])
+    return tuple(pems) if pems else (None, None)
+
+
+def is_registered_bank(bank_name) -> bool:
+    return bank_name == get_default_bank() or bool(get_bank_settings(bank_name).get("name"))
+
+
+def bank_link(bank_name):
+    """Value of a Bank Settings link for a bank: empty for the default bank, which may have no record."""
+    return None if bank_name == get_default_bank() else bank_name
+
+
+def get_bank_names() -> list:
+    names = frappe.get_all("Bank Settings", pluck="name")
+    default = get_default_bank()
+    return names if default in names else [default, *names]
+
+
+def canonical_bank(bank_name) -> str:
+    """
+    Registered name of a bank named by a client (case-insensitive), or the
+    default bank for an empty or unknown name. Reads the DB once per generation.
+    """
+    if not bank_name:
+        return get_default_bank()
+    generation = get_generation()
+    with _lock:
+        if _bank_names["generation"] == generation:
+            return _bank_names["names"].get(bank_name.casefold()) or get_default_bank()
+
+    names = {name.casefold(): name for name in get_bank_names()}
+    with _lock:
+        _bank_names.update(generation=generation, names=names)
+    return names.get(bank_name.casefold()) or get_default_bank()
+
+
+def _build_key_index() -> dict:
+    from bank_service.utils import get_bank_key_id
+
+    index = {}
+    for bank_name in get_bank_names():
+        try:
+            index[get_bank_key_id(bank_name).hex()] = bank_name
+        except FileNotFoundError:
+            # A registered bank without keys yet cannot be addressed
+            continue
+    return index
+
+
+def resolve_bank(key_id: bytes):
+    """Name of the bank whose public key has this key id, or None."""
+    generation = get_generation()
+    with _lock:
+        if _key_index["generation"] == generation:
+            # The index holds every bank of this generation, so a miss is final
+            return _key_index["banks"].get(key_id.hex())
+
+    cache_key = f"{KEY_INDEX_CACHE_KEY}:{generation}"
+    index = frappe.cache().get_value(cache_key)
+    if index is None:
+        index = _build_key_index()
+        frappe.cache().set_value(cache_key, index, expires_in_sec=REDIS_TTL)
+
+    with _lock:
+        _key_index.update(generation=generation, banks=index)
+    return index.get(key_id.hex())
+
+
+def clear_bank_registry():
+    """Drop this worker's registry entries."""
+    with _lock:
+        _settings.clear()
+        _key_index.update(generation=_NOT_BUILT, banks={})
+        _bank_names.update(generation=_NOT_BUILT, names={})
+
+
+def invalidate_bank_registry(doc, method=None, *args, **kwargs):
+    """
+    doc_events hook for Bank Settings: clear this worker's registry and keyring
+    and bump the shared generation so every other worker reloads on its next lookup.
+    """
+    from bank_service.utils import clear_bank_keyring
+
+    clear_bank_registry()
+    clear_bank_keyring()
+    bump_generation()
+    # A worker reloading before this transaction commits would cache the old row; bump again once it has
+    after_commit = getattr(frappe.db, "after_commit", None)
+    if after_commit is not None:
+        after_commit.add(bump_generation)
@@ -0,0 +1,25 @@
+"""
+Benchmarks for the banking API. Each module exposes run() returning a JSON
+serializable dict, so results can be saved and compared across commits.
+"""
+
+
+def percentile(sorted_samples, pct):
+    if not sorted_samples:
+        return None
+    idx = min(len(sorted_samples) - 1, max(0, round(pct / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[idx]
+
+
+def summarize(samples, time_budget):
+    """Latency percentiles in ms and throughput for `samples` (seconds) taken over `time_budget` seconds."""
+    ordered = sorted(samples)
+    ms = lambda v: None if v is None else round(v * 1000, 4)  # noqa: E731
+    return {
+        "count": len(ordered),
+        "throughput": round(len(ordered) / time_budget, 1) if time_budget else None,
+        "mean_ms": ms(sum(ordered) / len(ordered)) if ordered else None,
+        "p50_ms": ms(percentile(ordered, 50)),
+        "p95_ms": ms(percentile(ordered, 95)),
+        "p99_ms": ms(percentile(ordered, 99)),
+    }
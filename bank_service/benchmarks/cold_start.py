@@ -0,0 +1,71 @@
+# -------------------- cold_start.py -------------------- #
+"""
+Cold-start cost of a worker.
+
+    bench --site <your-site> execute bank_service.benchmarks.cold_start.run
+
+import: importing bank_service.api in a fresh interpreter, outside any site
+context (as gunicorn and RQ do before their first request).
+
+first_request: decrypting one request envelope with every per-process cache
+dropped, cold and right after bank_service.warmup.warm_up (which a warmed
+worker has already run in the background).
+"""
+import subprocess
+import sys
+import time
+
+import frappe
+
+from bank_service import accounts, utils
+from bank_service.banks import clear_bank_registry, get_default_bank
+from bank_service.benchmarks import summarize
+from bank_service.benchmarks.load import build_envelope
+from bank_service.benchmarks.micro import SAMPLE_PAYLOAD
+from bank_service.utils import (
+    clear_bank_keyring,
+    decrypt_with_bank_key,
+    generate_bank_keypair,
+    get_public_key_pem_pkcs8,
+)
+from bank_service.warmup import warm_up
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import bank_service.api; print(time.perf_counter() - t)"
+
+
+def _import_seconds():
+    out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def _drop_process_caches():
+    clear_bank_keyring()
+    clear_bank_registry()
+    utils._rsa_backends.clear()
+    utils._bank_key_ids.clear()
+    accounts._accounts = None
+
+
+def _first_request(envelope, warm):
+    _drop_process_caches()
+    if warm:
+        warm_up()
+    start = time.perf_counter()
+    decrypt_with_bank_key(envelope)
+    return time.perf_counter() - start
+
+
+def run(imports=5, iterations=20):
+    """Return import and first-request latency percentiles (ms)."""
+    pubkey, _ = generate_bank_keypair(get_default_bank())
+    envelope = build_envelope(get_public_key_pem_pkcs8(pubkey), SAMPLE_PAYLOAD)
+
+    import_samples = [_import_seconds() for _ in range(imports)]
+    cold = [_first_request(envelope, warm=False) for _ in range(iterations)]
+    warm = [_first_request(envelope, warm=True) for _ in range(iterations)]
+    return {
+        "site": frappe.local.site,
+        "import": summarize(import_samples, time_budget=sum(import_samples)),
+        "first_request_cold": summarize(cold, time_budget=sum(cold)),
+        "first_request_warm": summarize(warm, time_budget=sum(warm)),
+    }
@@ -0,0 +1,293 @@
+# -------------------- load.py -------------------- #
+"""
+End-to-end load driver for create_bank_account and make_transaction.
+
+It runs outside the bench process (only cryptography and requests are
+needed) and talks HTTP to a local site:
+
+    python -m bank_service.benchmarks.load --url http://mysite.localhost:8000 \\
+        --accounts 50 --transactions 2000 --concurrency 16 --output load.json
+
+Client keypairs are generated up front, accounts are created concurrently,
+then transfers between those accounts are driven with the RSA envelope (or,
+with --session, over AES-GCM sessions). The JSON report holds throughput
+and p50/p95/p99 latency per endpoint along with the run parameters and the
+current git commit.
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import random
+import struct
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives import padding as sym_padding
+from cryptography.hazmat.primitives.asymmetric import padding as asym_padding
+from cryptography.hazmat.primitives.asymmetric import rsa as crypto_rsa
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from bank_service.benchmarks import summarize
+
+OAEP = asym_padding.OAEP(mgf=asym_padding.MGF1(algorithm=hashes.SHA256()), algorithm=hashes.SHA256(), label=None)
+
+# Mirrors the binary envelope in bank_service.utils; kept local so the driver runs without frappe
+ENVELOPE_HEADER = struct.Struct(">3sBB8sHB")
+ENVELOPE_KEY_ALG_IDS = {"RSA1_5": 1, "RSA-OAEP-256": 2}
+
+
+# ------------------- Client-side crypto ------------------- #
+def build_envelope(bank_pub_pem: str, payload: dict, alg="RSA1_5") -> str:
+    """Encrypt a request payload the way a client does for decrypt_with_bank_key."""
+    bank_pub = serialization.load_pem_public_key(bank_pub_pem.encode())
+    aes_key, iv = os.urandom(32), os.urandom(16)
+
+    padder = sym_padding.PKCS7(128).padder()
+    padded = padder.update(json.dumps(payload).encode()) + padder.finalize()
+    encryptor = Cipher(algorithms.AES(aes_key), modes.CBC(iv)).encryptor()
+    ciphertext = encryptor.update(padded) + encryptor.finalize()
+
+    wrapped = bank_pub.encrypt(aes_key, OAEP if alg == "RSA-OAEP-256" else asym_padding.PKCS1v15())
+    envelope = {
+        "key": base64.b64encode(wrapped).decode(),
+        "iv": base64.b64encode(iv).decode(),
+        "data": base64.b64encode(ciphertext).decode(),
+    }
+    if alg != "RSA1_5":
+        envelope["alg"] = alg
+    return base64.b64encode(json.dumps(envelope).encode()).decode()
+
+
+def build_binary_envelope(bank_pub_pem: str, payload: dict, alg="RSA1_5") -> str:
+    """Encrypt a request payload as a version 1 binary envelope, base64 encoded once."""
+    bank_pub = serialization.load_pem_public_key(bank_pub_pem.encode())
+    der = bank_pub.public_bytes(serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)
+    aes_key, nonce = os.urandom(32), os.urandom(12)
+    wrapped = bank_pub.encrypt(aes_key, OAEP if alg == "RSA-OAEP-256" else asym_padding.PKCS1v15())
+    header = ENVELOPE_HEADER.pack(
+        b"BSE", 1, ENVELOPE_KEY_ALG_IDS[alg], hashlib.sha256(der).digest()[:8], len(wrapped), len(nonce)
+    )
+    ciphertext = AESGCM(aes_key).encrypt(nonce, json.dumps(payload).encode(), header)
+    return base64.b64encode(header + wrapped + nonce + ciphertext).decode()
+
+
+def open_envelope(client_key, encrypted_response: str) -> dict:
+    """Decrypt a response produced by encrypt_with_client_key (either envelope format)."""
+    raw = base64.b64decode(encrypted_response)
+    if raw[:3] == b"BSE":
+        _, _, _, _, key_len, nonce_len = ENVELOPE_HEADER.unpack_from(raw)
+        offset = ENVELOPE_HEADER.size
+        aes_key = client_key.decrypt(raw[offset:offset + key_len], OAEP)
+        nonce = raw[offset + key_len:offset + key_len + nonce_len]
+        return json.loads(AESGCM(aes_key).decrypt(nonce, raw[offset + key_len + nonce_len:], raw[:offset]))
+
+    envelope = json.loads(raw)
+    aes_key = client_key.decrypt(base64.b64decode(envelope["key"]), OAEP)
+    decryptor = Cipher(algorithms.AES(aes_key), modes.CBC(base64.b64decode(envelope["iv"]))).decryptor()
+    padded = decryptor.update(base64.b64decode(envelope["data"])) + decryptor.finalize()
+    unpadder = sym_padding.PKCS7(128).unpadder()
+    return json.loads(unpadder.update(padded) + unpadder.finalize())
+
+
+def seal_session(session: dict, payload: dict) -> str:
+    nonce = os.urandom(12)
+    aad = f"{session['session_id']}:request".encode()
+    return base64.b64encode(nonce + AESGCM(session["key"]).encrypt(nonce, json.dumps(payload).encode(), aad)).decode()
+
+
+def open_session(session: dict, encrypted_response: str) -> dict:
+    raw = base64.b64decode(encrypted_response)
+    aad = f"{session['session_id']}:response".encode()
+    return json.loads(AESGCM(session["key"]).decrypt(raw[:12], raw[12:], aad))
+
+
+# ------------------- Driver ------------------- #
+class LoadDriver:
+    def __init__(self, url, concurrency=8, timeout=30, alg="RSA1_5", binary=False):
+        self.url = url.rstrip("/")
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.alg = alg
+        self.binary = binary
+        self.samples = {}
+        self.outcomes = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _http(self):
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def call(self, method: str, body: dict) -> dict:
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            resp = self._http().post(f"{self.url}/api/method/bank_service.api.{method}", json=body, timeout=self.timeout)
+            if resp.status_code == 429:
+                outcome = "throttled"
+                return {}
+            result = resp.json().get("message") or {}
+            outcome = result.get("status", f"http_{resp.status_code}")
+            return result
+        except (requests.RequestException, ValueError):
+            return {}
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.samples.setdefault(method, []).append(elapsed)
+                outcomes = self.outcomes.setdefault(method, {})
+                outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    def create_account(self, idx):
+        client_key = crypto_rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        pem = client_key.public_key().public_bytes(
+            encoding=serialization.Encoding.PEM, format=serialization.PublicFormat.SubjectPublicKeyInfo
+        ).decode()
+        result = self.call("create_bank_account", {
+            "account_name": f"Load Test {idx} {random.randrange(10**6)}",
+            "phone": f"9{random.randrange(10**9):09d}",
+            "email": f"load{idx}@example.com",
+            "address": "Chennai",
+            "account_type": random.choice(("Savings", "Current")),
+            "client_public_key": pem,
+            "envelope": 1 if self.binary else 0,
+        })
+        if result.get("status") != "success":
+            return None
+        created = open_envelope(client_key, result["encrypted_response"])
+        return {"key": client_key, "account_number": created["account_number"], "bank_public_key": created["bank_public_key"]}
+
+    def seal(self, account, payload):
+        seal = build_binary_envelope if self.binary else build_envelope
+        return seal(account["bank_public_key"], payload, self.alg)
+
+    def establish_session(self, account):
+        envelope = self.seal(account, {"account_number": account["account_number"]})
+        result = self.call("establish_session", {"encrypted_payload": envelope})
+        if result.get("status") != "success":
+            return None
+        opened = open_envelope(account["key"], result["encrypted_response"])
+        return {"session_id": opened["session_id"], "key": base64.b64decode(opened["session_key"])}
+
+    def transfer(self, account, to_account, session=None):
+        payload = {
+            "transaction_type": random.choice(("Deposit", "Account Transfer")),
+            "from_account": account["account_number"],
+            "to_account": to_account,
+            "amount": round(random.uniform(1, 5000), 2),
+            "remarks": "load test",
+        }
+        if payload["transaction_type"] == "Deposit":
+            payload["to_account"] = account["account_number"]
+
+        if session:
+            body = {"session_id": session["session_id"], "encrypted_payload": seal_session(session, payload)}
+        else:
+            body = {"encrypted_payload": self.seal(account, payload)}
+        result = self.call("make_transaction", body)
+        if result.get("status") == "success":
+            # Decrypt like a real client would; this runs after the request timing has been recorded
+            if session:
+                open_session(session, result["encrypted_response"])
+            else:
+                open_envelope(account["key"], result["encrypted_response"])
+
+    def phase(self, fn, args_list):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            results = list(pool.map(lambda args: fn(*args), args_list))
+        return results, time.perf_counter() - start
+
+    def report(self, durations: dict) -> dict:
+        return {
+            method: {**summarize(samples, durations.get(method)), "outcomes": self.outcomes.get(method, {})}
+            for method, samples in self.samples.items()
+        }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=os.path.dirname(__file__), stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(url, accounts=20, transactions=500, concurrency=8, use_session=False, alg="RSA1_5", binary=False, timeout=30):
+    driver = LoadDriver(url, concurrency=concurrency, timeout=timeout, alg=alg, binary=binary)
+    durations = {}
+
+    created, durations["create_bank_account"] = driver.phase(driver.create_account, [(i,) for i in range(accounts)])
+    created = [a for a in created if a]
+    if not created:
+        return {"error": "no accounts could be created", "results": driver.report(durations)}
+
+    sessions = [None] * len(created)
+    if use_session:
+        sessions, durations["establish_session"] = driver.phase(driver.establish_session, [(a,) for a in created])
+
+    jobs = []
+    for _ in range(transactions):
+        idx = random.randrange(len(created))
+        jobs.append((created[idx], random.choice(created)["account_number"], sessions[idx]))
+    _, durations["make_transaction"] = driver.phase(driver.transfer, jobs)
+
+    return {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "params": {
+            "url": url,
+            "accounts": accounts,
+            "transactions": transactions,
+            "concurrency": concurrency,
+            "session": use_session,
+            "alg": alg,
+            "envelope": "binary" if binary else "legacy",
+        },
+        "results": driver.report(durations),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", required=True, help="Site base URL, e.g. http://mysite.localhost:8000")
+    parser.add_argument("--accounts", type=int, default=20)
+    parser.add_argument("--transactions", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--session", action="store_true", help="Use establish_session and AES-GCM transfers")
+    parser.add_argument("--alg", choices=("RSA1_5", "RSA-OAEP-256"), default="RSA1_5")
+    parser.add_argument("--binary", action="store_true", help="Send version 1 binary envelopes instead of base64 JSON")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = run(
+        args.url,
+        accounts=args.accounts,
+        transactions=args.transactions,
+        concurrency=args.concurrency,
+        use_session=args.session,
+        alg=args.alg,
+        binary=args.binary,
+        timeout=args.timeout,
+    )
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        sys.stdout.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# -------------------- micro.py -------------------- #
+"""
+Microbenchmarks for the per-request helpers in bank_service.utils.
+
+    bench --site <your-site> execute bank_service.benchmarks.micro.run
+    bench --site <your-site> execute bank_service.benchmarks.micro.run --kwargs "{'iterations': 2000}"
+
+generate_account_number draws real serials from the site's account number
+sequence (a few blocks per run); numbers skipped that way are never reused.
+"""
+import os
+import time
+
+import frappe
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa as crypto_rsa
+
+from bank_service.benchmarks import summarize
+from bank_service.benchmarks.load import build_binary_envelope, build_envelope
+from bank_service.cache import get_store
+from bank_service.utils import (
+    ENVELOPE_V1,
+    decrypt_with_bank_key,
+    encrypt_with_client_key,
+    generate_account_number,
+    generate_bank_keypair,
+    get_public_key_pem_pkcs8,
+    validate_phone,
+)
+
+SAMPLE_PAYLOAD = {
+    "transaction_type": "Account Transfer",
+    "from_account": "10000000424",
+    "to_account": "10000000432",
+    "amount": 1500.0,
+    "remarks": "benchmark",
+}
+
+
+def _time(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples, time_budget=sum(samples))
+
+
+def _invalid_phone():
+    try:
+        validate_phone("98765-4321")
+    except frappe.ValidationError:
+        frappe.clear_messages()
+
+
+def _velocity_check():
+    # Limits high enough that every call is counted, like an admitted transfer
+    get_store().charge_windows(
+        "bank_service:velocity:benchmark", ((60, 10**9, 0), (3600, 10**9, 0), (86400, 0, 10**15)), 150000, time.time()
+    )
+
+
+def run(iterations=500, account_numbers=1000):
+    """Return latency percentiles (ms) and ops/s for each helper."""
+    client_key = crypto_rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    client_pem = client_key.public_key().public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo,
+    ).decode()
+    client_pub = client_key.public_key()
+
+    bank_pub, _ = generate_bank_keypair("HDFC")
+    bank_pub_pem = get_public_key_pem_pkcs8(bank_pub)
+    envelopes = [build_envelope(bank_pub_pem, SAMPLE_PAYLOAD) for _ in range(iterations)]
+    envelope_iter = iter(envelopes)
+    binary_envelopes = iter([build_binary_envelope(bank_pub_pem, SAMPLE_PAYLOAD) for _ in range(iterations)])
+
+    return {
+        "iterations": iterations,
+        "encrypt_with_client_key (PEM)": _time(lambda: encrypt_with_client_key(client_pem, SAMPLE_PAYLOAD), iterations),
+        "encrypt_with_client_key (parsed key)": _time(
+            lambda: encrypt_with_client_key(client_pub, SAMPLE_PAYLOAD), iterations
+        ),
+        "encrypt_with_client_key (binary envelope)": _time(
+            lambda: encrypt_with_client_key(client_pub, SAMPLE_PAYLOAD, envelope=ENVELOPE_V1), iterations
+        ),
+        "decrypt_with_bank_key": _time(lambda: decrypt_with_bank_key(next(envelope_iter)), iterations),
+        "decrypt_with_bank_key (binary envelope)": _time(
+            lambda: decrypt_with_bank_key(next(binary_envelopes)), iterations
+        ),
+        "generate_account_number": _time(generate_account_number, account_numbers),
+        "validate_phone (valid)": _time(lambda: validate_phone("9876543210"), iterations * 10),
+        "validate_phone (invalid)": _time(_invalid_phone, iterations * 10),
+        "velocity check (3 windows)": _time(_velocity_check, iterations * 10),
+        "os.urandom(32) (reference)": _time(lambda: os.urandom(32), iterations * 10),
+    }
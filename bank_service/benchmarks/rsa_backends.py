@@ -0,0 +1,83 @@
+# -------------------- rsa_backends.py -------------------- #
+"""
+Compare the asymmetric backends on the bank private-key operation.
+
+Run against a site with:
+
+    bench --site <your-site> execute bank_service.benchmarks.rsa_backends.run
+    bench --site <your-site> execute bank_service.benchmarks.rsa_backends.run --kwargs "{'iterations': 500}"
+"""
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import rsa
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding as asym_padding
+
+from bank_service.utils import (
+    RSA_BACKENDS,
+    RSA_OAEP_SHA256,
+    RSA_PKCS1V15,
+    get_public_key_pem_pkcs8,
+    get_rsa_backend,
+)
+
+
+def _wrapped_keys(pubkey, count):
+    """Build `count` AES keys wrapped with each envelope the server accepts."""
+    crypto_pub = serialization.load_pem_public_key(get_public_key_pem_pkcs8(pubkey).encode())
+    oaep = asym_padding.OAEP(
+        mgf=asym_padding.MGF1(algorithm=hashes.SHA256()),
+        algorithm=hashes.SHA256(),
+        label=None
+    )
+    keys = [os.urandom(32) for _ in range(count)]
+    return {
+        RSA_PKCS1V15: [rsa.encrypt(k, pubkey) for k in keys],
+        RSA_OAEP_SHA256: [crypto_pub.encrypt(k, oaep) for k in keys],
+    }
+
+
+def _latency(backend, ciphertexts, privkey, alg):
+    samples = []
+    for ct in ciphertexts:
+        start = time.perf_counter()
+        backend.decrypt(ct, privkey, alg)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {
+        "mean_ms": round(statistics.fmean(samples) * 1000, 4),
+        "p50_ms": round(samples[len(samples) // 2] * 1000, 4),
+        "p99_ms": round(samples[int(len(samples) * 0.99) - 1] * 1000, 4),
+    }
+
+
+def _throughput(backend, ciphertexts, privkey, alg, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda ct: backend.decrypt(ct, privkey, alg), ciphertexts))
+    return round(len(ciphertexts) / (time.perf_counter() - start), 1)
+
+
+def run(iterations=200, threads=(1, 2, 4, 8), key_size=2048):
+    """Return per-operation latency and threaded throughput (ops/s) for every backend."""
+    pubkey, privkey = rsa.newkeys(key_size)
+    wrapped = _wrapped_keys(pubkey, iterations)
+
+    results = {"iterations": iterations, "key_size": key_size, "backends": {}}
+    for name in RSA_BACKENDS:
+        backend = get_rsa_backend(name)
+        backend.decrypt(wrapped[RSA_PKCS1V15][0], privkey)  # warm up (key conversion)
+        results["backends"][name] = {
+            alg: {
+                "latency": _latency(backend, cts, privkey, alg),
+                "throughput": {
+                    str(n): _throughput(backend, cts, privkey, alg, n) for n in threads
+                },
+            }
+            for alg, cts in wrapped.items()
+        }
+    return results
+
@@ -0,0 +1,98 @@
+# -------------------- statement_export.py -------------------- #
+"""
+Peak memory and throughput of the streaming statement export versus
+encrypting the whole history in one encrypt_with_client_key call.
+
+Rows are synthetic (no database), so this measures the export pipeline itself:
+
+    bench --site <your-site> execute bank_service.benchmarks.statement_export.run
+    bench --site <your-site> execute bank_service.benchmarks.statement_export.run --kwargs "{'rows': 1000000, 'baseline': False}"
+"""
+import io
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import frappe
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa as crypto_rsa
+
+from bank_service.statements import (
+    DEFAULT_EXPORT_CHUNK_SIZE,
+    decrypt_export,
+    iter_encrypted_export,
+    new_export_encryptor,
+    serialize_statement_row,
+)
+from bank_service.utils import encrypt_with_client_key
+
+
+def _synthetic_chunks(rows, chunk_size):
+    start = datetime(2025, 1, 1)
+    for offset in range(0, rows, chunk_size):
+        yield [
+            frappe._dict(
+                name=f"TXN{i:012d}",
+                transaction_type="Account Transfer",
+                direction="debit" if i % 2 else "credit",
+                from_account="10000000424",
+                to_account="10000000432",
+                amount=100.0 + i % 1000,
+                status="Completed",
+                date_time=start + timedelta(seconds=i),
+                remarks="payroll",
+            )
+            for i in range(offset, min(offset + chunk_size, rows))
+        ]
+
+
+def _measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, {"seconds": round(elapsed, 3), "peak_mb": round(peak / 2**20, 2)}
+
+
+def run(rows=1_000_000, chunk_size=DEFAULT_EXPORT_CHUNK_SIZE, fmt="ndjson", baseline=True, verify=True):
+    client_key = crypto_rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    public_key = client_key.public_key()
+    results = {"rows": rows, "chunk_size": chunk_size, "format": fmt}
+
+    def streamed():
+        out_bytes = 0
+        encryptor = new_export_encryptor(fmt, client_key=public_key)
+        for part in iter_encrypted_export(_synthetic_chunks(rows, chunk_size), fmt, encryptor):
+            out_bytes += len(part)
+        return out_bytes
+
+    out_bytes, results["streaming"] = _measure(streamed)
+    results["streaming"]["output_mb"] = round(out_bytes / 2**20, 2)
+
+    if baseline:
+        def whole():
+            history = [serialize_statement_row(row) for chunk in _synthetic_chunks(rows, chunk_size) for row in chunk]
+            return len(encrypt_with_client_key(public_key, {"transactions": history}))
+
+        out_bytes, results["single_envelope"] = _measure(whole)
+        results["single_envelope"]["output_mb"] = round(out_bytes / 2**20, 2)
+
+    if verify:
+        # Round-trip a small export to make sure the framing decrypts
+        encryptor = new_export_encryptor(fmt, client_key=public_key)
+        blob = b"".join(iter_encrypted_export(_synthetic_chunks(25, 10), fmt, encryptor))
+        unwrap = lambda mode, wrapped: client_key.decrypt(wrapped, _oaep())  # noqa: E731
+        results["verified_rows"] = sum(
+            chunk.count(b"\n") for chunk in decrypt_export(io.BytesIO(blob), unwrap)
+        ) - (1 if fmt == "csv" else 0)
+
+    return results
+
+
+def _oaep():
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding
+
+    return padding.OAEP(mgf=padding.MGF1(algorithm=hashes.SHA256()), algorithm=hashes.SHA256(), label=None)
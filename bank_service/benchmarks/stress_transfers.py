@@ -0,0 +1,160 @@
+# -------------------- stress_transfers.py -------------------- #
+"""
+Concurrent transfers on a few hot accounts.
+
+    bench --site <your-site> execute bank_service.benchmarks.stress_transfers.run
+    bench --site <your-site> execute bank_service.benchmarks.stress_transfers.run --kwargs "{'processes': 16}"
+
+Each worker process connects to the site and runs `transfers` Account
+Transfers between random pairs of the hot accounts (the first `accounts`
+Customer Accounts unless given) through transfers.execute_transfer,
+committing each one. Afterwards it checks that:
+
+- every transfer a worker committed has exactly one Transactions row, and no
+  other row carries this run's tag,
+- every row is Completed with a submitted Journal Entry whose lines balance
+  and match the amount (synchronous posting only),
+- each hot account's balance moved by exactly the net of the completed
+  transfers.
+
+The rows and Journal Entries it creates are real and stay on the site.
+"""
+import multiprocessing
+import random
+import time
+
+import frappe
+from frappe.utils import flt
+
+from bank_service.balances import get_account_balance
+from bank_service.benchmarks import summarize
+from bank_service.locks import TRANSIENT_LOCK_ERRORS
+from bank_service.posting import validate_transfer
+
+
+def _worker(site, sites_path, run_id, worker, accounts, transfers, results):
+    frappe.init(site=site, sites_path=sites_path)
+    frappe.connect()
+    from bank_service.transfers import execute_transfer
+
+    committed, failed, attempts, samples = [], 0, 0, []
+    try:
+        for i in range(transfers):
+            from_account, to_account = random.sample(accounts, 2)
+            transfer, _ = validate_transfer({
+                "transaction_type": "Account Transfer",
+                "from_account": from_account,
+                "to_account": to_account,
+                "amount": random.randint(1, 1000),
+                "remarks": f"stress:{run_id}:{worker}:{i}",
+            })
+
+            def count_attempt():
+                nonlocal attempts
+                attempts += 1
+
+            start = time.perf_counter()
+            try:
+                posted = execute_transfer(transfer, endpoint="stress_transfers", before=count_attempt)
+                frappe.db.commit()
+            except TRANSIENT_LOCK_ERRORS:
+                frappe.db.rollback()
+                failed += 1
+                continue
+            samples.append(time.perf_counter() - start)
+            committed.append((posted.transaction_id, transfer.remarks))
+    finally:
+        frappe.destroy()
+    results.put({"committed": committed, "failed": failed, "attempts": attempts, "samples": samples})
+
+
+def _check_rows(run_id, committed):
+    problems = []
+    rows = frappe.get_all(
+        "Transactions",
+        filters={"remarks": ("like", f"stress:{run_id}:%")},
+        fields=["name", "remarks", "status", "journal_entry", "from_account", "to_account", "amount"],
+    )
+    by_remarks = {}
+    for row in rows:
+        by_remarks.setdefault(row.remarks, []).append(row)
+
+    expected = {remarks: name for name, remarks in committed}
+    for remarks, found in by_remarks.items():
+        if remarks not in expected:
+            problems.append(f"{remarks}: {len(found)} row(s) for a transfer no worker committed")
+        elif len(found) != 1:
+            problems.append(f"{remarks}: {len(found)} rows")
+    for remarks in expected.keys() - by_remarks.keys():
+        problems.append(f"{remarks}: committed but missing")
+
+    for row in rows:
+        if row.status != "Completed":
+            problems.append(f"{row.name}: {row.status}")
+            continue
+        je = frappe.db.get_value("Journal Entry", row.journal_entry, "docstatus")
+        debit, credit = frappe.db.sql(
+            """select sum(debit_in_account_currency), sum(credit_in_account_currency)
+            from `tabJournal Entry Account` where parent = %s""",
+            (row.journal_entry,),
+        )[0]
+        if je != 1 or flt(debit) != flt(row.amount) or flt(credit) != flt(row.amount):
+            problems.append(f"{row.name}: journal entry {row.journal_entry} does not match")
+    return rows, problems
+
+
+def run(processes=8, transfers=200, accounts=4):
+    """Run the stress test and return throughput, retries and any consistency problems."""
+    if isinstance(accounts, int):
+        accounts = frappe.get_all("Customer Accounts", order_by="name asc", limit=accounts, pluck="name")
+    if len(accounts) < 2:
+        frappe.throw("Need at least two customer accounts")
+    run_id = frappe.generate_hash(length=8)
+    before = {account: flt(get_account_balance(account)) for account in accounts}
+
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    workers = [
+        ctx.Process(
+            target=_worker,
+            args=(frappe.local.site, frappe.local.sites_path, run_id, worker, accounts, transfers, results),
+        )
+        for worker in range(processes)
+    ]
+    start = time.perf_counter()
+    for p in workers:
+        p.start()
+    outcomes = [results.get() for _ in workers]
+    for p in workers:
+        p.join()
+    elapsed = time.perf_counter() - start
+
+    committed = [c for o in outcomes for c in o["committed"]]
+    samples = [s for o in outcomes for s in o["samples"]]
+    # New snapshot, so the workers' commits are visible
+    frappe.db.rollback()
+    rows, problems = _check_rows(run_id, committed)
+
+    net = dict.fromkeys(accounts, 0.0)
+    for row in rows:
+        if row.status == "Completed":
+            net[row.from_account] -= flt(row.amount)
+            net[row.to_account] += flt(row.amount)
+    for account in accounts:
+        moved = flt(get_account_balance(account)) - before[account]
+        if abs(moved - net[account]) > 0.005:
+            problems.append(f"{account}: balance moved {moved}, transfers net {net[account]}")
+
+    attempts = sum(o["attempts"] for o in outcomes)
+    return {
+        "site": frappe.local.site,
+        "run_id": run_id,
+        "accounts": accounts,
+        "processes": processes,
+        "committed": len(committed),
+        "failed": sum(o["failed"] for o in outcomes),
+        "retries": attempts - len(committed) - sum(o["failed"] for o in outcomes),
+        "transfers_per_second": round(len(committed) / elapsed, 1),
+        "latency": summarize(samples, time_budget=elapsed),
+        "problems": problems,
+    }
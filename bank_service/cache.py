@@ -0,0 +1,322 @@
+# -------------------- cache.py -------------------- #
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import ClassVar
+
+import frappe
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded LRU mapping for per-worker caches.
+    Entries optionally expire `ttl` seconds after they were stored.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = max(int(maxsize), 1)
+        self.ttl = ttl or None
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[0] if entry else None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class LocalStore:
+    """
+    In-process stand-in for RedisStore, used by tests and single-worker setups.
+    Enable with frappe.flags.bank_service_local_store or the
+    "bank_service_local_store" site config key.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        entry = self._data.get(key)
+        if entry and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key)
+        return entry[0] if entry else None
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+
+    def add(self, key, value, ttl=None) -> bool:
+        """Set `key` only if it does not exist yet; return whether it was set."""
+        with self._lock:
+            if self._live(key):
+                return False
+            self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def take(self, key, rate: float, burst: float, cost=1):
+        """Take `cost` tokens from a token bucket; return (allowed, seconds until enough tokens)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._live(key)
+            tokens, last = entry[0] if entry else (burst, now)
+            tokens = min(burst, tokens + (now - last) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._data[key] = ((tokens, now), now + burst / rate + 1)
+        return allowed, 0.0 if allowed else (cost - tokens) / rate
+
+    def charge_windows(self, key, windows, amount: int, now: float):
+        """
+        Count one transfer of `amount` in every sliding window of `windows`
+        ((seconds, max count, max amount) each; 0 is no limit), unless that
+        would exceed one. Returns None when counted, otherwise (index of the
+        refusing window, seconds until its current bucket ends).
+        """
+        with self._lock:
+            entry = self._live(key)
+            state = dict(entry[0]) if entry else {}
+            slid = []
+            for index, (size, max_count, max_amount) in enumerate(windows):
+                bucket, count, total, prev_count, prev_total = slide_window(state.get(size), size, now)
+                weight = max(0.0, 1 - (now - bucket * size) / size)
+                if (max_count and prev_count * weight + count + 1 > max_count) or (
+                    max_amount and prev_total * weight + total + amount > max_amount
+                ):
+                    return index, (bucket + 1) * size - now
+                slid.append((size, (bucket, count + 1, total + amount, prev_count, prev_total)))
+            state.update(slid)
+            self._data[key] = (state, time.monotonic() + 2 * max(size for size, _, _ in windows))
+        return None
+
+    def refund_windows(self, key, windows, amount: int, at: float):
+        """Take back a transfer counted by charge_windows at `at`."""
+        with self._lock:
+            entry = self._live(key)
+            if not entry:
+                return
+            state = entry[0]
+            for size, _, _ in windows:
+                if size not in state:
+                    continue
+                bucket, count, total, prev_count, prev_total = state[size]
+                charged = int(at // size)
+                if bucket == charged:
+                    count, total = max(0, count - 1), max(0, total - amount)
+                elif bucket == charged + 1:
+                    prev_count, prev_total = max(0, prev_count - 1), max(0, prev_total - amount)
+                state[size] = (bucket, count, total, prev_count, prev_total)
+
+
+def slide_window(window_state, size: int, now: float):
+    """
+    (bucket, count, amount, previous count, previous amount) of a sliding
+    window counter at `now`, rolled forward from its stored state.
+    """
+    bucket = int(now // size)
+    if not window_state:
+        return bucket, 0, 0, 0, 0
+    stored, count, total, prev_count, prev_total = window_state
+    if stored >= bucket:
+        # Another worker's clock may be slightly ahead
+        return stored, count, total, prev_count, prev_total
+    if stored == bucket - 1:
+        return bucket, 0, 0, count, total
+    return bucket, 0, 0, 0, 0
+
+
+# Refill and take in one round trip. The caller's clock is used because TIME
+# before a write is rejected by Redis versions that replicate scripts verbatim.
+TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local state = redis.call("HMGET", KEYS[1], "tokens", "ts")
+local tokens = tonumber(state[1]) or burst
+local last = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - last) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    wait = (cost - tokens) / rate
+end
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "ts", tostring(now))
+redis.call("EXPIRE", KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(wait)}
+"""
+
+# Sliding window counters: per window, the count and amount of the current
+# fixed bucket plus the previous one, weighted by how much of it still
+# overlaps the window. All windows are checked before any is charged.
+# ARGV: now, amount, then (seconds, max count, max amount) per window.
+VELOCITY_CHARGE_LUA = """
+local now = tonumber(ARGV[1])
+local amount = tonumber(ARGV[2])
+local slid = {}
+local ttl = 0
+for i = 1, (#ARGV - 2) / 3 do
+    local size = tonumber(ARGV[3 * i])
+    local max_count = tonumber(ARGV[3 * i + 1])
+    local max_amount = tonumber(ARGV[3 * i + 2])
+    local bucket = math.floor(now / size)
+    local s = redis.call("HMGET", KEYS[1], size .. ":b", size .. ":c", size .. ":a", size .. ":pc", size .. ":pa")
+    local stored = tonumber(s[1])
+    local count, total = tonumber(s[2]) or 0, tonumber(s[3]) or 0
+    local prev_count, prev_total = tonumber(s[4]) or 0, tonumber(s[5]) or 0
+    if stored == nil or stored < bucket - 1 then
+        count, total, prev_count, prev_total = 0, 0, 0, 0
+    elseif stored == bucket - 1 then
+        count, total, prev_count, prev_total = 0, 0, count, total
+    else
+        bucket = stored
+    end
+    local weight = math.max(0, 1 - (now - bucket * size) / size)
+    if (max_count > 0 and prev_count * weight + count + 1 > max_count)
+        or (max_amount > 0 and prev_total * weight + total + amount > max_amount) then
+        return {i - 1, tostring((bucket + 1) * size - now)}
+    end
+    slid[i] = {size, bucket, count + 1, total + amount, prev_count, prev_total}
+    ttl = math.max(ttl, 2 * size)
+end
+for _, w in ipairs(slid) do
+    redis.call("HSET", KEYS[1], w[1] .. ":b", w[2], w[1] .. ":c", w[3], w[1] .. ":a", w[4],
+        w[1] .. ":pc", w[5], w[1] .. ":pa", w[6])
+end
+redis.call("EXPIRE", KEYS[1], ttl)
+return {-1, "0"}
+"""
+
+# ARGV: charged at, amount, then the window sizes
+VELOCITY_REFUND_LUA = """
+local at = tonumber(ARGV[1])
+local amount = tonumber(ARGV[2])
+for i = 3, #ARGV do
+    local size = ARGV[i]
+    local stored = tonumber(redis.call("HGET", KEYS[1], size .. ":b"))
+    local charged = math.floor(at / tonumber(size))
+    local prefix = nil
+    if stored == charged then
+        prefix = ""
+    elseif stored == charged + 1 then
+        prefix = "p"
+    end
+    if prefix then
+        local count = tonumber(redis.call("HGET", KEYS[1], size .. ":" .. prefix .. "c")) or 0
+        local total = tonumber(redis.call("HGET", KEYS[1], size .. ":" .. prefix .. "a")) or 0
+        redis.call("HSET", KEYS[1], size .. ":" .. prefix .. "c", math.max(0, count - 1),
+            size .. ":" .. prefix .. "a", math.max(0, total - amount))
+    end
+end
+return 0
+"""
+
+
+class RedisStore:
+    """TTL-bounded key/value store on Frappe's Redis cache, shared by all workers."""
+
+    _scripts: ClassVar[dict] = {}
+
+    def _script(self, name, source):
+        cache = frappe.cache()
+        script = self._scripts.get(name)
+        if script is None or script.registered_client is not cache:
+            script = self._scripts[name] = cache.register_script(source)
+        return cache, script
+
+    def get(self, key):
+        return frappe.cache().get_value(key, expires=True)
+
+    def set(self, key, value, ttl=None):
+        frappe.cache().set_value(key, value, expires_in_sec=ttl)
+
+    def add(self, key, value, ttl=None) -> bool:
+        """Set `key` only if it does not exist yet (SET NX); return whether it was set."""
+        cache = frappe.cache()
+        return bool(cache.set(cache.make_key(key), pickle.dumps(value), nx=True, ex=ttl))
+
+    def delete(self, key):
+        frappe.cache().delete_value(key)
+
+    def take(self, key, rate: float, burst: float, cost=1):
+        """Take `cost` tokens from a token bucket; return (allowed, seconds until enough tokens)."""
+        cache, script = self._script("token_bucket", TOKEN_BUCKET_LUA)
+        allowed, wait = script(keys=[cache.make_key(key)], args=[rate, burst, cost, time.time()])
+        return bool(allowed), float(wait)
+
+    def charge_windows(self, key, windows, amount: int, now: float):
+        """See LocalStore.charge_windows; one round trip."""
+        cache, script = self._script("velocity_charge", VELOCITY_CHARGE_LUA)
+        args = [now, amount]
+        for window in windows:
+            args.extend(window)
+        index, wait = script(keys=[cache.make_key(key)], args=args)
+        return None if index < 0 else (int(index), float(wait))
+
+    def refund_windows(self, key, windows, amount: int, at: float):
+        cache, script = self._script("velocity_refund", VELOCITY_REFUND_LUA)
+        script(keys=[cache.make_key(key)], args=[at, amount, *(size for size, _, _ in windows)])
+
+
+_local_store = LocalStore()
+_redis_store = RedisStore()
+
+
+def get_store():
+    if frappe.flags.bank_service_local_store or frappe.conf.get("bank_service_local_store"):
+        return _local_store
+    return _redis_store
@@ -0,0 +1,172 @@
+import click
+from frappe.commands import get_site, pass_context
+
+
+@click.command("rebuild-account-balances")
+@click.option("--chunk-size", default=1000, help="Accounts recomputed per commit")
+@pass_context
+def rebuild_account_balances(context, chunk_size):
+    "Recompute Customer Accounts balances from completed Transactions"
+    import frappe
+
+    from bank_service.balances import rebuild_balances
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        result = rebuild_balances(chunk_size=chunk_size)
+        click.echo(f"Rebuilt {result['accounts']} balances ({result['created']} accounts created)")
+    finally:
+        frappe.destroy()
+
+
+@click.command("backfill-account-rollups")
+@click.option("--chunk-size", default=1000, help="Accounts rebuilt per commit")
+@click.option("--background", is_flag=True, help="Enqueue on the long queue instead of running here")
+@pass_context
+def backfill_account_rollups(context, chunk_size, background):
+    "Rebuild Account Daily Rollup rows from completed Transactions"
+    import frappe
+
+    from bank_service.rollups import backfill_rollups, enqueue_backfill
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        if background:
+            enqueue_backfill(chunk_size=chunk_size)
+            frappe.db.commit()
+            click.echo("Rollup backfill enqueued")
+            return
+        result = backfill_rollups(chunk_size=chunk_size)
+        click.echo(f"Rebuilt {result['rows']} daily rollups for {result['accounts']} accounts")
+    finally:
+        frappe.destroy()
+
+
+@click.command("onboard-customers")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False, resolve_path=True))
+@click.option("--results", "results_path", help="Results NDJSON (default: <path>.results.ndjson); rerun with it to resume")
+@click.option("--format", "fmt", type=click.Choice(["csv", "ndjson"]), help="Input format (default: from the extension)")
+@click.option("--bank", "bank_name", help="Bank for rows without a bank_name (default: the site's default bank)")
+@click.option("--chunk-size", default=500, help="Customers inserted per commit")
+@click.option("--threads", default=8, help="Threads for key parsing and response encryption")
+@click.option("--envelope", default=0, help="1 to encrypt responses as binary envelopes")
+@click.option("--background", is_flag=True, help="Enqueue on the long queue instead of running here")
+@pass_context
+def onboard_customers(context, path, results_path, fmt, bank_name, chunk_size, threads, envelope, background):
+    "Bulk create bank accounts from a CSV or NDJSON file of customers"
+    import frappe
+
+    from bank_service.onboarding import enqueue_onboarding, onboard_customers
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        kwargs = {
+            "fmt": fmt,
+            "bank_name": bank_name,
+            "chunk_size": chunk_size,
+            "threads": threads,
+            "envelope": envelope,
+        }
+        results_path = results_path or f"{path}.results.ndjson"
+        if background:
+            enqueue_onboarding(path, results_path, **kwargs)
+            frappe.db.commit()
+            click.echo(f"Onboarding enqueued; results will be written to {results_path}")
+            return
+        counts = onboard_customers(path, results_path, **kwargs)
+        click.echo(
+            f"{counts['created']} created, {counts['exists']} already onboarded, "
+            f"{counts['failed']} failed, {counts['skipped']} done in an earlier run; results in {results_path}"
+        )
+    finally:
+        frappe.destroy()
+
+
+@click.command("reconcile-ledger")
+@click.option("--chunk-size", default=100_000, help="Rows read per query")
+@click.option("--stuck-after", default=60, help="Minutes after which an Initiated transfer counts as stuck")
+@click.option("--output", "report_path", help="Report path (default: private/files/reconciliation/...ndjson.gz)")
+@pass_context
+def reconcile_ledger(context, chunk_size, stuck_after, report_path):
+    "Check Transactions against Journal Entries and account balances"
+    import frappe
+
+    from bank_service.reconcile import reconcile_ledger
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        summary = reconcile_ledger(chunk_size=chunk_size, stuck_after_minutes=stuck_after, report_path=report_path)
+        click.echo(
+            f"Checked {summary['transactions']} transactions and {summary['journal_entries']} journal entries "
+            f"in {summary['seconds']:.1f}s"
+        )
+        for kind, count in summary["discrepancies"].items():
+            click.echo(f"  {kind}: {count}")
+        click.echo(f"Report: {summary['report']}")
+    finally:
+        frappe.destroy()
+
+
+@click.command("consolidate-ledger")
+@pass_context
+def consolidate_ledger(context):
+    "Post Pending internal ledger entries as netted Journal Entries"
+    import frappe
+
+    from bank_service.ledger import consolidate_ledger
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        summary = consolidate_ledger()
+        click.echo(
+            f"Consolidated {summary['entries']} entries of {summary['pairs']} account pairs "
+            f"into {summary['journal_entries']} journal entries"
+        )
+        if summary["skipped"] or summary["failed"]:
+            click.echo(f"  {summary['skipped']} pairs left for the next run, {summary['failed']} failed (see Error Log)")
+    finally:
+        frappe.destroy()
+
+
+@click.command("merge-profiles")
+@click.option("--endpoint", help="Only this endpoint (default: all)")
+@click.option("--clear", is_flag=True, help="Delete all profile files instead")
+@pass_context
+def merge_profiles(context, endpoint, clear):
+    "Add up the profiles of all workers into one flamegraph-ready file per endpoint"
+    import frappe
+
+    from bank_service.profiling import clear_profiles, merge_profiles
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        if clear:
+            clear_profiles()
+            click.echo("Profiles cleared")
+            return
+        for path in merge_profiles(endpoint):
+            click.echo(path)
+    finally:
+        frappe.destroy()
+
+
+commands = [
+    rebuild_account_balances,
+    backfill_account_rollups,
+    onboard_customers,
+    reconcile_ledger,
+    consolidate_ledger,
+    merge_profiles,
+]
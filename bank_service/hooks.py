@@ -145,6 +145,19 @@ app_license = "mit"
 # 	}
 # }
 
+doc_events = {
+	"Bank Settings": {
+		"on_update": "bank_service.banks.invalidate_bank_registry",
+		"after_rename": "bank_service.banks.invalidate_bank_registry",
+		"on_trash": "bank_service.banks.invalidate_bank_registry",
+	},
+	"HDFC Customer": {
+		"on_update": "bank_service.accounts.invalidate_account",
+		"after_rename": "bank_service.accounts.invalidate_account",
+		"on_trash": "bank_service.accounts.invalidate_account",
+	},
+}
+
 # Scheduled Tasks
 # ---------------
 
@@ -166,6 +179,24 @@ app_license = "mit"
 # 	],
 # }
 
+scheduler_events = {
+	"all": [
+		"bank_service.jobs.retry_pending_postings",
+	],
+	"hourly": [
+		"bank_service.idempotency.purge_expired_keys",
+	],
+	"daily_long": [
+		"bank_service.reconcile.run_reconciliation",
+	],
+	"cron": {
+		# Internal ledger: one netted Journal Entry per account pair and interval
+		"*/15 * * * *": [
+			"bank_service.ledger.run_consolidation",
+		],
+	},
+}
+
 # Testing
 # -------
 
@@ -199,11 +230,16 @@ app_license = "mit"
 # before_request = ["bank_service.utils.before_request"]
 # after_request = ["bank_service.utils.after_request"]
 
+before_request = ["bank_service.warmup.before_request"]
+after_request = ["bank_service.instrumentation.after_request"]
+
 # Job Events
 # ----------
 # before_job = ["bank_service.utils.before_job"]
 # after_job = ["bank_service.utils.after_job"]
 
+after_job = ["bank_service.instrumentation.after_job"]
+
 # User Data Protection
 # --------------------
 
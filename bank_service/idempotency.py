@@ -0,0 +1,150 @@
+# -------------------- idempotency.py -------------------- #
+"""
+Idempotency keys for the encrypted endpoints.
+
+A client may send "idempotency_key" next to its encrypted_payload and/or
+inside the decrypted payload. A key belongs to one account (the initiating
+account, or the client key fingerprint for create_bank_account), so two
+clients never share a record. The key is claimed by inserting an
+`Idempotency Key` row in the same DB transaction as the ledger writes, so a
+concurrent duplicate blocks on the unique index and then sees the committed
+response instead of posting twice.
+
+A key is bound to the request that claimed it, compared by a hash of the
+decrypted request fields: a retry that re-encrypts the same request gets the
+stored response, a different request with the key is a conflict. A
+byte-identical resend of the encrypted payload with its key is answered
+before any decryption. Responses are kept for "Idempotency TTL (hours)" from
+Bank Settings.
+"""
+import hashlib
+import json
+
+import frappe
+from frappe.utils import add_to_date, flt, now, now_datetime
+
+from bank_service.banks import get_bank_settings
+
+DEFAULT_TTL_HOURS = 24
+
+
+class IdempotencyConflict(frappe.ValidationError):
+    pass
+
+
+def _key_name(endpoint: str, account: str, key: str) -> str:
+    return hashlib.sha256(f"{endpoint}:{account or ''}:{key}".encode()).hexdigest()
+
+
+def payload_hash(value) -> str:
+    if not isinstance(value, str | bytes):
+        value = json.dumps(value, sort_keys=True)
+    if isinstance(value, str):
+        value = value.encode()
+    return hashlib.sha256(value).hexdigest()
+
+
+def transfer_hash(transfer) -> str:
+    """payload_hash of the fields of a validated transfer (see posting.validate_transfer)."""
+    return payload_hash({
+        "transaction_type": transfer.transaction_type,
+        "from_account": transfer.from_account,
+        "to_account": transfer.to_account,
+        "amount": flt(transfer.amount),
+        "remarks": transfer.remarks or "",
+    })
+
+
+def envelope_hash(key: str, encrypted_payload) -> str:
+    """Hash of an encrypted request as received, together with its idempotency key."""
+    return payload_hash(f"{key}:{payload_hash(encrypted_payload or '')}")
+
+
+def _get_record(name):
+    record = frappe.db.get_value(
+        "Idempotency Key",
+        name,
+        ["account", "payload_hash", "envelope_hash", "response", "expires_on"],
+        as_dict=True,
+    )
+    if record and record.expires_on and record.expires_on < now_datetime():
+        return None
+    return record
+
+
+def get_cached_response(endpoint: str, key: str, encrypted_payload, account=None):
+    """
+    Fast path before decryption: the stored response of a byte-identical
+    resend (same key and encrypted payload), or None. `account` is checked
+    when it is known before decryption (a session, a create_bank_account key).
+    Without it the encrypted payload itself identifies the request: only its
+    sender has those bytes, and the response is encrypted for the account.
+    """
+    if not key:
+        return None
+    name = frappe.db.get_value(
+        "Idempotency Key", {"endpoint": endpoint, "envelope_hash": envelope_hash(key, encrypted_payload)}, "name"
+    )
+    record = name and _get_record(name)
+    if not record or not record.response:
+        return None
+    if account and record.account != account:
+        return None
+    return json.loads(record.response)
+
+
+def claim(endpoint: str, key: str, account: str, request_hash: str, encrypted_payload=None, bank_name=None):
+    """
+    Claim an account's key for this request. Returns None when the caller
+    should process the request, or the stored response of the earlier request
+    with that key. `request_hash` is the payload_hash of the decrypted request
+    fields. Raises IdempotencyConflict if the key was claimed by a different
+    request or that request is still in progress.
+    """
+    name = _key_name(endpoint, account, key)
+    record = _get_record(name)
+    if not record:
+        if frappe.db.exists("Idempotency Key", name):
+            # Expired: the key may be reused
+            frappe.db.delete("Idempotency Key", name)
+        ttl = get_bank_settings(bank_name).idempotency_ttl or DEFAULT_TTL_HOURS
+        doc = frappe.new_doc("Idempotency Key")
+        doc.update({
+            "key_hash": name,
+            "endpoint": endpoint,
+            "account": account,
+            "payload_hash": request_hash,
+            "envelope_hash": envelope_hash(key, encrypted_payload) if encrypted_payload else None,
+            "expires_on": add_to_date(now(), hours=ttl),
+        })
+        frappe.db.savepoint("idempotency_claim")
+        try:
+            doc.insert(ignore_permissions=True)
+            return None
+        except frappe.DuplicateEntryError:
+            # A concurrent request with the same key committed first
+            frappe.db.rollback(save_point="idempotency_claim")
+            record = _get_record(name)
+
+    if not record or (record.account or None) != (account or None):
+        raise IdempotencyConflict("Idempotency key already used")
+    if record.payload_hash != request_hash:
+        raise IdempotencyConflict("Idempotency key already used for a different request")
+    if not record.response:
+        raise IdempotencyConflict("A request with this idempotency key is still in progress")
+    return json.loads(record.response)
+
+
+def store_response(endpoint: str, key: str, account: str, response: dict):
+    frappe.db.set_value(
+        "Idempotency Key",
+        _key_name(endpoint, account, key),
+        "response",
+        json.dumps(response),
+        update_modified=False,
+    )
+
+
+def purge_expired_keys():
+    """Scheduler: drop keys past their TTL."""
+    frappe.db.delete("Idempotency Key", {"expires_on": ("<", now_datetime())})
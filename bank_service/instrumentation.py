@@ -0,0 +1,231 @@
+# -------------------- instrumentation.py -------------------- #
+"""
+Stage timers, counters and payload logging for the banking endpoints.
+
+Timers use the monotonic perf_counter clock and feed fixed-bucket histograms
+kept per worker process. Each worker publishes a snapshot to Redis at most
+every PUBLISH_INTERVAL seconds (after_request / after_job hooks) and
+api.metrics merges the live snapshots of all workers into Prometheus text.
+"""
+import functools
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+import frappe
+
+from bank_service.profiling import profiled
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_KEY = "bank_service:metrics"
+PUBLISH_INTERVAL = 10
+# Snapshots of workers that stopped publishing are ignored after this long
+STALE_AFTER = 600
+
+_histograms = {}
+_counters = {}
+_lock = threading.Lock()
+_last_publish = 0.0
+
+
+# ------------------- Timers and Counters ------------------- #
+def observe(endpoint: str, stage_name: str, seconds: float):
+    key = (endpoint, stage_name)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                hist[0][i] += 1
+                break
+        else:
+            hist[0][-1] += 1
+        hist[1] += seconds
+        hist[2] += 1
+
+
+def incr(name: str, labels=None, value=1):
+    key = (name, tuple(sorted((labels or {}).items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+@contextmanager
+def stage(endpoint: str, stage_name: str):
+    """Time a block of an endpoint, e.g. `with stage("make_transaction", "decrypt"):`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(endpoint, stage_name, time.perf_counter() - start)
+
+
+def instrumented(endpoint: str):
+    """
+    Time a whole endpoint as stage "total", count requests by response status
+    and profile the sampled ones (see bank_service.profiling).
+    """
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            status = "error"
+            try:
+                with profiled(endpoint):
+                    result = fn(*args, **kwargs)
+                if isinstance(result, dict):
+                    status = result.get("status", "success")
+                else:
+                    status = "throttled" if getattr(result, "status_code", None) == 429 else "success"
+                return result
+            finally:
+                observe(endpoint, "total", time.perf_counter() - start)
+                incr("requests", {"endpoint": endpoint, "status": status})
+
+        return wrapper
+
+    return decorator
+
+
+# ------------------- Publishing ------------------- #
+def snapshot() -> dict:
+    from bank_service.accounts import get_account_cache_stats
+    from bank_service.utils import get_client_key_cache_stats, get_keyring_stats
+
+    with _lock:
+        histograms = {key: (list(h[0]), h[1], h[2]) for key, h in _histograms.items()}
+        counters = dict(_counters)
+
+    keyring = get_keyring_stats()
+    client_keys = get_client_key_cache_stats()
+    accounts = get_account_cache_stats()
+    for cache, stats in (("bank_keys", keyring), ("client_keys", client_keys), ("accounts", accounts)):
+        for outcome in ("hits", "misses"):
+            counters[(f"cache_{outcome}", (("cache", cache),))] = stats.get(outcome, 0)
+
+    return {"ts": time.time(), "histograms": histograms, "counters": counters}
+
+
+def publish(force=False):
+    global _last_publish
+
+    now = time.monotonic()
+    if not force and now - _last_publish < PUBLISH_INTERVAL:
+        return
+    _last_publish = now
+    try:
+        frappe.cache().hset(METRICS_KEY, f"{socket.gethostname()}:{os.getpid()}", snapshot())
+    except Exception:
+        get_logger().warning("Could not publish bank_service metrics", exc_info=True)
+
+
+def after_request(response=None, request=None):
+    publish()
+
+
+def after_job(method=None, kwargs=None, result=None):
+    publish()
+
+
+def collect() -> dict:
+    """Merge the live snapshots of every worker (including this one)."""
+    publish(force=True)
+    histograms, counters = {}, {}
+    cutoff = time.time() - STALE_AFTER
+    for snap in (frappe.cache().hgetall(METRICS_KEY) or {}).values():
+        if not snap or snap["ts"] < cutoff:
+            continue
+        for key, (buckets, total, count) in snap["histograms"].items():
+            merged = histograms.setdefault(key, [[0] * len(buckets), 0.0, 0])
+            merged[0] = [a + b for a, b in zip(merged[0], buckets, strict=True)]
+            merged[1] += total
+            merged[2] += count
+        for key, value in snap["counters"].items():
+            counters[key] = counters.get(key, 0) + value
+    return {"histograms": histograms, "counters": counters}
+
+
+def _labels(pairs) -> str:
+    return ",".join(f'{k}="{v}"' for k, v in pairs)
+
+
+def render_prometheus(metrics: dict) -> str:
+    lines = [
+        "# HELP bank_service_stage_seconds Latency of banking endpoint stages.",
+        "# TYPE bank_service_stage_seconds histogram",
+    ]
+    for (endpoint, stage_name), (buckets, total, count) in sorted(metrics["histograms"].items()):
+        labels = _labels((("endpoint", endpoint), ("stage", stage_name)))
+        cumulative = 0
+        # The last bucket counts observations above every bound; it is only in +Inf
+        for bound, n in zip(BUCKETS, buckets[:-1], strict=True):
+            cumulative += n
+            lines.append(f'bank_service_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'bank_service_stage_seconds_bucket{{{labels},le="+Inf"}} {count}')
+        lines.append(f"bank_service_stage_seconds_sum{{{labels}}} {total}")
+        lines.append(f"bank_service_stage_seconds_count{{{labels}}} {count}")
+
+    by_name = {}
+    for (name, labels), value in metrics["counters"].items():
+        by_name.setdefault(name, []).append((labels, value))
+    for name, series in sorted(by_name.items()):
+        lines.append(f"# TYPE bank_service_{name}_total counter")
+        for labels, value in sorted(series):
+            lines.append(f"bank_service_{name}_total{{{_labels(labels)}}} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+# ------------------- Logging ------------------- #
+# Payloads are only logged for a sample of requests (site config
+# "bank_service_log_sample_rate", default 1%) and always redacted.
+DEFAULT_LOG_SAMPLE_RATE = 0.01
+SECRET_FIELDS = ("key", "pem", "encrypted", "session", "token")
+PERSONAL_FIELDS = ("account_name", "address", "remarks")
+MASKED_FIELDS = ("phone", "account_number", "from_account", "to_account")
+
+
+def get_logger():
+    logger = frappe.logger("bank_service", allow_site=True)
+    logger.setLevel(frappe.conf.get("bank_service_log_level") or "INFO")
+    return logger
+
+
+def redact(value, field=""):
+    if isinstance(value, dict):
+        return {k: redact(v, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [redact(v, field) for v in value]
+    if value in (None, ""):
+        return value
+
+    field = field.lower()
+    if any(s in field for s in SECRET_FIELDS):
+        return "<redacted>"
+    if field in PERSONAL_FIELDS:
+        return "<redacted>"
+    if field == "email":
+        local, _, domain = str(value).partition("@")
+        return f"{local[:1]}***@{domain}"
+    if field in MASKED_FIELDS:
+        text = str(value)
+        return "*" * max(len(text) - 4, 0) + text[-4:]
+    return value
+
+
+def log_payload(event: str, payload, level=logging.DEBUG):
+    """Log a redacted payload for a sample of requests."""
+    logger = get_logger()
+    if not logger.isEnabledFor(level):
+        return
+    rate = frappe.conf.get("bank_service_log_sample_rate")
+    if random.random() >= (DEFAULT_LOG_SAMPLE_RATE if rate is None else rate):
+        return
+    logger.log(level, "%s %s", event, json.dumps(redact(payload), default=str))
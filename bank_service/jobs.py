@@ -0,0 +1,172 @@
+# -------------------- jobs.py -------------------- #
+"""
+Asynchronous Journal Entry posting.
+
+With "Async Posting" enabled in Bank Settings, make_transaction records the
+transfer as Initiated and enqueues post_transaction. A failed posting keeps
+the row Initiated with its attempt count and error; retry_pending_postings
+(scheduler, every few minutes) re-enqueues it until "Posting Max Retries" is
+reached, after which the row is moved to Failed (the dead-letter state) and
+can be requeued with api.requeue_failed_postings. Queue, retries and whether
+a transfer is retried at all come from the Bank Settings of the transfer's
+bank, the bank of its initiating account.
+"""
+import frappe
+from frappe.utils import add_to_date, now
+
+from bank_service.balances import apply_balance_deltas, transfer_deltas
+from bank_service.banks import get_bank_settings, get_default_bank
+from bank_service.locks import TRANSIENT_LOCK_ERRORS, run_locked
+from bank_service.posting import CASH_ACCOUNT, journal_entry_lines, make_journal_entry, transfer_accounts
+from bank_service.rollups import apply_rollup_deltas, rollup_deltas
+
+DEFAULT_POSTING_QUEUE = "long"
+DEFAULT_MAX_RETRIES = 3
+# Initiated rows without any attempt after this long are assumed to have lost their job
+STALE_AFTER_MINUTES = 10
+# A row that failed n times is retried RETRY_BACKOFF_MINUTES * 2 ** (n - 1) minutes after its last attempt
+RETRY_BACKOFF_MINUTES = 2
+RETRY_BACKOFF_MAX_MINUTES = 240
+
+
+def get_transaction_bank(trx) -> str:
+    """Bank of a transfer: the bank of its initiating account (to_account for a Deposit)."""
+    account = trx.to_account if trx.from_account == CASH_ACCOUNT else trx.from_account
+    return frappe.db.get_value("Customer Accounts", account, "bank_name") or get_default_bank()
+
+
+def enqueue_posting(transaction_id: str, bank_name=None):
+    settings = get_bank_settings(bank_name)
+    frappe.enqueue(
+        "bank_service.jobs.post_transaction",
+        queue=settings.posting_queue or DEFAULT_POSTING_QUEUE,
+        enqueue_after_commit=True,
+        # At most one queued job per transfer, however often it is requeued
+        job_id=f"bank_posting::{transaction_id}",
+        deduplicate=True,
+        transaction_id=transaction_id,
+    )
+
+
+def post_transaction(transaction_id: str):
+    """Post the Journal Entry of an Initiated transfer and complete it."""
+    trx = frappe.db.get_value(
+        "Transactions", transaction_id, ["name", "from_account", "to_account"], as_dict=True
+    )
+    if not trx:
+        return
+    bank_name = get_transaction_bank(trx)
+
+    try:
+        run_locked(
+            "post_transaction",
+            transfer_accounts([trx]),
+            lambda: _complete_posting(transaction_id, bank_name),
+            bank_name,
+        )
+        frappe.db.commit()
+    except TRANSIENT_LOCK_ERRORS:
+        # Out of lock attempts (already rolled back); counts as a failed posting attempt
+        trx.posting_attempts = frappe.db.get_value("Transactions", transaction_id, "posting_attempts")
+        _record_posting_failure(trx, frappe.get_traceback(), bank_name)
+
+
+def _complete_posting(transaction_id: str, bank_name=None):
+    trx = frappe.db.get_value(
+        "Transactions",
+        transaction_id,
+        ["name", "status", "from_account", "to_account", "amount", "date_time", "remarks", "posting_attempts"],
+        as_dict=True,
+        for_update=True,
+    )
+    # Already posted (or dead-lettered) by an earlier run of this job
+    if not trx or trx.status != "Initiated":
+        return
+
+    try:
+        je = make_journal_entry(journal_entry_lines(trx), trx.remarks)
+        apply_balance_deltas(transfer_deltas([trx]))
+        apply_rollup_deltas(rollup_deltas([trx]))
+        frappe.db.set_value(
+            "Transactions",
+            transaction_id,
+            {
+                "status": "Completed",
+                "journal_entry": je.name,
+                "posting_attempts": (trx.posting_attempts or 0) + 1,
+                "posting_error": None,
+            },
+        )
+    except TRANSIENT_LOCK_ERRORS:
+        # Retried by run_locked
+        raise
+    except Exception:
+        frappe.db.rollback()
+        _record_posting_failure(trx, frappe.get_traceback(), bank_name)
+
+
+def _record_posting_failure(trx, error: str, bank_name=None):
+    attempts = (trx.posting_attempts or 0) + 1
+    max_retries = get_bank_settings(bank_name).posting_max_retries or DEFAULT_MAX_RETRIES
+    dead = attempts >= max_retries
+
+    frappe.db.set_value(
+        "Transactions",
+        trx.name,
+        {
+            "status": "Failed" if dead else "Initiated",
+            "posting_attempts": attempts,
+            "posting_error": error,
+        },
+    )
+    if dead:
+        frappe.log_error(error, f"Transaction Posting Dead Letter: {trx.name}")
+    frappe.db.commit()
+
+
+def retry_pending_postings():
+    """
+    Scheduler: re-enqueue stale Initiated postings, and failed ones once their
+    exponential backoff since the last attempt has passed. Only banks with
+    Async Posting enabled are retried.
+    """
+    timestamp = now()
+    stale_before = add_to_date(timestamp, minutes=-STALE_AFTER_MINUTES)
+    pending = frappe.db.sql(
+        """select t.name, ca.bank_name from `tabTransactions` t
+        left join `tabCustomer Accounts` ca
+            on ca.name = if(t.from_account = %(cash)s, t.to_account, t.from_account)
+        where t.status = 'Initiated'
+        and (
+            (t.posting_attempts = 0 and t.modified < %(stale_before)s)
+            or (t.posting_attempts > 0 and timestampdiff(minute, t.modified, %(now)s)
+                >= least(%(backoff)s * pow(2, t.posting_attempts - 1), %(backoff_max)s))
+        )""",
+        {
+            "cash": CASH_ACCOUNT,
+            "stale_before": stale_before,
+            "now": timestamp,
+            "backoff": RETRY_BACKOFF_MINUTES,
+            "backoff_max": RETRY_BACKOFF_MAX_MINUTES,
+        },
+    )
+    by_bank = {}
+    for transaction_id, bank_name in pending:
+        by_bank.setdefault(bank_name or get_default_bank(), []).append(transaction_id)
+    for bank_name, transaction_ids in by_bank.items():
+        if not get_bank_settings(bank_name).async_posting:
+            continue
+        for transaction_id in transaction_ids:
+            enqueue_posting(transaction_id, bank_name)
+
+
+def requeue_failed(transaction_ids=None) -> int:
+    """Move dead-lettered transfers back to Initiated and enqueue them."""
+    filters = {"status": "Failed"}
+    if transaction_ids:
+        filters["name"] = ("in", transaction_ids)
+    rows = frappe.get_all("Transactions", filters=filters, fields=["name", "from_account", "to_account"])
+    for row in rows:
+        frappe.db.set_value("Transactions", row.name, {"status": "Initiated", "posting_attempts": 0})
+        enqueue_posting(row.name, get_transaction_bank(row))
+    return len(rows)
@@ -0,0 +1,163 @@
+# -------------------- ledger.py -------------------- #
+"""
+Internal ledger.
+
+With "Internal Ledger" enabled in Bank Settings, a transfer is completed
+without a Journal Entry of its own: its Transactions row is inserted as
+Completed, balances and rollups are updated as usual, and one `Ledger Entry`
+row (named by the transaction) records it in the same DB transaction.
+
+consolidate_ledger (scheduler, every 15 minutes) then posts the Pending
+entries as one netted Journal Entry per account pair: transfers A -> B and
+B -> A net into a single two-line entry, or into none when they cancel out.
+Each pair is committed on its own; its entries become Consolidated and both
+they and their Transactions rows point at the Journal Entry, so every
+transfer stays auditable down to the entry that posted it.
+
+    bench --site <your-site> consolidate-ledger
+"""
+import frappe
+from frappe.utils import flt, now
+
+from bank_service.locks import TRANSIENT_LOCK_ERRORS
+from bank_service.posting import journal_entry_lines, make_journal_entry
+
+# Ledger entries updated per statement
+UPDATE_CHUNK_SIZE = 1000
+
+LEDGER_FIELDS = (
+    "name",
+    "transaction",
+    "from_account",
+    "to_account",
+    "amount",
+    "posted_on",
+    "status",
+    "owner",
+    "modified_by",
+    "creation",
+    "modified",
+    "docstatus",
+)
+
+
+def append_ledger_entries(transfers):
+    """Record Completed transfers (with `name` and `date_time` set) as Pending ledger entries."""
+    timestamp = now()
+    user = frappe.session.user
+    frappe.db.bulk_insert(
+        "Ledger Entry",
+        LEDGER_FIELDS,
+        [
+            (
+                t.name,
+                t.name,
+                t.from_account,
+                t.to_account,
+                t.amount,
+                t.date_time,
+                "Pending",
+                user,
+                user,
+                timestamp,
+                timestamp,
+                0,
+            )
+            for t in transfers
+        ],
+    )
+
+
+def net_transfer(entries, low: str, high: str):
+    """
+    The single transfer equivalent to `entries` between accounts `low` and
+    `high`, or None when they cancel out.
+    """
+    net = flt(sum(flt(e.amount) if e.from_account == low else -flt(e.amount) for e in entries), 2)
+    if not net:
+        return None
+    if net > 0:
+        return frappe._dict(from_account=low, to_account=high, amount=net)
+    return frappe._dict(from_account=high, to_account=low, amount=-net)
+
+
+def _consolidate_pair(low: str, high: str, cutoff) -> dict:
+    entries = frappe.db.sql(
+        """select name, from_account, amount from `tabLedger Entry`
+        where status = 'Pending' and posted_on <= %(cutoff)s
+        and ((from_account = %(low)s and to_account = %(high)s)
+            or (from_account = %(high)s and to_account = %(low)s))
+        order by name
+        for update""",
+        {"low": low, "high": high, "cutoff": cutoff},
+        as_dict=True,
+    )
+    if not entries:
+        return {"entries": 0, "journal_entry": None}
+
+    transfer = net_transfer(entries, low, high)
+    journal_entry = None
+    if transfer:
+        journal_entry = make_journal_entry(
+            journal_entry_lines(transfer),
+            f"Internal ledger: {len(entries)} transfers between {low} and {high}",
+        ).name
+
+    names = [e.name for e in entries]
+    timestamp = now()
+    for start in range(0, len(names), UPDATE_CHUNK_SIZE):
+        chunk = tuple(names[start:start + UPDATE_CHUNK_SIZE])
+        frappe.db.sql(
+            """update `tabLedger Entry` set status = 'Consolidated', journal_entry = %s, modified = %s
+            where name in %s""",
+            (journal_entry, timestamp, chunk),
+        )
+        if journal_entry:
+            frappe.db.sql(
+                """update `tabTransactions` set journal_entry = %s where name in %s""",
+                (journal_entry, chunk),
+            )
+    return {"entries": len(entries), "journal_entry": journal_entry}
+
+
+def consolidate_ledger(cutoff=None, commit=True) -> dict:
+    """Post every Pending ledger entry up to `cutoff` (default: now) as netted Journal Entries."""
+    cutoff = cutoff or now()
+    pairs = frappe.db.sql(
+        """select distinct least(from_account, to_account), greatest(from_account, to_account)
+        from `tabLedger Entry` where status = 'Pending' and posted_on <= %s""",
+        (cutoff,),
+    )
+    summary = {"pairs": 0, "entries": 0, "journal_entries": 0, "skipped": 0, "failed": 0}
+    for low, high in pairs:
+        try:
+            result = _consolidate_pair(low, high, cutoff)
+        except TRANSIENT_LOCK_ERRORS:
+            # Left Pending for the next run
+            frappe.db.rollback()
+            summary["skipped"] += 1
+            continue
+        except Exception:
+            frappe.db.rollback()
+            frappe.log_error(frappe.get_traceback(), f"Ledger Consolidation Failed: {low} / {high}")
+            summary["failed"] += 1
+            continue
+        if commit:
+            frappe.db.commit()
+        summary["pairs"] += 1
+        summary["entries"] += result["entries"]
+        summary["journal_entries"] += bool(result["journal_entry"])
+    return summary
+
+
+def run_consolidation():
+    """Scheduler: consolidate the internal ledger."""
+    consolidate_ledger()
+
+
+def get_ledger_stats() -> dict:
+    """Pending entry count and the oldest pending posted_on."""
+    count, oldest = frappe.db.sql(
+        """select count(*), min(posted_on) from `tabLedger Entry` where status = 'Pending'"""
+    )[0]
+    return {"pending": count, "oldest_pending": str(oldest) if oldest else None}
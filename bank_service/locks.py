@@ -0,0 +1,80 @@
+# -------------------- locks.py -------------------- #
+"""
+Per-account transfer locks.
+
+Every writer of an account's balance (make_transaction, make_transactions_batch
+and the async posting job) first locks the account rows in `Customer Accounts`
+with SELECT ... FOR UPDATE, one row at a time in account order. Conflicting
+transfers on a hot account therefore queue on that row at the start of their DB
+transaction instead of interleaving Transactions inserts, Journal Entry submits
+and balance updates, and because every writer locks in the same order they
+cannot deadlock on these rows.
+
+Deadlocks and lock wait timeouts elsewhere (GL Entries, naming series) are
+still possible. InnoDB rolls back the whole transaction for them, so
+run_locked rolls back, backs off with jitter and runs the whole unit again,
+up to "Transfer Lock Attempts" in Bank Settings.
+
+Metrics (api.metrics): the "lock" stage histogram per endpoint, and per
+account bank_service_account_lock_wait_seconds_total and _waits_total for
+waits over CONTENDED_AFTER (so only hot accounts get series), plus
+_retries_total and bank_service_account_lock_failures_total.
+"""
+import random
+import time
+
+import frappe
+
+from bank_service.banks import get_bank_settings
+from bank_service.instrumentation import incr, observe
+
+DEFAULT_LOCK_ATTEMPTS = 5
+BACKOFF_BASE = 0.05
+BACKOFF_MAX = 1.0
+# Waits shorter than this are not attributed to the account
+CONTENDED_AFTER = 0.005
+
+# InnoDB aborts the transaction on both
+TRANSIENT_LOCK_ERRORS = (frappe.QueryDeadlockError, frappe.QueryTimeoutError)
+
+
+def lock_accounts(endpoint: str, accounts):
+    """Lock the `Customer Accounts` rows of `accounts` in canonical (sorted) order."""
+    start = time.perf_counter()
+    for account in sorted(set(accounts)):
+        waited = time.perf_counter()
+        frappe.db.sql("""select name from `tabCustomer Accounts` where name = %s for update""", (account,))
+        waited = time.perf_counter() - waited
+        if waited >= CONTENDED_AFTER:
+            incr("account_lock_wait_seconds", {"account": account}, value=waited)
+            incr("account_lock_waits", {"account": account})
+    observe(endpoint, "lock", time.perf_counter() - start)
+
+
+def backoff(attempt: int) -> float:
+    """Seconds to sleep before retry number `attempt` (1-based): jittered exponential."""
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+
+
+def run_locked(endpoint: str, accounts, fn, bank_name=None):
+    """
+    Lock `accounts`, then return fn(). The locks and everything fn writes form
+    one DB transaction (left open for the caller to commit). On a deadlock or
+    lock wait timeout the transaction is rolled back and the unit is run again,
+    so fn must not have effects outside the DB transaction.
+    """
+    accounts = sorted(set(accounts))
+    attempts = get_bank_settings(bank_name).transfer_lock_attempts or DEFAULT_LOCK_ATTEMPTS
+    for attempt in range(1, attempts + 1):
+        try:
+            lock_accounts(endpoint, accounts)
+            return fn()
+        except TRANSIENT_LOCK_ERRORS:
+            frappe.db.rollback()
+            frappe.clear_messages()
+            if attempt == attempts:
+                incr("account_lock_failures", {"endpoint": endpoint})
+                raise
+            for account in accounts:
+                incr("account_lock_retries", {"account": account})
+            time.sleep(backoff(attempt))
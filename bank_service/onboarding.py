@@ -0,0 +1,374 @@
+# -------------------- onboarding.py -------------------- #
+"""
+Bulk customer onboarding.
+
+Streams a CSV or NDJSON file of customers (the create_bank_account fields,
+plus an optional bank_name) and onboards it chunk by chunk:
+
+1. validate the chunk column-wise (names, account types, phones, emails,
+   duplicates within the file),
+2. parse client keys in a thread pool (pool threads only do crypto; they
+   have no Frappe request context),
+3. skip customers whose key fingerprint is already registered,
+4. bulk insert HDFC Customer, Bank Account and Customer Accounts rows and commit,
+5. encrypt the per-customer responses in a thread pool and append them to the
+   results file (NDJSON, one line per input row).
+
+Every input row gets exactly one results line. A rerun with the same results
+file skips the lines already there. A chunk that was committed but whose
+results were never written is reported as "exists", with its account numbers,
+so resuming after a crash never creates a customer twice.
+
+The rows go in with frappe.db.bulk_insert, so no document controllers run.
+For the app's own doctypes (HDFC Customer, Customer Accounts) this module
+does their validation itself. For ERPNext's Bank Account it means trading
+ERPNext's validate/on_update, link checks, defaults and any doc_events other
+apps hook on Bank Account for insert speed: names follow ERPNext's autoname
+(made unique here), the bank is checked with is_registered_bank and the
+account type is one of ACCOUNT_TYPES, which must exist as Bank Account Types.
+Sites that rely on Bank Account hooks should onboard through
+create_bank_account instead.
+
+    bench --site <your-site> onboard-customers customers.csv --results results.ndjson
+"""
+import csv
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import frappe
+from cryptography.hazmat.primitives import serialization
+from frappe.utils import now, validate_email_address
+
+from bank_service.account_numbers import format_account_number, reserve_block
+from bank_service.banks import bank_link, get_default_bank, is_registered_bank
+from bank_service.utils import (
+    encrypt_with_client_key,
+    generate_bank_keypair,
+    get_public_key_fingerprint,
+    get_public_key_pem_pkcs8,
+    is_valid_phone,
+)
+
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_THREADS = 8
+ACCOUNT_TYPES = ("Savings", "Current")
+
+CUSTOMER_FIELDS = (
+    "name",
+    "account_number",
+    "account_name",
+    "account_type",
+    "bank_name",
+    "phone",
+    "email",
+    "address",
+    "erpnext_bank_account",
+    "client_public_key",
+    "client_key_fingerprint",
+    "owner",
+    "modified_by",
+    "creation",
+    "modified",
+    "docstatus",
+)
+BANK_ACCOUNT_FIELDS = (
+    "name",
+    "account_name",
+    "bank",
+    "account_type",
+    "bank_account_no",
+    "owner",
+    "modified_by",
+    "creation",
+    "modified",
+    "docstatus",
+)
+BALANCE_FIELDS = (
+    "name",
+    "bank_account_number",
+    "bank_name",
+    "balance",
+    "owner",
+    "modified_by",
+    "creation",
+    "modified",
+    "docstatus",
+)
+
+
+# ------------------- Input ------------------- #
+def iter_customers(path: str, fmt=None):
+    """Yield (line number, row dict) from a CSV or NDJSON file without loading it whole."""
+    fmt = fmt or ("csv" if path.lower().endswith(".csv") else "ndjson")
+    with open(path, newline="" if fmt == "csv" else None, encoding="utf-8") as f:
+        if fmt == "csv":
+            # Line 1 is the header; CSV values may span lines, so count records rather than lines
+            for line_no, row in enumerate(csv.DictReader(f), start=2):
+                yield line_no, row
+            return
+        for line_no, line in enumerate(f, start=1):
+            if line.strip():
+                try:
+                    yield line_no, json.loads(line)
+                except ValueError:
+                    yield line_no, None
+
+
+def iter_chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def read_done_lines(results_path: str) -> set:
+    """Input line numbers that already have a results line."""
+    done = set()
+    if not os.path.exists(results_path):
+        return done
+    with open(results_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)["line"])
+            except (ValueError, KeyError):
+                # A line torn by a crash mid-write is simply redone
+                continue
+    return done
+
+
+# ------------------- Validation ------------------- #
+def _clean(row, field):
+    return str(row.get(field) or "").strip()
+
+
+def validate_chunk(rows, default_bank, seen: dict):
+    """
+    Normalize and validate a chunk of (line, row) column by column.
+    Returns (customers, failures). `seen` maps (account name, phone, account type)
+    to the first line it appeared on and spans the whole file.
+    """
+    customers = []
+    for line, row in rows:
+        if not isinstance(row, dict):
+            customers.append(frappe._dict(line=line, error="Invalid JSON"))
+            continue
+        customers.append(frappe._dict(
+            line=line,
+            account_name=_clean(row, "account_name"),
+            phone=_clean(row, "phone"),
+            email=_clean(row, "email"),
+            address=_clean(row, "address"),
+            account_type=_clean(row, "account_type"),
+            bank_name=_clean(row, "bank_name") or default_bank,
+            client_public_key=_clean(row, "client_public_key"),
+            error=None,
+        ))
+
+    pending = [c for c in customers if not c.error]
+    checks = (
+        (lambda c: bool(c.account_name), "Account name required"),
+        (lambda c: c.account_type in ACCOUNT_TYPES, "Invalid account type"),
+        (lambda c: is_valid_phone(c.phone), "Invalid phone number. Must be exactly 10 digits"),
+        (lambda c: not c.email or bool(validate_email_address(c.email)), "Invalid email address"),
+        (lambda c: c.client_public_key.startswith("-----BEGIN"), "client_public_key must be PEM format"),
+    )
+    for check, message in checks:
+        for customer in pending:
+            if not check(customer):
+                customer.error = message
+        pending = [c for c in pending if not c.error]
+
+    known_banks = {bank: is_registered_bank(bank) for bank in {c.bank_name for c in pending}}
+    for customer in pending:
+        if not known_banks[customer.bank_name]:
+            customer.error = "Unknown bank"
+            continue
+        identity = (customer.account_name.casefold(), customer.phone, customer.account_type)
+        if identity in seen:
+            customer.error = f"Duplicate of line {seen[identity]}"
+        else:
+            seen[identity] = customer.line
+
+    return [c for c in customers if not c.error], [c for c in customers if c.error]
+
+
+def _parse_key(customer):
+    try:
+        customer.client_key = serialization.load_pem_public_key(customer.client_public_key.encode())
+        customer.client_key_fingerprint = get_public_key_fingerprint(customer.client_key)
+    except (ValueError, TypeError) as e:
+        customer.error = f"Invalid client_public_key: {e}"
+    return customer
+
+
+# ------------------- Inserts ------------------- #
+def _existing_accounts(fingerprints) -> dict:
+    if not fingerprints:
+        return {}
+    rows = frappe.get_all(
+        "HDFC Customer",
+        filters={"client_key_fingerprint": ("in", list(fingerprints))},
+        fields=["name", "client_key_fingerprint", "erpnext_bank_account"],
+    )
+    return {row.client_key_fingerprint: row for row in rows}
+
+
+def _bank_account_names(customers) -> list:
+    """Bank Account names as ERPNext autonames them ("<account name> - <bank>"), made unique."""
+    base_names = [f"{c.account_name} - {c.bank_name}" for c in customers]
+    taken = set(frappe.get_all("Bank Account", filters={"name": ("in", list(set(base_names)))}, pluck="name"))
+    if taken:
+        or_filters = [["name", "like", f"{base}-%"] for base in taken]
+        taken.update(frappe.get_all("Bank Account", or_filters=or_filters, pluck="name"))
+    names = []
+    for base in base_names:
+        name, n = base, 0
+        while name in taken:
+            n += 1
+            name = f"{base}-{n}"
+        taken.add(name)
+        names.append(name)
+    return names
+
+
+def insert_customers(customers):
+    """Allocate account numbers and bulk insert all rows for a validated chunk."""
+    start, _ = reserve_block(len(customers))
+    bank_accounts = _bank_account_names(customers)
+    timestamp = now()
+    user = frappe.session.user
+
+    customer_rows, bank_account_rows, balance_rows = [], [], []
+    for serial, customer, bank_account in zip(range(start, start + len(customers)), customers, bank_accounts, strict=True):
+        customer.account_number = format_account_number(serial)
+        customer.erpnext_bank_account = bank_account
+        std = (user, user, timestamp, timestamp, 0)
+        customer_rows.append((
+            customer.account_number,
+            customer.account_number,
+            customer.account_name,
+            customer.account_type,
+            bank_link(customer.bank_name),
+            customer.phone,
+            customer.email,
+            customer.address,
+            bank_account,
+            customer.client_public_key,
+            customer.client_key_fingerprint,
+            *std,
+        ))
+        bank_account_rows.append((
+            bank_account,
+            customer.account_name,
+            customer.bank_name,
+            customer.account_type,
+            customer.account_number,
+            *std,
+        ))
+        balance_rows.append((customer.account_number, customer.account_number, customer.bank_name, 0, *std))
+
+    frappe.db.bulk_insert("HDFC Customer", CUSTOMER_FIELDS, customer_rows)
+    frappe.db.bulk_insert("Bank Account", BANK_ACCOUNT_FIELDS, bank_account_rows)
+    frappe.db.bulk_insert("Customer Accounts", BALANCE_FIELDS, balance_rows)
+
+
+# ------------------- Results ------------------- #
+def _result(customer, bank_pems, envelope=None):
+    if customer.error:
+        return {"line": customer.line, "status": "failed", "message": customer.error}
+
+    response_payload = {
+        "account_number": customer.account_number,
+        "account_name": customer.account_name,
+        "account_type": customer.account_type,
+        "bank_name": customer.bank_name,
+        "erpnext_bank_account": customer.erpnext_bank_account,
+        "bank_public_key": bank_pems[customer.bank_name],
+    }
+    return {
+        "line": customer.line,
+        "status": customer.status,
+        "account_number": customer.account_number,
+        "encrypted_response": encrypt_with_client_key(customer.client_key, response_payload, envelope=envelope),
+    }
+
+
+def onboard_customers(
+    path,
+    results_path,
+    fmt=None,
+    bank_name=None,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    threads=DEFAULT_THREADS,
+    envelope=None,
+):
+    """Onboard every customer of `path`, appending to `results_path`. Returns the counts per status."""
+    default_bank = bank_name or get_default_bank()
+    done = read_done_lines(results_path)
+    counts = {"created": 0, "exists": 0, "failed": 0, "skipped": len(done)}
+    seen = {}
+    bank_pems = {}
+
+    rows = (row for row in iter_customers(path, fmt) if row[0] not in done)
+    with ThreadPoolExecutor(max_workers=threads) as pool, open(results_path, "a", encoding="utf-8") as out:
+        for chunk in iter_chunks(rows, chunk_size):
+            customers, failures = validate_chunk(chunk, default_bank, seen)
+            customers = list(pool.map(_parse_key, customers))
+            failures += [c for c in customers if c.error]
+            customers = [c for c in customers if not c.error]
+
+            # Fingerprints registered earlier (or by a run that crashed after its commit) are not re-created
+            existing = _existing_accounts({c.client_key_fingerprint for c in customers})
+            fresh, seen_keys = [], {}
+            for customer in customers:
+                account = existing.get(customer.client_key_fingerprint)
+                if account:
+                    customer.update(
+                        status="exists", account_number=account.name, erpnext_bank_account=account.erpnext_bank_account
+                    )
+                elif customer.client_key_fingerprint in seen_keys:
+                    customer.error = f"Duplicate client_public_key of line {seen_keys[customer.client_key_fingerprint]}"
+                    failures.append(customer)
+                else:
+                    seen_keys[customer.client_key_fingerprint] = customer.line
+                    customer.status = "created"
+                    fresh.append(customer)
+            customers = [c for c in customers if not c.error]
+
+            if fresh:
+                try:
+                    insert_customers(fresh)
+                    frappe.db.commit()
+                except Exception:
+                    frappe.db.rollback()
+                    raise
+
+            for bank in {c.bank_name for c in customers} - set(bank_pems):
+                bank_pems[bank] = get_public_key_pem_pkcs8(generate_bank_keypair(bank)[0])
+            results = list(pool.map(lambda c: _result(c, bank_pems, envelope), customers + failures))
+            results.sort(key=lambda r: r["line"])
+            out.write("".join(json.dumps(r) + "\n" for r in results))
+            out.flush()
+            os.fsync(out.fileno())
+
+            for result in results:
+                counts[result["status"]] += 1
+
+    return counts
+
+
+def enqueue_onboarding(path, results_path, **kwargs):
+    """Run onboard_customers as a background job on the long queue."""
+    return frappe.enqueue(
+        "bank_service.onboarding.onboard_customers",
+        queue="long",
+        timeout=6 * 60 * 60,
+        path=path,
+        results_path=results_path,
+        **kwargs,
+    )
@@ -0,0 +1,6 @@
+from bank_service.rollups import enqueue_backfill
+
+
+def execute():
+    # History can be large; build it on the long queue instead of inside migrate
+    enqueue_backfill()
@@ -0,0 +1,22 @@
+import frappe
+
+from bank_service.utils import get_public_key_fingerprint
+
+
+def execute():
+    customers = frappe.get_all(
+        "HDFC Customer",
+        filters={"client_key_fingerprint": ("is", "not set")},
+        fields=["name", "client_public_key"],
+    )
+    for customer in customers:
+        if not customer.client_public_key:
+            continue
+        try:
+            fingerprint = get_public_key_fingerprint(customer.client_public_key)
+        except ValueError:
+            frappe.log_error(f"Unparseable client public key on {customer.name}", "Client Key Fingerprint Backfill")
+            continue
+        frappe.db.set_value(
+            "HDFC Customer", customer.name, "client_key_fingerprint", fingerprint, update_modified=False
+        )
@@ -0,0 +1,5 @@
+from bank_service.balances import rebuild_balances
+
+
+def execute():
+    rebuild_balances(commit=False)
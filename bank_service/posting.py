@@ -0,0 +1,165 @@
+# -------------------- posting.py -------------------- #
+import frappe
+from frappe.utils import flt, now
+
+from bank_service.locks import TRANSIENT_LOCK_ERRORS
+
+TRANSFER_TYPES = ("Deposit", "Account Transfer")
+CASH_ACCOUNT = "Cash In Hand"
+
+# Transfers per consolidated Journal Entry when posting a batch
+JOURNAL_CHUNK_SIZE = 500
+
+TRANSACTION_FIELDS = (
+    "name",
+    "transaction_id",
+    "transaction_type",
+    "from_account",
+    "to_account",
+    "amount",
+    "status",
+    "date_time",
+    "remarks",
+    "owner",
+    "modified_by",
+    "creation",
+    "modified",
+    "docstatus",
+)
+
+
+def new_transaction_id() -> str:
+    return "TXN" + frappe.generate_hash(length=12).upper()
+
+
+def validate_transfer(item: dict):
+    """
+    Normalize one decrypted transfer request.
+    Returns (transfer, None) or (None, error message).
+    """
+    transaction_type = item.get("transaction_type")
+    from_account = item.get("from_account")
+    to_account = item.get("to_account")
+    amount = item.get("amount")
+
+    if transaction_type not in TRANSFER_TYPES:
+        return None, "Invalid transaction type"
+    if transaction_type == "Deposit" and not to_account:
+        return None, "Deposit requires to_account"
+    if transaction_type == "Account Transfer" and (not from_account or not to_account):
+        return None, "Account Transfer requires both from_account and to_account"
+    if flt(amount) <= 0:
+        return None, "Amount must be greater than zero"
+
+    initiating_account = to_account if transaction_type == "Deposit" else from_account
+    if transaction_type == "Deposit":
+        from_account = CASH_ACCOUNT
+
+    return frappe._dict(
+        transaction_type=transaction_type,
+        from_account=from_account,
+        to_account=to_account,
+        amount=amount,
+        remarks=item.get("remarks", ""),
+        initiating_account=initiating_account,
+    ), None
+
+
+def journal_entry_lines(transfer) -> list:
+    return [
+        {"account": transfer.from_account, "credit_in_account_currency": transfer.amount},
+        {"account": transfer.to_account, "debit_in_account_currency": transfer.amount},
+    ]
+
+
+def make_journal_entry(lines: list, remarks=""):
+    """Insert and submit a Bank Entry Journal Entry."""
+    je = frappe.new_doc("Journal Entry")
+    je.update({
+        "voucher_type": "Bank Entry",
+        "posting_date": now(),
+        "user_remark": remarks,
+        "accounts": lines,
+    })
+    je.insert(ignore_permissions=True)
+    je.submit()
+    return je
+
+
+def insert_transactions(transfers: list, status="Initiated"):
+    """Bulk insert `Transactions` rows for validated transfers, setting `name` on each."""
+    timestamp = now()
+    user = frappe.session.user
+    values = []
+    for transfer in transfers:
+        transfer.name = transfer.transaction_id = new_transaction_id()
+        transfer.status = status
+        transfer.date_time = timestamp
+        values.append((
+            transfer.name,
+            transfer.transaction_id,
+            transfer.transaction_type,
+            transfer.from_account,
+            transfer.to_account,
+            transfer.amount,
+            status,
+            timestamp,
+            transfer.remarks,
+            user,
+            user,
+            timestamp,
+            timestamp,
+            0,
+        ))
+    frappe.db.bulk_insert("Transactions", TRANSACTION_FIELDS, values)
+
+
+def post_transfers(transfers: list, remarks=""):
+    """
+    Post transfers as consolidated Journal Entries of up to JOURNAL_CHUNK_SIZE
+    transfers. If a consolidated entry fails, its chunk is retried one Journal
+    Entry per transfer so a single bad row only fails itself. Sets
+    `journal_entry` or `error` on every transfer.
+    """
+    for start in range(0, len(transfers), JOURNAL_CHUNK_SIZE):
+        chunk = transfers[start:start + JOURNAL_CHUNK_SIZE]
+        frappe.db.savepoint("bank_batch_chunk")
+        try:
+            je = make_journal_entry([line for t in chunk for line in journal_entry_lines(t)], remarks)
+        except TRANSIENT_LOCK_ERRORS:
+            # The whole DB transaction is gone; the caller retries it (see locks.run_locked)
+            raise
+        except Exception:
+            frappe.db.rollback(save_point="bank_batch_chunk")
+            frappe.clear_messages()
+            _post_individually(chunk, remarks)
+            continue
+
+        for transfer in chunk:
+            transfer.journal_entry = je.name
+
+
+def _post_individually(transfers: list, remarks=""):
+    for transfer in transfers:
+        frappe.db.savepoint("bank_batch_item")
+        try:
+            transfer.journal_entry = make_journal_entry(journal_entry_lines(transfer), transfer.remarks or remarks).name
+        except TRANSIENT_LOCK_ERRORS:
+            raise
+        except Exception as e:
+            frappe.db.rollback(save_point="bank_batch_item")
+            frappe.clear_messages()
+            transfer.error = str(e)
+
+
+def existing_accounts(accounts) -> set:
+    """The subset of `accounts` that are HDFC Customers, in one query."""
+    accounts = list(set(accounts) - {CASH_ACCOUNT})
+    if not accounts:
+        return set()
+    return set(frappe.get_all("HDFC Customer", filters={"name": ("in", accounts)}, pluck="name"))
+
+
+def transfer_accounts(transfers) -> list:
+    """Customer accounts whose balances the transfers change, in lock order."""
+    return sorted({a for t in transfers for a in (t.from_account, t.to_account)} - {CASH_ACCOUNT})
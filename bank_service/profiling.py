@@ -0,0 +1,236 @@
+# -------------------- profiling.py -------------------- #
+"""
+On-demand profiling of the banking endpoints.
+
+Switched on in the default bank's Bank Settings → Profiling: a sample rate
+(fraction of requests, 0 is off), an optional end time, and a mode:
+
+* Stack Samples: one sampler thread per worker reads the stack of every
+  thread serving a sampled request every SAMPLE_INTERVAL seconds and counts
+  them as collapsed stacks ("endpoint;frame;frame count"), the input format
+  of flamegraph.pl and speedscope. Unsampled requests pay one settings lookup.
+* cProfile: the sampled request runs under cProfile; stats are added up per
+  endpoint.
+
+Each worker keeps its aggregates in memory and rewrites its own files under
+private/files/profiles at most every FLUSH_INTERVAL seconds.
+merge_profiles (bench merge-profiles) adds up the files of all workers.
+"""
+import cProfile
+import glob
+import os
+import pstats
+import random
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+import frappe
+from frappe.utils import get_datetime, now_datetime
+
+from bank_service.banks import get_bank_settings
+
+STACK_SAMPLES = "Stack Samples"
+CPROFILE = "cProfile"
+PROFILE_DIR = ("private", "files", "profiles")
+SAMPLE_INTERVAL = 0.005
+FLUSH_INTERVAL = 30
+MAX_DEPTH = 100
+
+_stacks = {}
+_stats = {}
+_lock = threading.Lock()
+_sampler = None
+_last_flush = 0.0
+
+
+# ------------------- Sampling ------------------- #
+def _frame_label(code) -> str:
+    path = code.co_filename.replace(os.sep, "/").rsplit("/", 2)
+    return f"{code.co_name} ({'/'.join(path[-2:])})"
+
+
+def collapse(frame, root: str) -> str:
+    """Collapsed stack of `frame`, outermost first, under a `root` frame."""
+    labels = []
+    while frame is not None and len(labels) < MAX_DEPTH:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.append(root)
+    return ";".join(reversed(labels))
+
+
+class StackSampler(threading.Thread):
+    """Daemon thread sampling the stacks of the threads it watches."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        super().__init__(name="bank_service-profiler", daemon=True)
+        self.interval = interval
+        self.watched = {}
+        self.active = threading.Event()
+
+    def watch(self, thread_id, endpoint):
+        with _lock:
+            self.watched[thread_id] = endpoint
+        self.active.set()
+
+    def unwatch(self, thread_id):
+        with _lock:
+            self.watched.pop(thread_id, None)
+            if not self.watched:
+                self.active.clear()
+
+    def run(self):
+        while True:
+            self.active.wait()
+            frames = sys._current_frames()
+            with _lock:
+                for thread_id, endpoint in self.watched.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        _stacks.setdefault(endpoint, Counter())[collapse(frame, endpoint)] += 1
+            del frames
+            time.sleep(self.interval)
+
+
+def _get_sampler() -> StackSampler:
+    global _sampler
+    with _lock:
+        if _sampler is None or not _sampler.is_alive():
+            _sampler = StackSampler()
+            _sampler.start()
+    return _sampler
+
+
+# ------------------- Capture ------------------- #
+def sampled_mode():
+    """The profiling mode for this request if it is sampled, else None."""
+    settings = get_bank_settings()
+    rate = settings.get("profile_sample_rate") or 0
+    if rate <= 0 or random.random() >= rate:
+        return None
+    until = settings.get("profile_until")
+    if until and now_datetime() >= get_datetime(until):
+        return None
+    return settings.get("profile_mode") or STACK_SAMPLES
+
+
+@contextmanager
+def profiled(endpoint: str):
+    """Profile the block if this request is sampled (see sampled_mode)."""
+    mode = sampled_mode()
+    if not mode:
+        yield
+        return
+
+    if mode == CPROFILE:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active in this thread
+            yield
+            return
+        try:
+            yield
+        finally:
+            profiler.disable()
+            with _lock:
+                if endpoint in _stats:
+                    _stats[endpoint].add(profiler)
+                else:
+                    _stats[endpoint] = pstats.Stats(profiler)
+            flush()
+    else:
+        sampler = _get_sampler()
+        sampler.watch(threading.get_ident(), endpoint)
+        try:
+            yield
+        finally:
+            sampler.unwatch(threading.get_ident())
+            flush()
+
+
+# ------------------- Output ------------------- #
+def get_profile_dir() -> str:
+    return frappe.get_site_path(*PROFILE_DIR)
+
+
+def flush(force=False):
+    """Rewrite this worker's profile files, at most every FLUSH_INTERVAL seconds."""
+    global _last_flush
+
+    now = time.monotonic()
+    if not force and now - _last_flush < FLUSH_INTERVAL:
+        return
+    _last_flush = now
+    worker = f"{socket.gethostname()}-{os.getpid()}"
+    with _lock:
+        stacks = {endpoint: dict(counts) for endpoint, counts in _stacks.items()}
+        stats = dict(_stats)
+    try:
+        os.makedirs(get_profile_dir(), exist_ok=True)
+        for endpoint, counts in stacks.items():
+            write_folded(os.path.join(get_profile_dir(), f"{endpoint}.{worker}.folded"), counts)
+        for endpoint, endpoint_stats in stats.items():
+            with _lock:
+                endpoint_stats.dump_stats(os.path.join(get_profile_dir(), f"{endpoint}.{worker}.prof"))
+    except Exception:
+        from bank_service.instrumentation import get_logger
+
+        get_logger().warning("Could not write bank_service profiles", exc_info=True)
+
+
+def write_folded(path: str, counts: dict):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        for stack, count in sorted(counts.items()):
+            f.write(f"{stack} {count}\n")
+    os.replace(tmp, path)
+
+
+def read_folded(path: str) -> Counter:
+    counts = Counter()
+    with open(path) as f:
+        for line in f:
+            stack, _, count = line.rstrip("\n").rpartition(" ")
+            if stack:
+                counts[stack] += int(count)
+    return counts
+
+
+def merge_profiles(endpoint=None) -> list:
+    """
+    Add up every worker's files per endpoint into <endpoint>.folded and
+    <endpoint>.prof in the profile directory. Returns the paths written.
+    """
+    flush(force=True)
+    directory = get_profile_dir()
+    written = []
+    for suffix in ("folded", "prof"):
+        by_endpoint = {}
+        for path in glob.glob(os.path.join(directory, f"{endpoint or '*'}.*.{suffix}")):
+            by_endpoint.setdefault(os.path.basename(path).split(".", 1)[0], []).append(path)
+        for name, paths in sorted(by_endpoint.items()):
+            target = os.path.join(directory, f"{name}.{suffix}")
+            if suffix == "folded":
+                counts = Counter()
+                for path in paths:
+                    counts.update(read_folded(path))
+                write_folded(target, counts)
+            else:
+                pstats.Stats(*paths).dump_stats(target)
+            written.append(target)
+    return written
+
+
+def clear_profiles():
+    """Drop this worker's aggregates and every profile file."""
+    with _lock:
+        _stacks.clear()
+        _stats.clear()
+    for path in glob.glob(os.path.join(get_profile_dir(), "*")):
+        os.remove(path)
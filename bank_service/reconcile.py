@@ -0,0 +1,358 @@
+# -------------------- reconcile.py -------------------- #
+"""
+Ledger reconciliation.
+
+Checks `Transactions` against the submitted Bank Entry Journal Entries and the
+`Customer Accounts` balances, and reports:
+
+* missing_posting: a Completed transfer without a submitted Journal Entry
+  (other than one still Pending in the internal ledger, or netted to zero);
+* stuck: an Initiated transfer, or a Pending internal ledger entry, untouched
+  for `stuck_after_minutes` (with whether its Journal Entry was submitted,
+  i.e. only the status update was lost);
+* amount_mismatch: for a (Journal Entry, account), the net of the Completed
+  transfers referencing the entry differs from its posted debit - credit;
+* orphaned_journal_entry: a submitted Bank Entry no transfer refers to;
+* balance_drift: a stored balance differs from credits - debits of the
+  Completed transfers (stored is null when the balance row is missing).
+
+Every table is read in keyset chunks into NumPy columns: names as fixed-width
+bytes, amounts as integer minor units. The joins are then sort/searchsorted
+and bincount passes over whole columns, so after loading nothing runs per row
+in Python and a few dozen bytes are held per row. Discrepancies are written as
+gzipped NDJSON under private/files/reconciliation, ending with a summary line.
+
+    bench --site <your-site> reconcile-ledger
+"""
+import gzip
+import json
+import os
+
+import frappe
+import numpy as np
+from frappe.utils import add_to_date, now, now_datetime
+
+from bank_service.posting import CASH_ACCOUNT
+
+DEFAULT_CHUNK_SIZE = 100_000
+DEFAULT_STUCK_AFTER_MINUTES = 60
+# Amounts are compared in minor units (paise)
+AMOUNT_PRECISION = 2
+AMOUNT_SCALE = 10**AMOUNT_PRECISION
+REPORT_DIR = ("private", "files", "reconciliation")
+
+STATUS_CODES = {"Pending": 0, "Completed": 1, "Initiated": 2, "Failed": 3}
+COMPLETED = STATUS_CODES["Completed"]
+INITIATED = STATUS_CODES["Initiated"]
+SUBMITTED = 1
+# Internal ledger state of a transfer without a Journal Entry (see bank_service.ledger)
+LEDGER_PENDING = 1
+LEDGER_NETTED = 2
+
+TRANSACTIONS_QUERY = """select t.name, t.status, t.from_account, t.to_account, t.amount, t.journal_entry,
+    t.modified < %s,
+    case
+        when le.status = 'Pending' then 1
+        when le.status = 'Consolidated' and le.journal_entry is null then 2
+        else 0
+    end
+    from `tabTransactions` t left join `tabLedger Entry` le on le.name = t.name
+    where t.name > %s order by t.name limit %s"""
+JOURNAL_ENTRIES_QUERY = """select name, docstatus from `tabJournal Entry`
+    where voucher_type = 'Bank Entry' and name > %s order by name limit %s"""
+JOURNAL_LINES_QUERY = """select jea.name, jea.parent, jea.account,
+    jea.debit_in_account_currency - jea.credit_in_account_currency
+    from `tabJournal Entry Account` jea
+    join `tabJournal Entry` je on je.name = jea.parent
+    where je.voucher_type = 'Bank Entry' and je.docstatus = 1 and jea.name > %s
+    order by jea.name limit %s"""
+BALANCES_QUERY = """select name, balance from `tabCustomer Accounts`
+    where name > %s order by name limit %s"""
+
+
+# ------------------- Columns ------------------- #
+def _names(values):
+    """Names as a fixed-width bytes column; NULL becomes b""."""
+    return np.array([(value or "").encode() for value in values], dtype="S")
+
+
+def _amounts(values):
+    return np.rint(np.array([value or 0 for value in values], dtype=np.float64) * AMOUNT_SCALE).astype(np.int64)
+
+
+def _statuses(values):
+    return np.array([STATUS_CODES.get(value, -1) for value in values], dtype=np.int8)
+
+
+def _codes(values):
+    return np.array([value or 0 for value in values], dtype=np.int8)
+
+
+def _flags(values):
+    return np.array([bool(value) for value in values], dtype=bool)
+
+
+TRANSACTION_COLUMNS = (
+    ("name", _names),
+    ("status", _statuses),
+    ("from_account", _names),
+    ("to_account", _names),
+    ("amount", _amounts),
+    ("journal_entry", _names),
+    ("stale", _flags),
+    ("ledger", _codes),
+)
+JOURNAL_ENTRY_COLUMNS = (("name", _names), ("docstatus", _codes))
+# The first column of the lines query is the keyset cursor only
+JOURNAL_LINE_COLUMNS = (("line", None), ("journal_entry", _names), ("account", _names), ("amount", _amounts))
+BALANCE_COLUMNS = (("account", _names), ("balance", _amounts))
+
+
+def to_columns(rows, spec) -> dict:
+    """{column: array} for a list of row tuples laid out as `spec`."""
+    values = list(zip(*rows, strict=True)) or [()] * len(spec)
+    return {name: convert(column) for (name, convert), column in zip(spec, values, strict=True) if convert}
+
+
+def read_columns(query, spec, chunk_size=DEFAULT_CHUNK_SIZE, params=()) -> dict:
+    """
+    Read a query keyset-paginated on its first column (it must end with
+    "<first column> > %s order by <first column> limit %s") into columns.
+    """
+    chunks, last = [], ""
+    while True:
+        rows = frappe.db.sql(query, (*params, last, chunk_size), as_list=True)
+        if not rows:
+            break
+        last = rows[-1][0]
+        chunks.append(to_columns(rows, spec))
+        if len(rows) < chunk_size:
+            break
+    if not chunks:
+        return to_columns([], spec)
+    return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+
+
+# ------------------- Joins ------------------- #
+def _distinct(values):
+    """Sorted distinct values (np.unique may hash, which is slow on bytes columns)."""
+    values = np.sort(values)
+    return values[np.concatenate([[True], values[1:] != values[:-1]])] if len(values) else values
+
+
+def _lookup(sorted_keys, values):
+    """Index of each value in `sorted_keys`, or -1 where it is absent."""
+    if not len(sorted_keys):
+        return np.full(len(values), -1, dtype=np.int64)
+    idx = np.searchsorted(sorted_keys, values)
+    clipped = np.minimum(idx, len(sorted_keys) - 1)
+    return np.where(sorted_keys[clipped] == values, clipped, -1)
+
+
+def _sum_by_key(keys, values):
+    """(sorted distinct keys, summed values)."""
+    if not len(keys):
+        return keys, values
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+    return keys[starts], np.add.reduceat(values[order], starts)
+
+
+def find_discrepancies(transactions: dict, journal_entries: dict, journal_lines: dict, balances: dict) -> dict:
+    """
+    Join the four column sets (see the *_COLUMNS specs) and return
+    {discrepancy type: {column: array}}.
+    """
+    trx = transactions
+    completed = trx["status"] == COMPLETED
+
+    # Journal Entry of every transfer
+    je_order = np.argsort(journal_entries["name"], kind="stable")
+    je_names = journal_entries["name"][je_order]
+    je_status = journal_entries["docstatus"][je_order]
+    trx_je = _lookup(je_names, trx["journal_entry"])
+    submitted = np.zeros(len(trx_je), dtype=bool)
+    linked = trx_je >= 0
+    submitted[linked] = je_status[trx_je[linked]] == SUBMITTED
+
+    pending = trx["ledger"] == LEDGER_PENDING
+    missing = completed & ~submitted & (trx["ledger"] == 0)
+    stuck = ((trx["status"] == INITIATED) | pending) & trx["stale"]
+
+    # One account vocabulary for transfers, Journal Entry lines and balances
+    accounts = _distinct(np.concatenate([
+        trx["from_account"],
+        trx["to_account"],
+        journal_lines["account"],
+        balances["account"],
+    ]))
+    n_accounts = max(len(accounts), 1)
+    from_code = np.searchsorted(accounts, trx["from_account"])
+    to_code = np.searchsorted(accounts, trx["to_account"])
+
+    # Expected net (debit - credit) per (Journal Entry, account) from the posted transfers
+    posted = completed & submitted
+    je = trx_je[posted].astype(np.int64)
+    amount = trx["amount"][posted]
+    expected_keys, expected = _sum_by_key(
+        np.concatenate([je * n_accounts + to_code[posted], je * n_accounts + from_code[posted]]),
+        np.concatenate([amount, -amount]),
+    )
+
+    # Posted lines of the entries those transfers refer to; the other entries are orphans
+    referenced = np.zeros(len(je_names), dtype=bool)
+    referenced[je] = True
+    line_je = _lookup(je_names, journal_lines["journal_entry"])
+    keep = line_je >= 0
+    keep[keep] = referenced[line_je[keep]]
+    actual_keys, actual = _sum_by_key(
+        line_je[keep] * n_accounts + np.searchsorted(accounts, journal_lines["account"][keep]),
+        journal_lines["amount"][keep],
+    )
+
+    keys = _distinct(np.concatenate([expected_keys, actual_keys]))
+    expected_net = np.zeros(len(keys), dtype=np.int64)
+    actual_net = np.zeros(len(keys), dtype=np.int64)
+    expected_net[np.searchsorted(keys, expected_keys)] = expected
+    actual_net[np.searchsorted(keys, actual_keys)] = actual
+    mismatch = expected_net != actual_net
+
+    referenced_any = np.zeros(len(je_names), dtype=bool)
+    referenced_any[trx_je[linked]] = True
+    orphaned = (je_status == SUBMITTED) & ~referenced_any
+
+    # Balances: credits - debits of Completed transfers per account
+    ledger = np.rint(
+        np.bincount(to_code[completed], weights=trx["amount"][completed], minlength=len(accounts))
+        - np.bincount(from_code[completed], weights=trx["amount"][completed], minlength=len(accounts))
+    ).astype(np.int64)
+    stored = np.zeros(len(accounts), dtype=np.int64)
+    has_row = np.zeros(len(accounts), dtype=bool)
+    balance_code = np.searchsorted(accounts, balances["account"])
+    stored[balance_code] = balances["balance"]
+    has_row[balance_code] = True
+    customer = accounts != CASH_ACCOUNT.encode()
+    drift = customer & ((has_row & (stored != ledger)) | (~has_row & (ledger != 0)))
+
+    return {
+        "missing_posting": {
+            "transaction": trx["name"][missing],
+            "journal_entry": trx["journal_entry"][missing],
+            "amount": trx["amount"][missing],
+        },
+        "stuck": {
+            "transaction": trx["name"][stuck],
+            "journal_entry_submitted": submitted[stuck],
+        },
+        "amount_mismatch": {
+            "journal_entry": je_names[keys[mismatch] // n_accounts],
+            "account": accounts[keys[mismatch] % n_accounts],
+            "expected": expected_net[mismatch],
+            "posted": actual_net[mismatch],
+        },
+        "orphaned_journal_entry": {
+            "journal_entry": je_names[orphaned],
+        },
+        "balance_drift": {
+            "account": accounts[drift],
+            "stored": np.where(has_row[drift], stored[drift], 0),
+            "has_row": has_row[drift],
+            "ledger": ledger[drift],
+        },
+    }
+
+
+# ------------------- Report ------------------- #
+def _money(minor_units):
+    return int(minor_units) / AMOUNT_SCALE
+
+
+def iter_report_records(discrepancies: dict):
+    """One JSON-ready dict per discrepancy."""
+    missing = discrepancies["missing_posting"]
+    for name, je, amount in zip(missing["transaction"], missing["journal_entry"], missing["amount"], strict=True):
+        yield {
+            "type": "missing_posting",
+            "transaction": name.decode(),
+            "journal_entry": je.decode() or None,
+            "amount": _money(amount),
+        }
+    stuck = discrepancies["stuck"]
+    for name, je_submitted in zip(stuck["transaction"], stuck["journal_entry_submitted"], strict=True):
+        yield {"type": "stuck", "transaction": name.decode(), "journal_entry_submitted": bool(je_submitted)}
+    mismatches = discrepancies["amount_mismatch"]
+    for je, account, expected, posted in zip(
+        mismatches["journal_entry"], mismatches["account"], mismatches["expected"], mismatches["posted"], strict=True
+    ):
+        yield {
+            "type": "amount_mismatch",
+            "journal_entry": je.decode(),
+            "account": account.decode(),
+            "expected": _money(expected),
+            "posted": _money(posted),
+        }
+    for je in discrepancies["orphaned_journal_entry"]["journal_entry"]:
+        yield {"type": "orphaned_journal_entry", "journal_entry": je.decode()}
+    drift = discrepancies["balance_drift"]
+    for account, stored, has_row, ledger in zip(
+        drift["account"], drift["stored"], drift["has_row"], drift["ledger"], strict=True
+    ):
+        yield {
+            "type": "balance_drift",
+            "account": account.decode(),
+            "stored": _money(stored) if has_row else None,
+            "ledger": _money(ledger),
+        }
+
+
+def count_discrepancies(discrepancies: dict) -> dict:
+    return {name: len(next(iter(columns.values()))) for name, columns in discrepancies.items()}
+
+
+def write_report(discrepancies: dict, summary: dict, path: str):
+    """Gzipped NDJSON: one line per discrepancy, then {"type": "summary", ...}."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for record in iter_report_records(discrepancies):
+            f.write(json.dumps(record) + "\n")
+        f.write(json.dumps({"type": "summary", **summary}) + "\n")
+
+
+# ------------------- Job ------------------- #
+def reconcile_ledger(chunk_size=DEFAULT_CHUNK_SIZE, stuck_after_minutes=DEFAULT_STUCK_AFTER_MINUTES, report_path=None):
+    """Reconcile the whole ledger and write the report. Returns the summary."""
+    started = now_datetime()
+    stale_before = add_to_date(now(), minutes=-stuck_after_minutes)
+
+    transactions = read_columns(TRANSACTIONS_QUERY, TRANSACTION_COLUMNS, chunk_size, params=(stale_before,))
+    journal_entries = read_columns(JOURNAL_ENTRIES_QUERY, JOURNAL_ENTRY_COLUMNS, chunk_size)
+    journal_lines = read_columns(JOURNAL_LINES_QUERY, JOURNAL_LINE_COLUMNS, chunk_size)
+    balances = read_columns(BALANCES_QUERY, BALANCE_COLUMNS, chunk_size)
+    loaded = now_datetime()
+
+    discrepancies = find_discrepancies(transactions, journal_entries, journal_lines, balances)
+    report_path = report_path or frappe.get_site_path(
+        *REPORT_DIR, f"reconciliation-{started.strftime('%Y%m%d-%H%M%S')}.ndjson.gz"
+    )
+    summary = {
+        "started": str(started),
+        "transactions": len(transactions["name"]),
+        "journal_entries": len(journal_entries["name"]),
+        "journal_lines": len(journal_lines["journal_entry"]),
+        "balances": len(balances["account"]),
+        "discrepancies": count_discrepancies(discrepancies),
+        "load_seconds": (loaded - started).total_seconds(),
+        "seconds": (now_datetime() - started).total_seconds(),
+        "report": report_path,
+    }
+    write_report(discrepancies, summary, report_path)
+
+    if any(summary["discrepancies"].values()):
+        frappe.log_error(json.dumps(summary, indent=1), "Ledger Reconciliation Discrepancies")
+    return summary
+
+
+def run_reconciliation():
+    """Scheduler (daily_long): reconcile with the default settings."""
+    reconcile_ledger()
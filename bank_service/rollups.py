@@ -0,0 +1,175 @@
+# -------------------- rollups.py -------------------- #
+"""
+Per-account daily rollups (`Account Daily Rollup`, one row per account and
+day of the transfer's date_time): inflow, outflow, transfer count and
+largest transfer of the Completed transfers.
+
+Transfers update their rows in the same DB transaction that completes them,
+right after the balance update, with a multi-row upsert. backfill_rollups
+rebuilds them from history chunk by chunk of accounts; like rebuild_balances
+it locks the chunk's balance rows first, so a transfer committing meanwhile
+lands on top of the rebuilt rows instead of being lost or counted twice.
+"""
+import frappe
+from frappe.utils import flt, getdate, now
+
+from bank_service.posting import CASH_ACCOUNT
+
+BACKFILL_CHUNK_SIZE = 1000
+# Rows per multi-row upsert
+UPSERT_CHUNK_SIZE = 500
+
+ROLLUP_FIELDS = (
+    "name",
+    "account",
+    "date",
+    "inflow",
+    "outflow",
+    "transaction_count",
+    "largest_transfer",
+    "owner",
+    "modified_by",
+    "creation",
+    "modified",
+    "docstatus",
+)
+
+
+def rollup_name(account: str, date) -> str:
+    return f"{account}-{getdate(date)}"
+
+
+def rollup_deltas(transfers) -> dict:
+    """{(account, date): [inflow, outflow, count, largest]} for Completed transfers."""
+    deltas = {}
+    for transfer in transfers:
+        amount = flt(transfer.amount)
+        date = getdate(transfer.date_time)
+        for account, inflow, outflow in (
+            (transfer.to_account, amount, 0),
+            (transfer.from_account, 0, amount),
+        ):
+            if account == CASH_ACCOUNT:
+                continue
+            row = deltas.setdefault((account, date), [0, 0, 0, 0])
+            row[0] += inflow
+            row[1] += outflow
+            row[2] += 1
+            row[3] = max(row[3], amount)
+    return deltas
+
+
+def apply_rollup_deltas(deltas: dict):
+    """Add deltas to the rollup rows in the current DB transaction, creating missing rows."""
+    timestamp = now()
+    user = frappe.session.user
+    columns = ", ".join(f"`{field}`" for field in ROLLUP_FIELDS)
+    row_placeholder = "({})".format(", ".join(["%s"] * len(ROLLUP_FIELDS)))
+    # Same key order for every writer, so concurrent transfers lock rows in the same order
+    keys = sorted(deltas)
+    for start in range(0, len(keys), UPSERT_CHUNK_SIZE):
+        chunk = keys[start:start + UPSERT_CHUNK_SIZE]
+        values = []
+        for account, date in chunk:
+            values.extend((rollup_name(account, date), account, date, *deltas[(account, date)]))
+            values.extend((user, user, timestamp, timestamp, 0))
+        frappe.db.sql(
+            f"""insert into `tabAccount Daily Rollup` ({columns})
+            values {", ".join([row_placeholder] * len(chunk))}
+            on duplicate key update
+                inflow = inflow + values(inflow),
+                outflow = outflow + values(outflow),
+                transaction_count = transaction_count + values(transaction_count),
+                largest_transfer = greatest(largest_transfer, values(largest_transfer)),
+                modified = values(modified)""",
+            values,
+        )
+
+
+def backfill_rollups(chunk_size=BACKFILL_CHUNK_SIZE, commit=True):
+    """
+    Rebuild every rollup row from Completed `Transactions`, chunk by chunk of
+    accounts.
+
+    Transfers update balances before rollups, so each chunk locks its
+    `Customer Accounts` rows in its first statement. The snapshot the totals
+    are read from is taken only once those locks are held, and a transfer on
+    the chunk either is in the totals or waits and adds its delta afterwards.
+    With commit=False the caller must not have read anything in its
+    transaction yet.
+    """
+    rebuilt = rows = 0
+    last = ""
+    while True:
+        # A locking read does not start the snapshot; the totals below do
+        accounts = frappe.db.sql(
+            """select name from `tabCustomer Accounts` where name > %s order by name limit %s for update""",
+            (last, chunk_size),
+            pluck=True,
+        )
+        if not accounts:
+            break
+        last = accounts[-1]
+        accounts = tuple(accounts)
+
+        totals = frappe.db.sql(
+            """select account, day, sum(inflow), sum(outflow), sum(transfers), max(largest) from (
+                select to_account as account, date(date_time) as day, sum(amount) as inflow, 0 as outflow,
+                    count(*) as transfers, max(amount) as largest
+                from `tabTransactions` where status = 'Completed' and to_account in %(accounts)s
+                group by to_account, date(date_time)
+                union all
+                select from_account, date(date_time), 0, sum(amount), count(*), max(amount)
+                from `tabTransactions` where status = 'Completed' and from_account in %(accounts)s
+                group by from_account, date(date_time)
+            ) t group by account, day""",
+            {"accounts": accounts},
+        )
+
+        frappe.db.delete("Account Daily Rollup", {"account": ("in", accounts)})
+        timestamp = now()
+        user = frappe.session.user
+        frappe.db.bulk_insert(
+            "Account Daily Rollup",
+            ROLLUP_FIELDS,
+            [
+                (rollup_name(account, day), account, day, *sums, user, user, timestamp, timestamp, 0)
+                for account, day, *sums in totals
+            ],
+        )
+        rebuilt += len(accounts)
+        rows += len(totals)
+        if commit:
+            frappe.db.commit()
+
+    return {"accounts": rebuilt, "rows": rows}
+
+
+def enqueue_backfill(chunk_size=BACKFILL_CHUNK_SIZE):
+    """Run backfill_rollups as a background job on the long queue."""
+    return frappe.enqueue(
+        "bank_service.rollups.backfill_rollups",
+        queue="long",
+        timeout=6 * 60 * 60,
+        chunk_size=chunk_size,
+    )
+
+
+def get_rollups(account: str, from_date, to_date) -> dict:
+    """Daily rows of an account between two dates (inclusive) and their totals."""
+    days = frappe.get_all(
+        "Account Daily Rollup",
+        filters={"account": account, "date": ("between", (getdate(from_date), getdate(to_date)))},
+        fields=["date", "inflow", "outflow", "transaction_count", "largest_transfer"],
+        order_by="date asc",
+    )
+    return {
+        "account": account,
+        "from_date": str(getdate(from_date)),
+        "to_date": str(getdate(to_date)),
+        "days": days,
+        "inflow": sum(flt(d.inflow) for d in days),
+        "outflow": sum(flt(d.outflow) for d in days),
+        "transaction_count": sum(d.transaction_count or 0 for d in days),
+        "largest_transfer": max((flt(d.largest_transfer) for d in days), default=0),
+    }
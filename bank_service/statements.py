@@ -0,0 +1,249 @@
+# -------------------- statements.py -------------------- #
+"""
+Account statements over `Transactions`.
+
+Pages are read newest first with keyset (seek) pagination on
+(date_time, name): the cursor is the last row of the previous page, so every
+page is an index range scan on (from_account, date_time) / (to_account,
+date_time) no matter how deep the client pages.
+"""
+import base64
+import csv
+import io
+import json
+import os
+import struct
+
+import frappe
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from frappe.utils import cint, get_datetime
+
+from bank_service.utils import wrap_key_for_client
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+STATEMENT_COLUMNS = "name, transaction_type, from_account, to_account, amount, status, date_time, remarks"
+
+
+def encode_cursor(row) -> str:
+    return base64.urlsafe_b64encode(json.dumps([str(row.date_time), row.name]).encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    """Return (date_time, name) of the last row already returned."""
+    try:
+        date_time, name = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return get_datetime(date_time), name
+    except Exception:
+        frappe.throw("Invalid cursor")
+
+
+def get_statement_page(account: str, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """Return (rows, next_cursor) for one statement page of `account`, newest first."""
+    limit = min(max(cint(limit) or DEFAULT_PAGE_SIZE, 1), MAX_PAGE_SIZE)
+    after = decode_cursor(cursor) if cursor else None
+
+    rows = read_statement_rows(frappe.db, account, after, limit)
+    next_cursor = encode_cursor(rows[-1]) if len(rows) == limit else None
+    return rows, next_cursor
+
+
+def read_statement_rows(db, account: str, after, limit: int):
+    """Up to `limit` rows of `account` older than `after` = (date_time, name), newest first."""
+    values = {"account": account, "limit": limit}
+
+    seek = ""
+    if after:
+        values["after_dt"], values["after_name"] = after
+        seek = "and (date_time < %(after_dt)s or (date_time = %(after_dt)s and name < %(after_name)s))"
+
+    # One index range scan per direction, merged and cut to the page size
+    return db.sql(
+        f"""
+        (select {STATEMENT_COLUMNS}, 'debit' as direction from `tabTransactions`
+            where from_account = %(account)s {seek}
+            order by date_time desc, name desc limit %(limit)s)
+        union all
+        (select {STATEMENT_COLUMNS}, 'credit' as direction from `tabTransactions`
+            where to_account = %(account)s {seek}
+            order by date_time desc, name desc limit %(limit)s)
+        order by date_time desc, name desc
+        limit %(limit)s
+        """,
+        values,
+        as_dict=True,
+    )
+
+
+def iter_statement_chunks(db, account: str, chunk_size: int):
+    """Yield the whole history of `account` as lists of at most `chunk_size` rows."""
+    after = None
+    while True:
+        rows = read_statement_rows(db, account, after, chunk_size)
+        if rows:
+            yield rows
+        if len(rows) < chunk_size:
+            return
+        after = (rows[-1].date_time, rows[-1].name)
+
+
+def serialize_statement_row(row) -> dict:
+    return {
+        "transaction_id": row.name,
+        "transaction_type": row.transaction_type,
+        "direction": row.direction,
+        "from_account": row.from_account,
+        "to_account": row.to_account,
+        "amount": row.amount,
+        "status": row.status,
+        "date_time": str(row.date_time),
+        "remarks": row.remarks,
+    }
+
+
+# ------------------- Streaming Export ------------------- #
+# An export is a stream of AES-256-GCM frames under a fresh per-export key
+# (STREAM construction): nonce = 7-byte random prefix || 4-byte frame counter
+# || 1-byte last-frame flag, and every frame authenticates the stream header,
+# so frames cannot be reordered, dropped or truncated undetected.
+#
+#   header: b"BSX1" | wrap mode (u8) | format (u8) | wrapped key length (u16)
+#           | wrapped key | nonce prefix (7 bytes)
+#   frame:  ciphertext length (u32) | ciphertext with tag
+#
+# The export key is wrapped with RSA-OAEP-SHA256 for the account's registered
+# key, or with AES-GCM under the session key (12-byte nonce || ciphertext,
+# associated data "<session id>:response:export").
+EXPORT_MAGIC = b"BSX1"
+KEY_WRAP_RSA_OAEP = 1
+KEY_WRAP_SESSION = 2
+EXPORT_FORMATS = {"ndjson": 1, "csv": 2}
+DEFAULT_EXPORT_CHUNK_SIZE = 5000
+MAX_EXPORT_CHUNK_SIZE = 50000
+
+CSV_COLUMNS = (
+    "transaction_id",
+    "transaction_type",
+    "direction",
+    "from_account",
+    "to_account",
+    "amount",
+    "status",
+    "date_time",
+    "remarks",
+)
+
+
+def encode_rows(rows, fmt: str, with_header=False) -> bytes:
+    if fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=CSV_COLUMNS)
+        if with_header:
+            writer.writeheader()
+        writer.writerows(serialize_statement_row(row) for row in rows)
+        return buf.getvalue().encode()
+    return "".join(json.dumps(serialize_statement_row(row)) + "\n" for row in rows).encode()
+
+
+class StreamEncryptor:
+    """Seals export chunks into length-prefixed AES-GCM frames."""
+
+    def __init__(self, key: bytes, wrap_mode: int, fmt: str, wrapped_key: bytes):
+        self._aead = AESGCM(key)
+        self._prefix = os.urandom(7)
+        self._counter = 0
+        self.header = (
+            EXPORT_MAGIC
+            + struct.pack(">BBH", wrap_mode, EXPORT_FORMATS[fmt], len(wrapped_key))
+            + wrapped_key
+            + self._prefix
+        )
+
+    def seal(self, plaintext: bytes, last=False) -> bytes:
+        nonce = self._prefix + struct.pack(">I", self._counter) + (b"\x01" if last else b"\x00")
+        self._counter += 1
+        ciphertext = self._aead.encrypt(nonce, plaintext, self.header)
+        return struct.pack(">I", len(ciphertext)) + ciphertext
+
+
+def iter_encrypted_export(chunks, fmt: str, encryptor: StreamEncryptor):
+    """Yield the header and one frame per row chunk; only one chunk is held at a time."""
+    yield encryptor.header
+    pending = None
+    for rows in chunks:
+        if pending is not None:
+            yield encryptor.seal(pending)
+        pending = encode_rows(rows, fmt, with_header=pending is None)
+    if pending is None:
+        pending = encode_rows([], fmt, with_header=True)
+    yield encryptor.seal(pending, last=True)
+
+
+def new_export_encryptor(fmt: str, client_key=None, session=None) -> StreamEncryptor:
+    """Create the per-export key and wrap it for the client key or session."""
+    key = AESGCM.generate_key(bit_length=256)
+    if session:
+        nonce = os.urandom(12)
+        aad = f"{session['id']}:response:export".encode()
+        return StreamEncryptor(key, KEY_WRAP_SESSION, fmt, nonce + AESGCM(session["key"]).encrypt(nonce, key, aad))
+    return StreamEncryptor(key, KEY_WRAP_RSA_OAEP, fmt, wrap_key_for_client(client_key, key))
+
+
+def stream_statement_export(account: str, fmt: str, chunk_size: int, encryptor: StreamEncryptor):
+    """
+    Generator for the export response body. It runs after the request handler
+    has returned (and closed frappe.db), so it reads through its own connection.
+
+    The history is read as keyset chunks inside one read-only REPEATABLE READ
+    transaction started WITH CONSISTENT SNAPSHOT, so every chunk sees the same
+    snapshot and transfers committed mid-export neither appear nor shift the
+    chunk boundaries. An unbuffered server-side cursor is not used: frappe's
+    Database.sql buffers every result set, and an open unbuffered result would
+    tie up the connection for as long as the client takes to download.
+    """
+    from frappe.database import get_db
+
+    db = get_db()
+
+    def generate():
+        db.connect()
+        try:
+            db.sql("set session transaction isolation level repeatable read")
+            db.sql("start transaction with consistent snapshot, read only")
+            yield from iter_encrypted_export(iter_statement_chunks(db, account, chunk_size), fmt, encryptor)
+        finally:
+            db.close()
+
+    return generate()
+
+
+def decrypt_export(stream, unwrap_key):
+    """
+    Reference reader for clients and benchmarks: yield plaintext chunks of an
+    export read from a binary file-like `stream`. `unwrap_key(wrap_mode,
+    wrapped_key)` must return the 32-byte export key.
+    """
+    fixed = stream.read(8)
+    if fixed[:4] != EXPORT_MAGIC:
+        raise ValueError("Not a statement export")
+    wrap_mode, _fmt, key_len = struct.unpack(">BBH", fixed[4:])
+    wrapped_key = stream.read(key_len)
+    prefix = stream.read(7)
+    header = fixed + wrapped_key + prefix
+    aead = AESGCM(unwrap_key(wrap_mode, wrapped_key))
+
+    counter = 0
+    while True:
+        size = stream.read(4)
+        if len(size) < 4:
+            raise ValueError("Truncated statement export")
+        frame = stream.read(struct.unpack(">I", size)[0])
+        base = prefix + struct.pack(">I", counter)
+        try:
+            yield aead.decrypt(base + b"\x00", frame, header)
+        except InvalidTag:
+            yield aead.decrypt(base + b"\x01", frame, header)
+            return
+        counter += 1
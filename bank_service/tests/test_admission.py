@@ -0,0 +1,50 @@
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from bank_service.admission import admit
+from bank_service.banks import canonical_bank, clear_bank_registry
+from bank_service.cache import LocalStore
+
+
+class TestAdmission(FrappeTestCase):
+	def test_token_bucket_refuses_beyond_burst(self):
+		store = LocalStore()
+		results = [store.take("bucket", rate=1, burst=3)[0] for _ in range(5)]
+		self.assertEqual(results, [True, True, True, False, False])
+		allowed, wait = store.take("bucket", rate=1, burst=3)
+		self.assertFalse(allowed)
+		self.assertGreater(wait, 0)
+
+	def test_admission_throttles_before_decryption(self):
+		frappe.local.request_ip = "203.0.113.7"
+		limits = {"ip": (0.001, 5), "client": (0.001, 5)}
+		with patch("bank_service.admission.get_store", return_value=LocalStore()), patch(
+			"bank_service.admission.get_limits", return_value=limits
+		):
+			# The payload is never decrypted, so it does not need to be a valid envelope
+			results = [admit("get_balance", {"encrypted_payload": "..."}) for _ in range(7)]
+
+		self.assertEqual(results[:5], [None] * 5)
+		self.assertEqual(results[5].status_code, 429)
+		self.assertIn("Retry-After", results[5].headers)
+
+	def test_admission_buckets_unknown_banks_with_the_default_bank(self):
+		frappe.local.request_ip = "203.0.113.8"
+		limits = {"ip": (0.001, 2), "client": (0.001, 2)}
+		with patch("bank_service.admission.get_store", return_value=LocalStore()), patch(
+			"bank_service.admission.get_limits", return_value=limits
+		), patch("bank_service.banks.get_bank_names", return_value=["HDFC", "ICICI"]), patch(
+			"bank_service.banks.get_default_bank", return_value="HDFC"
+		):
+			clear_bank_registry()
+			self.assertEqual(canonical_bank("icici"), "ICICI")
+			# Rotating bank_name must not open a fresh bucket each time
+			results = [admit("get_balance", {}, bank_name=name) for name in ("nope-1", "nope-2", "hdfc")]
+			other_bank = admit("get_balance", {}, bank_name="ICICI")
+		clear_bank_registry()
+
+		self.assertEqual(results[:2], [None] * 2)
+		self.assertEqual(results[2].status_code, 429)
+		self.assertIsNone(other_bank)
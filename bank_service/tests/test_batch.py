@@ -0,0 +1,201 @@
+from contextlib import ExitStack
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from bank_service.api import make_transactions_batch
+from bank_service.posting import post_transfers, validate_transfer
+from bank_service.velocity import VelocityLimitExceeded
+
+ACCOUNT = "10000000424"
+
+
+def _transfer(to_account, amount=10, from_account=ACCOUNT):
+	return validate_transfer(
+		{
+			"transaction_type": "Account Transfer",
+			"from_account": from_account,
+			"to_account": to_account,
+			"amount": amount,
+		}
+	)[0]
+
+
+class FakeJournalEntries:
+	"""make_journal_entry stand-in: records the lines of every entry and refuses any touching "BAD"."""
+
+	def __init__(self):
+		self.calls = []
+
+	def __call__(self, lines, remarks=""):
+		self.calls.append(lines)
+		if any(line["account"] == "BAD" for line in lines):
+			raise frappe.ValidationError("Account BAD is frozen")
+		return frappe._dict(name=f"JE-{len(self.calls)}")
+
+
+class TestBatch(FrappeTestCase):
+	def test_post_transfers_consolidates_a_chunk(self):
+		transfers = [_transfer("10000000432"), _transfer("10000000440", amount=25)]
+		journal_entries = FakeJournalEntries()
+		with patch("bank_service.posting.make_journal_entry", journal_entries):
+			post_transfers(transfers)
+
+		self.assertEqual(len(journal_entries.calls), 1)
+		self.assertEqual(len(journal_entries.calls[0]), 4)
+		self.assertEqual([t.journal_entry for t in transfers], ["JE-1", "JE-1"])
+		self.assertFalse(any(t.get("error") for t in transfers))
+
+	def test_post_transfers_splits_into_chunks(self):
+		transfers = [_transfer("10000000432") for _ in range(5)]
+		journal_entries = FakeJournalEntries()
+		with (
+			patch("bank_service.posting.JOURNAL_CHUNK_SIZE", 2),
+			patch("bank_service.posting.make_journal_entry", journal_entries),
+		):
+			post_transfers(transfers)
+
+		self.assertEqual([len(lines) for lines in journal_entries.calls], [4, 4, 2])
+		self.assertEqual([t.journal_entry for t in transfers], ["JE-1", "JE-1", "JE-2", "JE-2", "JE-3"])
+
+	def test_post_transfers_falls_back_to_one_entry_per_transfer(self):
+		transfers = [_transfer("10000000432"), _transfer("BAD"), _transfer("10000000440")]
+		journal_entries = FakeJournalEntries()
+		with patch("bank_service.posting.make_journal_entry", journal_entries):
+			post_transfers(transfers)
+
+		# The consolidated entry failed, then each transfer was posted on its own
+		self.assertEqual([len(lines) for lines in journal_entries.calls], [6, 2, 2, 2])
+		good, bad, other = transfers
+		self.assertEqual((good.journal_entry, other.journal_entry), ("JE-2", "JE-4"))
+		self.assertIsNone(bad.get("journal_entry"))
+		self.assertIn("frozen", bad.error)
+
+	def test_post_transfers_leaves_deadlocks_to_the_caller(self):
+		with patch("bank_service.posting.make_journal_entry", side_effect=frappe.QueryDeadlockError):
+			with self.assertRaises(frappe.QueryDeadlockError):
+				post_transfers([_transfer("10000000432")])
+
+	def _make_transactions_batch(self, items, journal_entries, velocity_refused=()):
+		"""Run the batch endpoint on decrypted `items` with posting and storage replaced by fakes."""
+		inserted, refunds = [], []
+
+		def insert_transactions(transfers, status="Initiated"):
+			for transfer in transfers:
+				transfer.name = f"TXN{transfer.index}"
+				transfer.date_time = "2026-01-01 10:00:00"
+			inserted.append([t.name for t in transfers])
+
+		def charge_velocity(account, amount, bank_name=None):
+			if amount in velocity_refused:
+				raise VelocityLimitExceeded("Velocity limit exceeded", 30)
+			return amount
+
+		payload = {"account_number": ACCOUNT, "transactions": items}
+		with ExitStack() as stack:
+			for target, kwargs in (
+				("bank_service.api._parse_request", {"return_value": {"encrypted_payload": "..."}}),
+				("bank_service.api.admit", {"return_value": None}),
+				("bank_service.api._decrypt_request", {"return_value": (payload, None, "HDFC", None)}),
+				("bank_service.api.get_bank_settings", {"return_value": frappe._dict(max_batch_size=10)}),
+				("bank_service.api.get_account", {"return_value": frappe._dict(name=ACCOUNT)}),
+				("bank_service.api.existing_accounts", {"return_value": {ACCOUNT, "10000000432", "BAD"}}),
+				("bank_service.api.charge_velocity", {"side_effect": charge_velocity}),
+				("bank_service.api.refund_velocity", {"side_effect": refunds.append}),
+				(
+					"bank_service.api.run_locked",
+					{"side_effect": lambda endpoint, accounts, fn, bank_name: fn()},
+				),
+				("bank_service.api.insert_transactions", {"side_effect": insert_transactions}),
+				("bank_service.api.apply_balance_deltas", {}),
+				("bank_service.api.apply_rollup_deltas", {}),
+				("bank_service.posting.make_journal_entry", {"side_effect": journal_entries}),
+			):
+				stack.enter_context(patch(target, **kwargs))
+			encrypt = stack.enter_context(
+				patch("bank_service.api._encrypt_response", return_value="encrypted")
+			)
+			response = make_transactions_batch()
+
+		result = encrypt.call_args.args[2] if encrypt.called else None
+		return response, result, inserted, refunds
+
+	def test_batch_reports_each_item(self):
+		items = [
+			{
+				"transaction_type": "Account Transfer",
+				"from_account": ACCOUNT,
+				"to_account": "10000000432",
+				"amount": 10,
+			},
+			{
+				"transaction_type": "Account Transfer",
+				"from_account": ACCOUNT,
+				"to_account": "BAD",
+				"amount": 20,
+			},
+			{
+				"transaction_type": "Account Transfer",
+				"from_account": "10000000432",
+				"to_account": ACCOUNT,
+				"amount": 5,
+			},
+			{
+				"transaction_type": "Account Transfer",
+				"from_account": ACCOUNT,
+				"to_account": "10000000999",
+				"amount": 5,
+			},
+			{
+				"transaction_type": "Account Transfer",
+				"from_account": ACCOUNT,
+				"to_account": "10000000432",
+				"amount": 0,
+			},
+		]
+		response, result, inserted, refunds = self._make_transactions_batch(items, FakeJournalEntries())
+
+		self.assertEqual(response["status"], "success")
+		self.assertEqual((result["succeeded"], result["failed"]), (1, 4))
+		statuses = [(r["index"], r["status"]) for r in result["results"]]
+		self.assertEqual(statuses, [(0, "success"), (1, "fail"), (2, "fail"), (3, "fail"), (4, "fail")])
+		self.assertEqual(result["results"][0]["journal_entry"], "JE-2")
+		self.assertIn("not initiated by the batch account", result["results"][2]["message"])
+		self.assertIn("Unknown account 10000000999", result["results"][3]["message"])
+		# Only the two transfers that passed validation were recorded; the one that failed posting was refunded
+		self.assertEqual(inserted, [["TXN0", "TXN1"]])
+		self.assertEqual(refunds, [20])
+
+	def test_batch_velocity_refusal_fails_only_that_item(self):
+		items = [
+			{
+				"transaction_type": "Account Transfer",
+				"from_account": ACCOUNT,
+				"to_account": "10000000432",
+				"amount": amount,
+			}
+			for amount in (10, 99, 30)
+		]
+		_, result, inserted, refunds = self._make_transactions_batch(
+			items, FakeJournalEntries(), velocity_refused=(99,)
+		)
+
+		self.assertEqual([r["status"] for r in result["results"]], ["success", "fail", "success"])
+		self.assertEqual(result["results"][1]["retry_after"], 30)
+		self.assertEqual(inserted, [["TXN0", "TXN2"]])
+		self.assertEqual(refunds, [])
+
+	def test_batch_rejects_oversized_batches(self):
+		items = [
+			{
+				"transaction_type": "Account Transfer",
+				"from_account": ACCOUNT,
+				"to_account": "10000000432",
+				"amount": 1,
+			}
+		] * 11
+		response, _, inserted, _ = self._make_transactions_batch(items, FakeJournalEntries())
+
+		self.assertEqual(response, {"status": "fail", "message": "Batch exceeds 10 transactions"})
+		self.assertEqual(inserted, [])
@@ -0,0 +1,88 @@
+from unittest.mock import patch
+
+import frappe
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa as crypto_rsa
+from frappe.tests.utils import FrappeTestCase
+
+from bank_service import accounts, utils
+from bank_service.accounts import _account_cache
+from bank_service.utils import _client_key_cache, cache_client_public_key, get_client_key_cache_stats
+
+SETTINGS = {
+	"HDFC": frappe._dict(client_key_cache_size=8, account_cache_size=16, account_cache_ttl=60),
+	"AXIS": frappe._dict(client_key_cache_size=4),
+}
+
+
+class TestCaches(FrappeTestCase):
+	def setUp(self):
+		self.settings = {bank: frappe._dict(settings) for bank, settings in SETTINGS.items()}
+		self.generation = "g1"
+		for target, side_effect in (
+			(
+				"bank_service.utils.get_bank_settings",
+				lambda bank_name=None: self.settings[bank_name or "HDFC"],
+			),
+			(
+				"bank_service.accounts.get_bank_settings",
+				lambda bank_name=None: self.settings[bank_name or "HDFC"],
+			),
+			("bank_service.utils.get_generation", lambda: self.generation),
+			("bank_service.accounts.get_generation", lambda: self.generation),
+			("bank_service.utils.get_default_bank", lambda: "HDFC"),
+		):
+			patcher = patch(target, side_effect=side_effect)
+			patcher.start()
+			self.addCleanup(patcher.stop)
+		patcher = patch.object(utils, "_client_keys", {})
+		patcher.start()
+		self.addCleanup(patcher.stop)
+		patcher = patch.object(accounts, "_accounts", None)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def _bump(self, **changes):
+		"""A new registry generation, as after a Bank Settings save; `changes` apply to HDFC's settings."""
+		self.generation += "'"
+		self.settings["HDFC"] = frappe._dict(self.settings["HDFC"], **changes)
+
+	def test_client_key_cache_is_per_bank(self):
+		pem = (
+			crypto_rsa.generate_private_key(public_exponent=65537, key_size=2048)
+			.public_key()
+			.public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+			.decode()
+		)
+		fingerprint, key = cache_client_public_key(pem, "AXIS")
+
+		self.assertIs(_client_key_cache("AXIS").get(fingerprint), key)
+		self.assertIsNone(_client_key_cache("HDFC").get(fingerprint))
+		# No bank name is the default bank
+		self.assertIs(_client_key_cache(), _client_key_cache("HDFC"))
+		stats = get_client_key_cache_stats()
+		self.assertEqual((stats["size"], stats["banks"]["AXIS"]["maxsize"]), (1, 4))
+		self.assertEqual(stats["banks"]["HDFC"]["maxsize"], 8)
+
+	def test_client_key_cache_survives_unrelated_generation_bumps(self):
+		cache = _client_key_cache("HDFC")
+		cache.set("fingerprint", "key")
+
+		self._bump(session_ttl=300)
+		self.assertIs(_client_key_cache("HDFC"), cache)
+		self.assertEqual(cache.get("fingerprint"), "key")
+
+		self._bump(client_key_cache_size=32)
+		resized = _client_key_cache("HDFC")
+		self.assertIsNot(resized, cache)
+		self.assertEqual(resized.maxsize, 32)
+
+	def test_account_cache_survives_unrelated_generation_bumps(self):
+		cache = _account_cache()
+		self.assertEqual((cache.maxsize, cache.ttl), (16, 60))
+
+		self._bump(session_ttl=300)
+		self.assertIs(_account_cache(), cache)
+
+		self._bump(account_cache_ttl=5)
+		self.assertEqual(_account_cache().ttl, 5)
@@ -0,0 +1,84 @@
+from contextlib import ExitStack
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from bank_service.locks import BACKOFF_BASE, BACKOFF_MAX, backoff, run_locked
+
+
+class TestLocks(FrappeTestCase):
+	def _run_locked(self, accounts, fn, attempts=3):
+		"""Run run_locked with the lock queries, rollbacks, sleeps and metrics recorded instead of executed."""
+		self.locked, self.sleeps, self.metrics = [], [], []
+		with ExitStack() as stack:
+			stack.enter_context(
+				patch(
+					"bank_service.locks.get_bank_settings",
+					return_value=frappe._dict(transfer_lock_attempts=attempts),
+				)
+			)
+			stack.enter_context(
+				patch("frappe.db.sql", side_effect=lambda query, values: self.locked.append(values[0]))
+			)
+			self.rollback = stack.enter_context(patch("frappe.db.rollback"))
+			stack.enter_context(patch("bank_service.locks.time.sleep", side_effect=self.sleeps.append))
+			stack.enter_context(
+				patch(
+					"bank_service.locks.incr",
+					side_effect=lambda name, labels, **kwargs: self.metrics.append(name),
+				)
+			)
+			stack.enter_context(patch("bank_service.locks.observe"))
+			return run_locked("test_locks", accounts, fn)
+
+	def test_accounts_are_locked_once_in_sorted_order(self):
+		self.assertEqual(self._run_locked(["B", "A", "C", "A"], lambda: "done"), "done")
+		self.assertEqual(self.locked, ["A", "B", "C"])
+		self.rollback.assert_not_called()
+
+	def test_deadlock_retries_the_whole_unit(self):
+		calls = []
+
+		def fn():
+			calls.append(len(self.locked))
+			if len(calls) < 3:
+				raise frappe.QueryDeadlockError("Deadlock found")
+			return "done"
+
+		self.assertEqual(self._run_locked(["B", "A"], fn), "done")
+		# Each attempt retakes every lock before running fn again
+		self.assertEqual(calls, [2, 4, 6])
+		self.assertEqual(self.locked, ["A", "B"] * 3)
+		self.assertEqual(self.rollback.call_count, 2)
+		self.assertEqual(len(self.sleeps), 2)
+		self.assertEqual(self.metrics.count("account_lock_retries"), 4)
+
+	def test_gives_up_after_the_configured_attempts(self):
+		def fn():
+			raise frappe.QueryTimeoutError("Lock wait timeout exceeded")
+
+		with self.assertRaises(frappe.QueryTimeoutError):
+			self._run_locked(["A"], fn, attempts=3)
+		self.assertEqual(self.locked, ["A"] * 3)
+		self.assertEqual(self.rollback.call_count, 3)
+		# No sleep after the last attempt
+		self.assertEqual(len(self.sleeps), 2)
+		self.assertEqual(self.metrics.count("account_lock_failures"), 1)
+
+	def test_other_errors_are_not_retried(self):
+		def fn():
+			raise frappe.ValidationError("Insufficient balance")
+
+		with self.assertRaises(frappe.ValidationError):
+			self._run_locked(["A"], fn)
+		self.assertEqual(self.locked, ["A"])
+		self.rollback.assert_not_called()
+		self.assertEqual(self.sleeps, [])
+
+	def test_backoff_is_jittered_exponential_and_capped(self):
+		for attempt in range(1, 4):
+			base = BACKOFF_BASE * 2 ** (attempt - 1)
+			for _ in range(20):
+				self.assertTrue(base * 0.5 <= backoff(attempt) <= base * 1.5)
+		self.assertLessEqual(max(backoff(30) for _ in range(20)), BACKOFF_MAX * 1.5)
@@ -0,0 +1,39 @@
+import time
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from bank_service.profiling import CPROFILE, STACK_SAMPLES, _stacks, profiled, sampled_mode
+
+
+class TestProfiling(FrappeTestCase):
+	def test_profiling_sample_rate_and_window(self):
+		cases = [
+			(frappe._dict(profile_sample_rate=0), None),
+			(frappe._dict(profile_sample_rate=1), STACK_SAMPLES),
+			(frappe._dict(profile_sample_rate=1, profile_mode=CPROFILE), CPROFILE),
+			(frappe._dict(profile_sample_rate=1, profile_until="2000-01-01 00:00:00"), None),
+			(frappe._dict(profile_sample_rate=1, profile_until="2999-01-01 00:00:00"), STACK_SAMPLES),
+		]
+		for settings, mode in cases:
+			with patch("bank_service.profiling.get_bank_settings", return_value=settings):
+				self.assertEqual(sampled_mode(), mode)
+
+	def test_stack_samples_are_collapsed_per_endpoint(self):
+		def spin():
+			deadline = time.perf_counter() + 0.1
+			while time.perf_counter() < deadline:
+				pass
+
+		settings = frappe._dict(profile_sample_rate=1)
+		with patch("bank_service.profiling.get_bank_settings", return_value=settings), patch(
+			"bank_service.profiling.flush"
+		):
+			with profiled("profiling_test"):
+				spin()
+
+		stacks = _stacks.pop("profiling_test")
+		self.assertTrue(stacks)
+		self.assertTrue(all(stack.startswith("profiling_test;") for stack in stacks))
+		self.assertTrue(any("spin (" in stack.rsplit(";", 1)[-1] for stack in stacks))
@@ -0,0 +1,193 @@
+import csv
+import io
+import json
+from unittest.mock import MagicMock, patch
+
+import frappe
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import get_datetime
+
+from bank_service.posting import insert_transactions, validate_transfer
+from bank_service.statements import (
+	CSV_COLUMNS,
+	KEY_WRAP_SESSION,
+	StreamEncryptor,
+	decode_cursor,
+	decrypt_export,
+	encode_cursor,
+	get_statement_page,
+	iter_encrypted_export,
+	iter_statement_chunks,
+	read_statement_rows,
+	stream_statement_export,
+)
+
+ACCOUNT = "STMT-TEST-1"
+OTHER = "STMT-TEST-2"
+# insert_transactions stamps a whole batch with one timestamp, so most rows tie on date_time
+BATCHES = (
+	("2026-01-01 09:00:00", 3),
+	("2026-01-01 10:00:00", 4),
+	("2026-01-01 11:00:00", 1),
+	("2026-01-01 12:00:00", 2),
+)
+
+
+class TestStatements(FrappeTestCase):
+	def setUp(self):
+		frappe.db.delete("Transactions", {"from_account": ("in", (ACCOUNT, OTHER))})
+		frappe.db.delete("Transactions", {"to_account": ("in", (ACCOUNT, OTHER))})
+		self.expected = []
+		for timestamp, count in BATCHES:
+			transfers = [
+				validate_transfer(
+					{
+						"transaction_type": "Account Transfer",
+						# Alternate debits and credits of ACCOUNT
+						"from_account": ACCOUNT if i % 2 else OTHER,
+						"to_account": OTHER if i % 2 else ACCOUNT,
+						"amount": 10 + i,
+					}
+				)[0]
+				for i in range(count)
+			]
+			with patch("bank_service.posting.now", return_value=timestamp):
+				insert_transactions(transfers, status="Completed")
+			self.expected += [(get_datetime(timestamp), t.name) for t in transfers]
+		# Newest first, ties broken by name
+		self.expected.sort(reverse=True)
+
+	def _page_through(self, limit):
+		names, cursor, pages = [], None, 0
+		while True:
+			rows, cursor = get_statement_page(ACCOUNT, cursor, limit)
+			names += [row.name for row in rows]
+			pages += 1
+			if not cursor:
+				return names, pages
+
+	def test_pages_return_every_row_once_in_order(self):
+		expected = [name for _, name in self.expected]
+		for limit in (1, 2, 3, 4, 10, 11):
+			names, pages = self._page_through(limit)
+			self.assertEqual(names, expected, f"limit {limit}")
+			# A last page that happens to be full costs one extra, empty page
+			self.assertEqual(pages, len(expected) // limit + 1, f"limit {limit}")
+
+	def test_cursor_inside_a_timestamp_tie(self):
+		# The second of the four rows stamped 10:00
+		index = 4
+		date_time, name = self.expected[index]
+		rows = read_statement_rows(frappe.db, ACCOUNT, (date_time, name), 100)
+		self.assertEqual([row.name for row in rows], [name for _, name in self.expected[index + 1 :]])
+
+		# The last row of the history leaves nothing older
+		self.assertEqual(read_statement_rows(frappe.db, ACCOUNT, self.expected[-1], 100), [])
+
+	def test_rows_are_labelled_by_direction(self):
+		rows = read_statement_rows(frappe.db, ACCOUNT, None, 100)
+		self.assertEqual(len(rows), len(self.expected))
+		for row in rows:
+			self.assertEqual(row.direction, "debit" if row.from_account == ACCOUNT else "credit")
+
+	def test_chunks_cover_the_history(self):
+		chunks = list(iter_statement_chunks(frappe.db, ACCOUNT, 4))
+		self.assertEqual([len(chunk) for chunk in chunks], [4, 4, 2])
+		self.assertEqual([row.name for chunk in chunks for row in chunk], [name for _, name in self.expected])
+
+	def test_cursor_round_trip(self):
+		row = frappe._dict(date_time=get_datetime("2026-01-01 10:00:00.250000"), name="TXNABC")
+		self.assertEqual(decode_cursor(encode_cursor(row)), (row.date_time, row.name))
+		with self.assertRaises(frappe.ValidationError):
+			decode_cursor("not-a-cursor")
+
+
+def _row(i):
+	return frappe._dict(
+		name=f"TXN{i:04d}",
+		transaction_type="Account Transfer",
+		direction="debit",
+		from_account=ACCOUNT,
+		to_account=OTHER,
+		amount=10 + i,
+		status="Completed",
+		date_time=get_datetime("2026-01-01 10:00:00"),
+		remarks="",
+	)
+
+
+class TestStatementExport(FrappeTestCase):
+	def setUp(self):
+		self.key = AESGCM.generate_key(bit_length=256)
+		self.chunks = [[_row(0), _row(1)], [_row(2), _row(3)], [_row(4)]]
+
+	def _export(self, chunks, fmt="ndjson"):
+		"""Return the header and the frames of an export of `chunks`."""
+		header, *frames = iter_encrypted_export(
+			chunks, fmt, StreamEncryptor(self.key, KEY_WRAP_SESSION, fmt, b"wrapped")
+		)
+		return header, frames
+
+	def _decrypt(self, data):
+		return b"".join(decrypt_export(io.BytesIO(data), lambda wrap_mode, wrapped_key: self.key))
+
+	def test_ndjson_round_trip(self):
+		header, frames = self._export(self.chunks)
+		self.assertEqual(len(frames), 3)
+		lines = self._decrypt(header + b"".join(frames)).decode().splitlines()
+		self.assertEqual(
+			[json.loads(line)["transaction_id"] for line in lines], [f"TXN{i:04d}" for i in range(5)]
+		)
+
+	def test_csv_has_one_header_row(self):
+		header, frames = self._export(self.chunks, "csv")
+		rows = list(csv.DictReader(io.StringIO(self._decrypt(header + b"".join(frames)).decode())))
+		self.assertEqual([row["transaction_id"] for row in rows], [f"TXN{i:04d}" for i in range(5)])
+
+		# An empty history is still a complete export: one last frame holding the header row
+		header, frames = self._export([], "csv")
+		self.assertEqual(len(frames), 1)
+		self.assertEqual(self._decrypt(header + frames[0]).decode().strip(), ",".join(CSV_COLUMNS))
+
+	def test_truncated_export_is_rejected(self):
+		header, frames = self._export(self.chunks)
+		# Dropping whole frames leaves no last-frame flag
+		for kept in (0, 1, 2):
+			with self.assertRaisesRegex(ValueError, "Truncated"):
+				self._decrypt(header + b"".join(frames[:kept]))
+		# Cutting into a frame breaks its tag
+		with self.assertRaises(InvalidTag):
+			self._decrypt(header + b"".join(frames)[:-5])
+
+	def test_reordered_or_replaced_frames_are_rejected(self):
+		header, frames = self._export(self.chunks)
+		with self.assertRaises(InvalidTag):
+			self._decrypt(header + frames[1] + frames[0] + frames[2])
+		# A frame from another export of the same data under the same key
+		_, other_frames = self._export(self.chunks)
+		with self.assertRaises(InvalidTag):
+			self._decrypt(header + frames[0] + other_frames[1] + frames[2])
+		# The header is authenticated by every frame
+		with self.assertRaises(InvalidTag):
+			self._decrypt(header[:4] + b"\x01" + header[5:] + b"".join(frames))
+		with self.assertRaisesRegex(ValueError, "Not a statement export"):
+			self._decrypt(b"XXXX" + header[4:] + b"".join(frames))
+
+	def test_export_reads_one_snapshot(self):
+		db = MagicMock()
+		db.sql.side_effect = (
+			lambda query, *args, **kwargs: self.chunks.pop(0) if "union all" in query else None
+		)
+		with patch("frappe.database.get_db", return_value=db):
+			header, *frames = stream_statement_export(
+				ACCOUNT, "ndjson", 2, StreamEncryptor(self.key, KEY_WRAP_SESSION, "ndjson", b"wrapped")
+			)
+
+		queries = [" ".join(call.args[0].split()) for call in db.sql.call_args_list]
+		self.assertEqual(queries[1], "start transaction with consistent snapshot, read only")
+		# Every chunk is read after the snapshot was taken, and the connection is closed at the end
+		self.assertEqual(sum("union all" in query for query in queries[2:]), 3)
+		self.assertEqual(len(frames), 3)
+		db.close.assert_called_once()
@@ -0,0 +1,142 @@
+import base64
+import json
+from unittest.mock import patch
+
+import rsa
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding as asym_padding
+from cryptography.hazmat.primitives.asymmetric import rsa as crypto_rsa
+from frappe.tests.utils import FrappeTestCase
+
+from bank_service.utils import (
+	ENVELOPE_HEADER,
+	ENVELOPE_LEGACY,
+	ENVELOPE_V1,
+	RSA_OAEP_SHA256,
+	RSA_PKCS1V15,
+	OpenSSLBackend,
+	PurePythonBackend,
+	_load_rsa_private_key,
+	_oaep_sha256_unpad,
+	envelope_version,
+	get_key_id,
+	open_envelope,
+	route_key_id,
+	seal_envelope,
+)
+
+
+def _oaep(label=None):
+	return asym_padding.OAEP(mgf=asym_padding.MGF1(algorithm=hashes.SHA256()), algorithm=hashes.SHA256(), label=label)
+
+
+class TestUtils(FrappeTestCase):
+	@classmethod
+	def setUpClass(cls):
+		super().setUpClass()
+		cls.crypto_key = crypto_rsa.generate_private_key(public_exponent=65537, key_size=2048)
+		cls.bank_key = _load_rsa_private_key(
+			cls.crypto_key.private_bytes(
+				serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+			)
+		)
+
+	def test_rsa_backends_decrypt_oaep_and_pkcs1v15(self):
+		pubkey = self.crypto_key.public_key()
+		secret = b"k" * 32
+		ciphertexts = {
+			RSA_OAEP_SHA256: pubkey.encrypt(secret, _oaep()),
+			RSA_PKCS1V15: pubkey.encrypt(secret, asym_padding.PKCS1v15()),
+		}
+		for backend in (OpenSSLBackend(), PurePythonBackend()):
+			for alg, ciphertext in ciphertexts.items():
+				with self.subTest(backend=backend.name, alg=alg):
+					self.assertEqual(backend.decrypt(ciphertext, self.bank_key, alg), secret)
+
+	def test_rsa_backends_reject_bad_oaep_input(self):
+		pubkey = self.crypto_key.public_key()
+		ciphertext = pubkey.encrypt(b"k" * 32, _oaep())
+		corrupted = ciphertext[:-1] + bytes([ciphertext[-1] ^ 1])
+		other_label = pubkey.encrypt(b"k" * 32, _oaep(label=b"not the empty label"))
+		for backend in (OpenSSLBackend(), PurePythonBackend()):
+			for bad in (corrupted, other_label, ciphertext[1:]):
+				with self.subTest(backend=backend.name), self.assertRaises(rsa.DecryptionError):
+					backend.decrypt(bad, self.bank_key, RSA_OAEP_SHA256)
+
+	def test_oaep_unpad_checks_every_padding_field(self):
+		key = self.bank_key
+		k = rsa.common.byte_size(key.n)
+		ciphertext = self.crypto_key.public_key().encrypt(b"secret", _oaep())
+		em = rsa.transform.int2bytes(key.blinded_decrypt(rsa.transform.bytes2int(ciphertext)), k)
+		self.assertEqual(_oaep_sha256_unpad(em), b"secret")
+
+		# Leading byte, masked seed (which garbles the label hash) and masked data block
+		for index in (0, 1, 40):
+			bad = bytearray(em)
+			bad[index] ^= 0x80
+			with self.subTest(index=index), self.assertRaises(rsa.DecryptionError):
+				_oaep_sha256_unpad(bytes(bad))
+
+	def _bank_keys(self):
+		"""Patch the bank keyring so envelopes for crypto_key route to the bank "HDFC"."""
+		pubkey = rsa.PublicKey(self.bank_key.n, self.bank_key.e)
+		key_id = get_key_id(self.crypto_key.public_key())
+		return patch(
+			"bank_service.utils.load_bank_keys", return_value=(pubkey, self.bank_key)
+		), patch("bank_service.utils.resolve_bank", side_effect=lambda k: "HDFC" if k == key_id else None)
+
+	def _reheader(self, raw, **fields):
+		header = ENVELOPE_HEADER.unpack_from(raw)
+		names = ("magic", "version", "alg_id", "key_id", "key_len", "nonce_len")
+		values = {**dict(zip(names, header, strict=True)), **fields}
+		return ENVELOPE_HEADER.pack(*(values[name] for name in names)) + raw[ENVELOPE_HEADER.size:]
+
+	def test_envelope_version(self):
+		raw = seal_envelope(self.crypto_key.public_key(), {"amount": 1})
+		legacy = base64.b64encode(json.dumps({"encrypted_key": "", "ciphertext": ""}).encode()).decode()
+		self.assertEqual(envelope_version(legacy), ENVELOPE_LEGACY)
+		self.assertEqual(envelope_version(raw), ENVELOPE_V1)
+		self.assertEqual(envelope_version(base64.b64encode(raw).decode()), ENVELOPE_V1)
+		for bad in (raw[:3], b"XYZ" + raw[3:], base64.b64encode(raw[:3]).decode()):
+			with self.subTest(bad=bad[:8]), self.assertRaises(ValueError):
+				envelope_version(bad)
+
+	def test_open_envelope_round_trip(self):
+		message = {"from_account": "A", "to_account": "B", "amount": 10}
+		load_keys, resolve = self._bank_keys()
+		with load_keys, resolve:
+			for alg in (RSA_OAEP_SHA256, RSA_PKCS1V15):
+				raw = seal_envelope(self.crypto_key.public_key(), message, key_alg=alg)
+				with self.subTest(alg=alg):
+					self.assertEqual(open_envelope(raw), ("HDFC", message))
+					self.assertEqual(open_envelope(raw, "HDFC"), ("HDFC", message))
+
+	def test_open_envelope_rejects_malformed_input(self):
+		raw = seal_envelope(self.crypto_key.public_key(), {"amount": 1})
+		key_len = ENVELOPE_HEADER.unpack_from(raw)[4]
+		cases = {
+			"truncated header": (raw[:ENVELOPE_HEADER.size - 1], "Malformed"),
+			"wrong magic": (self._reheader(raw, magic=b"XYZ"), "Malformed"),
+			"wrong version": (self._reheader(raw, version=2), "version"),
+			"unknown key alg": (self._reheader(raw, alg_id=9), "key algorithm"),
+			"wrong key id": (self._reheader(raw, key_id=b"\0" * 8), "not addressed"),
+			"key length overruns": (self._reheader(raw, key_len=0xFFFF), "Malformed"),
+			"nonce length overruns": (self._reheader(raw, nonce_len=0xFF), "Malformed"),
+			"no ciphertext": (raw[:ENVELOPE_HEADER.size + key_len + 12], "Malformed"),
+		}
+		load_keys, resolve = self._bank_keys()
+		with load_keys, resolve:
+			for case, (bad, message) in cases.items():
+				with self.subTest(case=case), self.assertRaisesRegex(ValueError, message):
+					open_envelope(bad)
+
+	def test_route_key_id(self):
+		key_id = get_key_id(self.crypto_key.public_key())
+		load_keys, resolve = self._bank_keys()
+		with load_keys, resolve:
+			self.assertEqual(route_key_id(key_id), "HDFC")
+			self.assertEqual(route_key_id(key_id, "HDFC"), "HDFC")
+			with self.assertRaises(ValueError):
+				route_key_id(b"\0" * 8)
+			with self.assertRaises(ValueError):
+				route_key_id(b"\0" * 8, "HDFC")
@@ -0,0 +1,108 @@
+from contextlib import ExitStack
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from bank_service.api import make_transaction
+from bank_service.cache import LocalStore
+from bank_service.velocity import VelocityLimitExceeded, charge_velocity, get_velocity_limits, refund_velocity
+
+TRANSFER = {"transaction_type": "Account Transfer", "from_account": "10000000424", "to_account": "10000000432", "amount": 10}
+
+
+class TestVelocity(FrappeTestCase):
+	def test_velocity_window_slides_over_the_previous_bucket(self):
+		store = LocalStore()
+		windows = ((60, 4, 0),)
+		start = 60 * 1000 + 30
+		self.assertEqual([store.charge_windows("account", windows, 100, start) for _ in range(4)], [None] * 4)
+		index, wait = store.charge_windows("account", windows, 100, start + 1)
+		self.assertEqual((index, wait), (0, 29))
+
+		# Half a minute later half of the previous bucket still counts: 4 * 0.5 + 2 new
+		later = start + 60
+		self.assertEqual([store.charge_windows("account", windows, 100, later) for _ in range(2)], [None] * 2)
+		self.assertIsNotNone(store.charge_windows("account", windows, 100, later))
+
+	def test_velocity_amount_limit_and_refund(self):
+		store = LocalStore()
+		windows = ((60, 0, 0), (86400, 0, 1000))
+		now = 86400 * 100 + 10
+		self.assertIsNone(store.charge_windows("account", windows, 600, now))
+		self.assertEqual(store.charge_windows("account", windows, 500, now)[0], 1)
+		store.refund_windows("account", windows, 600, now)
+		self.assertIsNone(store.charge_windows("account", windows, 1000, now))
+
+	def test_velocity_limits_per_account_type(self):
+		settings = frappe._dict(
+			velocity_limits=[
+				{"account_type": "", "window": "Day", "max_count": 100, "max_amount": 50000},
+				{"account_type": "Savings", "window": "Day", "max_count": 0, "max_amount": 10000},
+				{"account_type": "Savings", "window": "Minute", "max_count": 5, "max_amount": 0},
+				{"account_type": "Current", "window": "Hour", "max_count": 1000, "max_amount": 0},
+			]
+		)
+		with patch("bank_service.velocity.get_bank_settings", return_value=settings):
+			self.assertEqual(get_velocity_limits("Savings"), ((60, 5, 0), (86400, 100, 1000000)))
+			self.assertEqual(get_velocity_limits("Current"), ((3600, 1000, 0), (86400, 100, 5000000)))
+
+	def test_charge_and_refund_velocity(self):
+		limits = ((60, 2, 0),)
+		with patch("bank_service.velocity.get_store", return_value=LocalStore()), patch(
+			"bank_service.velocity.get_velocity_limits", return_value=limits
+		), patch("bank_service.velocity.get_account", return_value=frappe._dict(account_type="Savings")):
+			charges = [charge_velocity("10000000424", 10, "HDFC") for _ in range(2)]
+			with self.assertRaises(VelocityLimitExceeded) as refused:
+				charge_velocity("10000000424", 10, "HDFC")
+			self.assertGreaterEqual(refused.exception.retry_after, 1)
+
+			# A transfer that was not recorded gives its slot back
+			refund_velocity(charges[-1])
+			self.assertIsNotNone(charge_velocity("10000000424", 10, "HDFC"))
+
+	def _make_transaction(self, execute_transfer, store, limits=((60, 1, 0),)):
+		"""Run the make_transaction endpoint on a decrypted TRANSFER, with posting replaced by `execute_transfer`."""
+		with ExitStack() as stack:
+			for target, kwargs in (
+				("bank_service.api._parse_request", {"return_value": {"encrypted_payload": "..."}}),
+				("bank_service.api.admit", {"return_value": None}),
+				("bank_service.api._decrypt_request", {"return_value": (dict(TRANSFER), None, "HDFC", None)}),
+				("bank_service.api.missing_accounts", {"return_value": []}),
+				("bank_service.api.execute_transfer", {"side_effect": execute_transfer}),
+				("bank_service.api._encrypt_response", {"return_value": "encrypted"}),
+				("bank_service.velocity.get_store", {"return_value": store}),
+				("bank_service.velocity.get_velocity_limits", {"return_value": limits}),
+				("bank_service.velocity.get_account", {"return_value": frappe._dict(account_type="Savings")}),
+			):
+				stack.enter_context(patch(target, **kwargs))
+			return make_transaction()
+
+	def test_make_transaction_checks_velocity_before_posting(self):
+		posted = []
+
+		def execute_transfer(transfer, *args, **kwargs):
+			posted.append(transfer)
+			return frappe._dict(transaction_id=f"T{len(posted)}", status="Completed", journal_entry=None)
+
+		store = LocalStore()
+		self.assertEqual(self._make_transaction(execute_transfer, store)["status"], "success")
+		refused = self._make_transaction(execute_transfer, store)
+		self.assertEqual(refused["status"], "fail")
+		self.assertGreaterEqual(refused["retry_after"], 1)
+		# The refused transfer never reached posting
+		self.assertEqual(len(posted), 1)
+
+	def test_make_transaction_refunds_a_failed_transfer(self):
+		def failing_transfer(transfer, *args, **kwargs):
+			raise frappe.ValidationError("posting failed")
+
+		store = LocalStore()
+		with patch("bank_service.api.frappe.log_error"):
+			self.assertEqual(self._make_transaction(failing_transfer, store)["status"], "error")
+
+		# The failed transfer gave its slot back, so the next one is admitted
+		result = self._make_transaction(
+			lambda *args, **kwargs: frappe._dict(transaction_id="T1", status="Completed", journal_entry=None), store
+		)
+		self.assertEqual(result["status"], "success")
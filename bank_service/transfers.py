@@ -0,0 +1,85 @@
+# -------------------- transfers.py -------------------- #
+"""
+The DB side of a single transfer, shared by make_transaction and the transfer
+stress test (bank_service.benchmarks.stress_transfers).
+"""
+import frappe
+from frappe.utils import now
+
+from bank_service.balances import apply_balance_deltas, transfer_deltas
+from bank_service.banks import get_bank_settings
+from bank_service.instrumentation import stage
+from bank_service.jobs import enqueue_posting
+from bank_service.ledger import append_ledger_entries
+from bank_service.locks import run_locked
+from bank_service.posting import (
+    journal_entry_lines,
+    make_journal_entry,
+    new_transaction_id,
+    transfer_accounts,
+)
+from bank_service.rollups import apply_rollup_deltas, rollup_deltas
+
+
+def record_transfer(transfer, bank_name=None, endpoint="make_transaction"):
+    """
+    Insert the Transactions row of a validated transfer and complete it: with a
+    Journal Entry of its own, through the internal ledger, or (async posting)
+    later in a background job. Runs in the current DB
+    transaction; the caller holds the account locks. Returns
+    {"transaction_id", "status", "journal_entry"}.
+    """
+    settings = get_bank_settings(bank_name)
+    with stage(endpoint, "insert"):
+        trx = frappe.new_doc("Transactions")
+        trx.update({
+            "transaction_id": new_transaction_id(),
+            "transaction_type": transfer.transaction_type,
+            "from_account": transfer.from_account,
+            "to_account": transfer.to_account,
+            "amount": transfer.amount,
+            "status": "Completed" if settings.internal_ledger else "Initiated",
+            "date_time": now(),
+            "remarks": transfer.remarks,
+        })
+        # Both accounts were checked against the account cache by the caller
+        trx.flags.ignore_links = True
+        trx.insert(ignore_permissions=True)
+
+    # The scheduled ledger consolidation posts its Journal Entry (see bank_service.ledger)
+    if settings.internal_ledger:
+        with stage(endpoint, "complete"):
+            append_ledger_entries([trx])
+            apply_balance_deltas(transfer_deltas([transfer]))
+            apply_rollup_deltas(rollup_deltas([trx]))
+        return frappe._dict(transaction_id=trx.name, status="Completed", journal_entry=None)
+
+    # In async mode the Journal Entry is posted by a background job; poll get_transaction_status
+    if settings.async_posting:
+        enqueue_posting(trx.name, bank_name)
+        return frappe._dict(transaction_id=trx.name, status="Initiated", journal_entry=None)
+
+    with stage(endpoint, "journal_entry"):
+        je = make_journal_entry(journal_entry_lines(transfer), transfer.remarks)
+    with stage(endpoint, "complete"):
+        trx.db_set({"status": "Completed", "journal_entry": je.name, "posting_attempts": 1})
+        apply_balance_deltas(transfer_deltas([transfer]))
+        apply_rollup_deltas(rollup_deltas([trx]))
+    return frappe._dict(transaction_id=trx.name, status="Completed", journal_entry=je.name)
+
+
+def execute_transfer(transfer, bank_name=None, endpoint="make_transaction", before=None):
+    """
+    record_transfer under the locks of both accounts, retried on deadlock.
+    `before` runs first inside the same locked unit; if it returns something,
+    the transfer is not recorded and that value is returned instead.
+    """
+
+    def unit():
+        if before:
+            early = before()
+            if early:
+                return early
+        return record_transfer(transfer, bank_name, endpoint)
+
+    return run_locked(endpoint, transfer_accounts([transfer]), unit, bank_name)
@@ -1,69 +1,211 @@
 # -------------------- utils.py -------------------- #
-import os
-import json
-import random
 import base64
-import rsa
-import frappe
+import hashlib
+import hmac
+import json
+import os
+import re
+import struct
+import threading
 
-from cryptography.hazmat.primitives import serialization, hashes, padding as sym_padding
+import frappe
 from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives.asymmetric import padding as asym_padding, rsa as crypto_rsa
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives import padding as sym_padding
+from cryptography.hazmat.primitives.asymmetric import padding as asym_padding
+from cryptography.hazmat.primitives.asymmetric import rsa as crypto_rsa
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from bank_service.account_numbers import get_allocator
+from bank_service.accounts import get_account
+from bank_service.banks import (
+    bump_generation,
+    get_bank_keypair_pems,
+    get_bank_settings,
+    get_default_bank,
+    get_generation,
+    resolve_bank,
+)
+from bank_service.cache import LRUCache, get_store
+
+# Importing this module has no side effects: the key directory is resolved
+# (and created) on first use, for the site of the current request, and the
+# rsa package is only imported where PKCS#1 keys are parsed or generated.
+_keys_dirs = set()
+
+
+def get_keys_dir() -> str:
+    """private/bank_keys of the current site, created on first use."""
+    keys_dir = frappe.get_site_path("private", "bank_keys")
+    if keys_dir not in _keys_dirs:
+        os.makedirs(keys_dir, exist_ok=True)
+        _keys_dirs.add(keys_dir)
+    return keys_dir
+
+
+def _bank_key_paths(bank_name):
+    keys_dir = get_keys_dir()
+    return (
+        os.path.join(keys_dir, f"{bank_name}_private.pem"),
+        os.path.join(keys_dir, f"{bank_name}_public.pem"),
+    )
+
+
+def _load_rsa_public_key(pem: bytes):
+    import rsa
+
+    if b"BEGIN RSA PUBLIC KEY" in pem:
+        return rsa.PublicKey.load_pkcs1(pem)
+    numbers = serialization.load_pem_public_key(pem, backend=default_backend()).public_numbers()
+    return rsa.PublicKey(numbers.n, numbers.e)
+
+
+def _load_rsa_private_key(pem: bytes):
+    import rsa
+
+    if b"BEGIN RSA PRIVATE KEY" in pem:
+        return rsa.PrivateKey.load_pkcs1(pem)
+    key = serialization.load_pem_private_key(pem, password=None, backend=default_backend())
+    numbers = key.private_numbers()
+    return rsa.PrivateKey(
+        numbers.public_numbers.n, numbers.public_numbers.e, numbers.d, numbers.p, numbers.q
+    )
 
-KEYS_DIR = os.path.join(frappe.get_site_path("private"), "bank_keys")
-os.makedirs(KEYS_DIR, exist_ok=True)
 
+def _read_bank_keypair(bank_name):
+    """Keys from the Bank Settings record when configured there, else from the PEM files."""
+    if get_bank_settings(bank_name).has_keys:
+        pub_pem, priv_pem = get_bank_keypair_pems(bank_name)
+        return _load_rsa_public_key(pub_pem.encode()), _load_rsa_private_key(priv_pem.encode())
 
-def generate_bank_keypair(bank_name="HDFC"):
+    priv_path, pub_path = _bank_key_paths(bank_name)
+    with open(priv_path, "rb") as f:
+        privkey = _load_rsa_private_key(f.read())
+    with open(pub_path, "rb") as f:
+        pubkey = _load_rsa_public_key(f.read())
+    return pubkey, privkey
+
+
+def generate_bank_keypair(bank_name=None):
     """
-    Generate RSA keypair for bank if not exists and save PEM files.
+    Return the bank keypair, generating and saving PEM files when the bank has
+    no keys in Bank Settings or on disk yet.
     """
-    priv_path = os.path.join(KEYS_DIR, f"{bank_name}_private.pem")
-    pub_path = os.path.join(KEYS_DIR, f"{bank_name}_public.pem")
-
-    if os.path.exists(priv_path) and os.path.exists(pub_path):
-        with open(priv_path, "rb") as f:
-            privkey = rsa.PrivateKey.load_pkcs1(f.read())
-        with open(pub_path, "rb") as f:
-            pubkey = rsa.PublicKey.load_pkcs1(f.read())
+    bank_name = bank_name or get_default_bank()
+
+    stamp = _keyring_stamp(bank_name)
+    if stamp:
+        keys = _keyring_get(bank_name, stamp)
+        if keys:
+            return keys
+        keys = _read_bank_keypair(bank_name)
     else:
+        import rsa
+
+        priv_path, pub_path = _bank_key_paths(bank_name)
         pubkey, privkey = rsa.newkeys(2048)
         with open(priv_path, "wb") as f:
             f.write(privkey.save_pkcs1("PEM"))
         with open(pub_path, "wb") as f:
             f.write(pubkey.save_pkcs1("PEM"))
+        keys = (pubkey, privkey)
+        # A new key id has to reach every worker's key id index
+        bump_generation()
+        stamp = _keyring_stamp(bank_name)
 
-    return pubkey, privkey
+    _keyring_put(bank_name, stamp, keys)
+    return keys
 
 
-def load_bank_keys(bank_name="HDFC"):
+def load_bank_keys(bank_name=None):
     """
-    Load bank keys from PEM files.
+    Load bank keys from Bank Settings or PEM files (served from the keyring when unchanged).
     """
-    priv_path = os.path.join(KEYS_DIR, f"{bank_name}_private.pem")
-    pub_path = os.path.join(KEYS_DIR, f"{bank_name}_public.pem")
+    bank_name = bank_name or get_default_bank()
 
-    if not os.path.exists(priv_path) or not os.path.exists(pub_path):
+    stamp = _keyring_stamp(bank_name)
+    if not stamp:
         raise FileNotFoundError(f"Bank keys not found for {bank_name}")
 
-    with open(priv_path, "rb") as f:
-        privkey = rsa.PrivateKey.load_pkcs1(f.read())
-    with open(pub_path, "rb") as f:
-        pubkey = rsa.PublicKey.load_pkcs1(f.read())
+    keys = _keyring_get(bank_name, stamp)
+    if not keys:
+        keys = _read_bank_keypair(bank_name)
+        _keyring_put(bank_name, stamp, keys)
+    return keys
 
-    return pubkey, privkey
 
+# ------------------- Bank Keyring ------------------- #
+# Parsed bank keys are kept per worker process, keyed by bank name. Keys from
+# Bank Settings are reused while the record is unchanged; keys from PEM files
+# while both files keep their mtime and the shared registry generation (bumped
+# whenever a Bank Settings doc changes) is the one they were loaded under.
+_keyring = {}
+_keyring_lock = threading.Lock()
+_keyring_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+def _keyring_stamp(bank_name):
+    """Return the validity stamp of a bank's keypair, or None if it has none yet."""
+    settings = get_bank_settings(bank_name)
+    if settings.has_keys:
+        return ("settings", settings.modified)
+
+    priv_path, pub_path = _bank_key_paths(bank_name)
+    try:
+        priv_mtime = os.stat(priv_path).st_mtime_ns
+        pub_mtime = os.stat(pub_path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    return (priv_mtime, pub_mtime, get_generation())
 
-def encrypt_with_client_key(client_pubkey_pem, message: dict) -> str:
+
+def _keyring_get(bank_name, stamp):
+    with _keyring_lock:
+        entry = _keyring.get(bank_name)
+        if entry and entry[0] == stamp:
+            _keyring_stats["hits"] += 1
+            return entry[1]
+        _keyring_stats["misses"] += 1
+    return None
+
+
+def _keyring_put(bank_name, stamp, keys):
+    with _keyring_lock:
+        _keyring[bank_name] = (stamp, keys)
+
+
+def clear_bank_keyring(bank_name=None):
+    """Drop cached keys for one bank (or all banks) in this worker."""
+    with _keyring_lock:
+        if bank_name:
+            _keyring.pop(bank_name, None)
+        else:
+            _keyring.clear()
+        _keyring_stats["invalidations"] += 1
+
+
+def get_keyring_stats() -> dict:
+    """Hit/miss counters of this worker's bank keyring."""
+    with _keyring_lock:
+        return {**_keyring_stats, "size": len(_keyring), "banks": sorted(_keyring)}
+
+
+def encrypt_with_client_key(client_pubkey_pem, message: dict, envelope=None) -> str:
     """
     Hybrid encryption: AES for message + RSA for AES key.
-    Returns base64 JSON string containing both.
+    Accepts the client key as PEM or as an already parsed public key.
+    Returns base64 JSON string containing both, or with envelope=ENVELOPE_V1
+    the base64 of a binary envelope (see seal_envelope).
     """
-    pubkey = serialization.load_pem_public_key(
-        client_pubkey_pem.encode(),
-        backend=default_backend()
-    )
+    pubkey = client_pubkey_pem
+    if isinstance(pubkey, str):
+        pubkey = serialization.load_pem_public_key(
+            pubkey.encode(),
+            backend=default_backend()
+        )
+    if envelope == ENVELOPE_V1:
+        return base64.b64encode(seal_envelope(pubkey, message)).decode()
 
     # Generate random AES key (32 bytes for AES-256)
     aes_key = os.urandom(32)
@@ -98,23 +240,57 @@ def encrypt_with_client_key(client_pubkey_pem, message: dict) -> str:
     return base64.b64encode(json.dumps(payload).encode()).decode()
 
 
-def decrypt_with_bank_key(encrypted_message: str, bank_name="HDFC") -> dict:
+def wrap_key_for_client(client_pubkey, key: bytes) -> bytes:
+    """RSA-OAEP-SHA256 encrypt a symmetric key for a parsed client public key."""
+    return client_pubkey.encrypt(
+        key,
+        asym_padding.OAEP(
+            mgf=asym_padding.MGF1(algorithm=hashes.SHA256()),
+            algorithm=hashes.SHA256(),
+            label=None
+        )
+    )
+
+
+def decrypt_with_bank_key(encrypted_message, bank_name=None) -> dict:
     """
     Decrypt message encrypted with hybrid AES-RSA.
+    Without bank_name the bank is resolved from the envelope's key id.
     """
-    _, privkey = load_bank_keys(bank_name)
+    return decrypt_envelope(encrypted_message, bank_name)[1]
+
+
+def decrypt_envelope(encrypted_message, bank_name=None):
+    """
+    Decrypt a request envelope and return (bank_name, payload).
+    Accepts a binary envelope (raw bytes or one base64 layer) or the legacy
+    base64 JSON envelope. In the legacy format the AES key may be wrapped
+    with PKCS#1 v1.5 (default) or, when the envelope carries
+    "alg": "RSA-OAEP-256", with OAEP-SHA256; an optional "kid" (hex key id)
+    addresses a bank other than the default one.
+    """
+    version = envelope_version(encrypted_message)
+    if version != ENVELOPE_LEGACY:
+        raw = encrypted_message if isinstance(encrypted_message, bytes) else base64.b64decode(encrypted_message)
+        return open_envelope(raw, bank_name)
 
     # Decode base64 JSON
     payload_json = base64.b64decode(encrypted_message)
     payload = json.loads(payload_json)
 
+    if payload.get("kid"):
+        bank_name = route_key_id(bytes.fromhex(payload["kid"]), bank_name)
+    bank_name = bank_name or get_default_bank()
+    _, privkey = load_bank_keys(bank_name)
+
     # Extract components
     encrypted_aes_key = base64.b64decode(payload["key"])
     iv = base64.b64decode(payload["iv"])
     ciphertext = base64.b64decode(payload["data"])
 
     # Decrypt AES key using bank private RSA key
-    aes_key = rsa.decrypt(encrypted_aes_key, privkey)
+    key_alg = payload.get("alg") or RSA_PKCS1V15
+    aes_key = get_rsa_backend().decrypt(encrypted_aes_key, privkey, key_alg)
 
     # Decrypt AES ciphertext
     cipher = Cipher(algorithms.AES(aes_key), modes.CBC(iv), backend=default_backend())
@@ -123,22 +299,403 @@ def decrypt_with_bank_key(encrypted_message: str, bank_name="HDFC") -> dict:
 
     unpadder = sym_padding.PKCS7(128).unpadder()
     data = unpadder.update(padded_data) + unpadder.finalize()
+    return bank_name, json.loads(data.decode())
+
+
+# ------------------- Asymmetric Backends ------------------- #
+# The bank private-key operation runs through OpenSSL by default, which is an
+# order of magnitude faster than the pure-Python rsa package and releases the
+# GIL. Set "bank_rsa_backend": "rsa" in site_config.json to fall back.
+RSA_PKCS1V15 = "RSA1_5"
+RSA_OAEP_SHA256 = "RSA-OAEP-256"
+
+
+class OpenSSLBackend:
+    """Private-key operations through cryptography/OpenSSL."""
+
+    name = "openssl"
+
+    def __init__(self):
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    def _private_key(self, privkey):
+        # Converted keys are reused for as long as the keyring hands out the same rsa.PrivateKey
+        cached = self._keys.get(privkey.n)
+        if cached and cached[0] is privkey:
+            return cached[1]
+
+        numbers = crypto_rsa.RSAPrivateNumbers(
+            p=privkey.p,
+            q=privkey.q,
+            d=privkey.d,
+            dmp1=privkey.exp1,
+            dmq1=privkey.exp2,
+            iqmp=privkey.coef,
+            public_numbers=crypto_rsa.RSAPublicNumbers(privkey.e, privkey.n),
+        )
+        key = numbers.private_key(default_backend())
+        with self._lock:
+            self._keys[privkey.n] = (privkey, key)
+        return key
+
+    def decrypt(self, ciphertext: bytes, privkey, alg=RSA_PKCS1V15) -> bytes:
+        if alg == RSA_OAEP_SHA256:
+            pad = asym_padding.OAEP(
+                mgf=asym_padding.MGF1(algorithm=hashes.SHA256()),
+                algorithm=hashes.SHA256(),
+                label=None
+            )
+        elif alg == RSA_PKCS1V15:
+            pad = asym_padding.PKCS1v15()
+        else:
+            raise ValueError(f"Unsupported key algorithm: {alg}")
+        try:
+            return self._private_key(privkey).decrypt(ciphertext, pad)
+        except ValueError:
+            import rsa
+
+            # Same error as PurePythonBackend, so callers need not know the backend
+            raise rsa.DecryptionError("Decryption failed")
+
+    def load_key(self, privkey):
+        """Convert a bank key ahead of its first request (see bank_service.warmup)."""
+        self._private_key(privkey)
+
+
+class PurePythonBackend:
+    """Private-key operations through the pure-Python rsa package."""
+
+    name = "rsa"
+
+    def decrypt(self, ciphertext: bytes, privkey, alg=RSA_PKCS1V15) -> bytes:
+        import rsa
+
+        if alg == RSA_PKCS1V15:
+            return rsa.decrypt(ciphertext, privkey)
+        if alg != RSA_OAEP_SHA256:
+            raise ValueError(f"Unsupported key algorithm: {alg}")
+
+        # The rsa package has no OAEP support, so unpad the raw RSA output here (RFC 8017, 7.1.2)
+        k = rsa.common.byte_size(privkey.n)
+        if len(ciphertext) != k:
+            raise rsa.DecryptionError("Decryption failed")
+        em = rsa.transform.int2bytes(privkey.blinded_decrypt(rsa.transform.bytes2int(ciphertext)), k)
+        return _oaep_sha256_unpad(em)
+
+    def load_key(self, privkey):
+        pass
+
+
+def _mgf1_sha256(seed: bytes, length: int) -> bytes:
+    out = b""
+    counter = 0
+    while len(out) < length:
+        out += hashlib.sha256(seed + counter.to_bytes(4, "big")).digest()
+        counter += 1
+    return out[:length]
+
+
+def _xor(a: bytes, b: bytes) -> bytes:
+    return bytes(x ^ y for x, y in zip(a, b, strict=True))
+
+
+def _oaep_sha256_unpad(em: bytes) -> bytes:
+    hlen = hashlib.sha256().digest_size
+    masked_seed, masked_db = em[1:1 + hlen], em[1 + hlen:]
+    seed = _xor(masked_seed, _mgf1_sha256(masked_db, hlen))
+    db = _xor(masked_db, _mgf1_sha256(seed, len(masked_db)))
+
+    rest = db[hlen:]
+    sep = rest.find(b"\x01")
+    valid = (
+        em[0] == 0
+        and hmac.compare_digest(db[:hlen], hashlib.sha256(b"").digest())
+        and sep >= 0
+        and not rest[:sep].strip(b"\x00")
+    )
+    if not valid:
+        import rsa
+
+        raise rsa.DecryptionError("Decryption failed")
+    return rest[sep + 1:]
+
+
+RSA_BACKENDS = {
+    OpenSSLBackend.name: OpenSSLBackend,
+    PurePythonBackend.name: PurePythonBackend,
+}
+_rsa_backends = {}
+
+
+def get_rsa_backend(name=None):
+    """Return the configured asymmetric backend (one instance per worker)."""
+    name = name or frappe.conf.get("bank_rsa_backend") or OpenSSLBackend.name
+    if name not in RSA_BACKENDS:
+        raise ValueError(f"Unknown RSA backend: {name}")
+    backend = _rsa_backends.get(name)
+    if not backend:
+        backend = _rsa_backends.setdefault(name, RSA_BACKENDS[name]())
+    return backend
+
+
+# ------------------- Binary Envelope ------------------- #
+# Version 1 layout (all integers big-endian):
+#
+#   magic "BSE" | version (1) | key alg (1) | key id (8) | wrapped key length (2) | nonce length (1)
+#   wrapped AES-256 key | nonce | AES-256-GCM ciphertext and tag
+#
+# The 16 byte header is the GCM associated data. The key id is the first 8
+# bytes of the SHA-256 fingerprint of the recipient's DER public key, so a
+# stale bank key is rejected before any RSA work. Legacy envelopes are
+# base64 JSON, which never starts with the magic, so both formats are
+# accepted on the same field.
+ENVELOPE_LEGACY = 0
+ENVELOPE_V1 = 1
+ENVELOPE_MAGIC = b"BSE"
+ENVELOPE_HEADER = struct.Struct(">3sBB8sHB")
+# base64 of ENVELOPE_MAGIC; a 3 byte prefix encodes to exactly 4 characters
+_ENVELOPE_MAGIC_B64 = base64.b64encode(ENVELOPE_MAGIC).decode()
+ENVELOPE_KEY_ALGS = {1: "RSA1_5", 2: "RSA-OAEP-256"}
+ENVELOPE_KEY_ALG_IDS = {alg: alg_id for alg_id, alg in ENVELOPE_KEY_ALGS.items()}
+
+_bank_key_ids = {}
+
+
+def envelope_version(encrypted_message) -> int:
+    """Envelope version of a request, from its first bytes only (ENVELOPE_LEGACY for base64 JSON)."""
+    if isinstance(encrypted_message, bytes | bytearray):
+        head = bytes(encrypted_message[:4])
+    elif isinstance(encrypted_message, str) and encrypted_message.startswith(_ENVELOPE_MAGIC_B64):
+        head = base64.b64decode(encrypted_message[:8])[:4]
+    else:
+        return ENVELOPE_LEGACY
+
+    if len(head) < 4 or head[:3] != ENVELOPE_MAGIC:
+        raise ValueError("Malformed envelope")
+    return head[3]
+
+
+def get_key_id(pubkey) -> bytes:
+    """8 byte key id of a parsed public key (prefix of get_public_key_fingerprint)."""
+    return bytes.fromhex(get_public_key_fingerprint(pubkey))[:8]
+
+
+def get_bank_key_id(bank_name=None) -> bytes:
+    pubkey, _ = load_bank_keys(bank_name)
+    cached = _bank_key_ids.get(bank_name)
+    if cached and cached[0] == pubkey.n:
+        return cached[1]
+    key_id = get_key_id(crypto_rsa.RSAPublicNumbers(pubkey.e, pubkey.n).public_key(default_backend()))
+    _bank_key_ids[bank_name] = (pubkey.n, key_id)
+    return key_id
+
+
+def seal_envelope(pubkey, message: dict, key_alg=RSA_OAEP_SHA256) -> bytes:
+    """Encrypt a message for a parsed public key as a version 1 binary envelope."""
+    aes_key = os.urandom(32)
+    nonce = os.urandom(12)
+    if key_alg == RSA_OAEP_SHA256:
+        wrapped_key = wrap_key_for_client(pubkey, aes_key)
+    else:
+        wrapped_key = pubkey.encrypt(aes_key, asym_padding.PKCS1v15())
+
+    header = ENVELOPE_HEADER.pack(
+        ENVELOPE_MAGIC, ENVELOPE_V1, ENVELOPE_KEY_ALG_IDS[key_alg], get_key_id(pubkey), len(wrapped_key), len(nonce)
+    )
+    ciphertext = AESGCM(aes_key).encrypt(nonce, json.dumps(message).encode(), header)
+    return b"".join((header, wrapped_key, nonce, ciphertext))
+
+
+def route_key_id(key_id: bytes, bank_name=None) -> str:
+    """
+    Bank addressed by an envelope key id. With bank_name, only check that the
+    envelope is for that bank's current key.
+    """
+    if bank_name:
+        if not hmac.compare_digest(key_id, get_bank_key_id(bank_name)):
+            raise ValueError("Envelope is not addressed to the current bank key")
+        return bank_name
+
+    bank_name = resolve_bank(key_id)
+    if not bank_name:
+        raise ValueError("Envelope is not addressed to a current bank key")
+    return bank_name
+
+
+def open_envelope(raw: bytes, bank_name=None):
+    """Decrypt a binary envelope addressed to a bank key and return (bank_name, payload)."""
+    if len(raw) < ENVELOPE_HEADER.size:
+        raise ValueError("Malformed envelope")
+    magic, version, alg_id, key_id, key_len, nonce_len = ENVELOPE_HEADER.unpack_from(raw)
+    if magic != ENVELOPE_MAGIC:
+        raise ValueError("Malformed envelope")
+    if version != ENVELOPE_V1:
+        raise ValueError(f"Unsupported envelope version: {version}")
+    if alg_id not in ENVELOPE_KEY_ALGS:
+        raise ValueError(f"Unsupported key algorithm id: {alg_id}")
+    bank_name = route_key_id(key_id, bank_name)
+
+    offset = ENVELOPE_HEADER.size
+    wrapped_key = raw[offset:offset + key_len]
+    nonce = raw[offset + key_len:offset + key_len + nonce_len]
+    ciphertext = raw[offset + key_len + nonce_len:]
+    if len(wrapped_key) != key_len or len(nonce) != nonce_len or not ciphertext:
+        raise ValueError("Malformed envelope")
+
+    _, privkey = load_bank_keys(bank_name)
+    aes_key = get_rsa_backend().decrypt(wrapped_key, privkey, ENVELOPE_KEY_ALGS[alg_id])
+    data = AESGCM(aes_key).decrypt(nonce, ciphertext, raw[:ENVELOPE_HEADER.size])
+    return bank_name, json.loads(data)
+
+
+# ------------------- Client Key Cache ------------------- #
+# Parsed client public keys per bank, keyed by the SHA-256 fingerprint stored
+# on the HDFC Customer. Size and TTL come from the bank's Bank Settings and are
+# re-read once per registry generation; a bank's cache is only rebuilt (and its
+# keys dropped) when they change, not on every generation bump.
+DEFAULT_CLIENT_KEY_CACHE_SIZE = 1024
+
+_client_keys = {}
+_client_keys_lock = threading.Lock()
+
+
+def get_public_key_fingerprint(client_pubkey) -> str:
+    """SHA-256 hex digest of the DER SubjectPublicKeyInfo of a public key (PEM or parsed)."""
+    if isinstance(client_pubkey, str):
+        client_pubkey = serialization.load_pem_public_key(client_pubkey.encode(), backend=default_backend())
+    der = client_pubkey.public_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return hashlib.sha256(der).hexdigest()
+
+
+def _client_key_cache(bank_name=None):
+    bank_name = bank_name or get_default_bank()
+    generation = get_generation()
+    entry = _client_keys.get(bank_name)
+    if entry and entry[0] == generation:
+        return entry[2]
+
+    settings = get_bank_settings(bank_name)
+    config = (settings.client_key_cache_size or DEFAULT_CLIENT_KEY_CACHE_SIZE, settings.client_key_cache_ttl)
+    with _client_keys_lock:
+        entry = _client_keys.get(bank_name)
+        cache = entry[2] if entry and entry[1] == config else LRUCache(*config)
+        _client_keys[bank_name] = (generation, config, cache)
+    return cache
+
+
+def cache_client_public_key(client_pubkey_pem: str, bank_name=None):
+    """Parse a client PEM, add it to the bank's cache and return (fingerprint, key)."""
+    pubkey = serialization.load_pem_public_key(client_pubkey_pem.encode(), backend=default_backend())
+    fingerprint = get_public_key_fingerprint(pubkey)
+    _client_key_cache(bank_name).set(fingerprint, pubkey)
+    return fingerprint, pubkey
+
+
+def get_customer_public_key(account_number: str):
+    """
+    Return the parsed public key registered for an HDFC Customer.
+    The PEM is only read and parsed when its fingerprint is not cached yet.
+    """
+    account = get_account(account_number)
+    bank_name = account and account.bank_name
+    fingerprint = account and account.client_key_fingerprint
+    if fingerprint:
+        pubkey = _client_key_cache(bank_name).get(fingerprint)
+        if pubkey is not None:
+            return pubkey
+
+    pem = frappe.db.get_value("HDFC Customer", account_number, "client_public_key")
+    if not pem:
+        frappe.throw(f"No client public key registered for account {account_number}")
+    return cache_client_public_key(pem, bank_name)[1]
+
+
+def get_client_key_cache_stats() -> dict:
+    """Counters of this worker's client key caches, summed over banks, with each bank's own."""
+    with _client_keys_lock:
+        banks = {bank_name: entry[2].stats() for bank_name, entry in _client_keys.items()}
+    totals = {key: sum(stats[key] for stats in banks.values()) for key in ("size", "hits", "misses", "evictions")}
+    return {**totals, "banks": banks}
+
+
+# ------------------- Session Keys ------------------- #
+# A session replaces the per-request RSA envelope with AES-256-GCM under a key
+# agreed once through establish_session. Messages are base64(nonce || ciphertext),
+# authenticated with "<session id>:<request|response>" as associated data so a
+# response can never be fed back as a request. Request nonces are remembered
+# for the session lifetime so a captured request cannot be replayed.
+SESSION_KEY_PREFIX = "bank_service:session:"
+DEFAULT_SESSION_TTL = 900
+
+
+def open_session(account_number: str, bank_name=None):
+    """Create a session for an account and return (session_id, session_key, ttl)."""
+    bank_name = bank_name or get_default_bank()
+    ttl = get_bank_settings(bank_name).session_ttl or DEFAULT_SESSION_TTL
+    session_id = frappe.generate_hash(length=32)
+    session_key = AESGCM.generate_key(bit_length=256)
+    get_store().set(
+        SESSION_KEY_PREFIX + session_id,
+        {"key": session_key, "account": account_number, "bank": bank_name, "ttl": ttl},
+        ttl=ttl,
+    )
+    return session_id, session_key, ttl
+
+
+def get_session(session_id: str):
+    """Return the stored session (with its id) or None if unknown or expired."""
+    if not session_id:
+        return None
+    session = get_store().get(SESSION_KEY_PREFIX + session_id)
+    if session:
+        session = {**session, "id": session_id}
+    return session
+
+
+def encrypt_with_session_key(session: dict, message: dict) -> str:
+    """Encrypt a server response under the session key."""
+    nonce = os.urandom(12)
+    aad = f"{session['id']}:response".encode()
+    ciphertext = AESGCM(session["key"]).encrypt(nonce, json.dumps(message).encode(), aad)
+    return base64.b64encode(nonce + ciphertext).decode()
+
+
+def decrypt_with_session_key(session: dict, encrypted_message: str) -> dict:
+    """Decrypt a client request under the session key, rejecting replays."""
+    raw = encrypted_message if isinstance(encrypted_message, bytes) else base64.b64decode(encrypted_message)
+    nonce, ciphertext = raw[:12], raw[12:]
+    aad = f"{session['id']}:request".encode()
+    data = AESGCM(session["key"]).decrypt(nonce, ciphertext, aad)
+
+    nonce_key = f"{SESSION_KEY_PREFIX}{session['id']}:nonce:{nonce.hex()}"
+    if not get_store().add(nonce_key, 1, ttl=session["ttl"]):
+        raise ValueError("Replayed session message")
     return json.loads(data.decode())
 
 
 # ------------------- Account Utilities ------------------- #
 def generate_account_number() -> str:
-    """Generate random 11 or 12 digit account number."""
-    length = random.choice([11, 12])
-    return str(random.randint(10**(length-1), 10**length-1))
+    """Allocate the next 11 digit account number (10 digit serial + Luhn check digit)."""
+    return get_allocator().allocate()
+
+
+PHONE_RE = re.compile(r"\d{10}")
+
+
+def is_valid_phone(phone: str) -> bool:
+    """True if phone is exactly 10 digits numeric."""
+    return bool(phone) and bool(PHONE_RE.fullmatch(phone))
 
 
 def validate_phone(phone: str):
     """Ensure phone is exactly 10 digits numeric."""
-    import re
     if not phone:
         frappe.throw("Phone number is required")
-    if not re.fullmatch(r"\d{10}", phone):
+    if not is_valid_phone(phone):
         frappe.throw("Invalid phone number. Must be exactly 10 digits")
 
 
@@ -0,0 +1,91 @@
+# -------------------- velocity.py -------------------- #
+"""
+Per-account velocity limits on make_transaction and make_transactions_batch.
+
+Bank Settings → Velocity Limits sets, per account type (or for every type),
+the most transfers and the largest total amount an account may initiate per
+minute, hour and day. Each window is a sliding window counter in the shared
+store (Redis, or the in-process LocalStore used by tests): the current fixed
+bucket plus the previous one weighted by its overlap with the window, so a
+check is one round trip of O(1) work however busy the account is, and no
+Transactions are read.
+
+The transfer is counted when it is checked, before any document is created,
+and refunded if it is then not recorded (an error, an idempotent replay).
+"""
+import math
+import time
+
+import frappe
+from frappe.utils import flt
+
+from bank_service.accounts import get_account
+from bank_service.banks import get_bank_settings, get_default_bank
+from bank_service.cache import get_store
+from bank_service.instrumentation import incr
+
+VELOCITY_KEY_PREFIX = "bank_service:velocity:"
+WINDOW_SECONDS = {"Minute": 60, "Hour": 60 * 60, "Day": 24 * 60 * 60}
+WINDOW_NAMES = {seconds: name for name, seconds in WINDOW_SECONDS.items()}
+# Amounts are counted in minor units (paise)
+AMOUNT_SCALE = 100
+
+
+class VelocityLimitExceeded(frappe.ValidationError):
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _lower(limit, other):
+    """The stricter of two limits, where 0 is no limit."""
+    return min(limit, other) if limit and other else limit or other
+
+
+def get_velocity_limits(account_type, bank_name=None) -> tuple:
+    """
+    ((seconds, max count, max amount in paise), ...) for an account type,
+    shortest window first; 0 means no limit. Rows for every type and for
+    this type combine, the lower limit winning.
+    """
+    windows = {}
+    for row in get_bank_settings(bank_name).get("velocity_limits") or ():
+        if row.get("account_type") and row["account_type"] != account_type:
+            continue
+        seconds = WINDOW_SECONDS[row["window"]]
+        count, amount = windows.get(seconds, (0, 0))
+        windows[seconds] = (
+            _lower(count, int(row.get("max_count") or 0)),
+            _lower(amount, round(flt(row.get("max_amount")) * AMOUNT_SCALE)),
+        )
+    return tuple((seconds, *windows[seconds]) for seconds in sorted(windows) if any(windows[seconds]))
+
+
+def charge_velocity(account_number: str, amount, bank_name=None):
+    """
+    Count a transfer of `amount` initiated by an account against its limits.
+    Returns the charge to pass to refund_velocity (None when no limit
+    applies); raises VelocityLimitExceeded when a window is full.
+    """
+    account = get_account(account_number)
+    bank_name = bank_name or get_default_bank()
+    windows = get_velocity_limits(account and account.account_type, bank_name)
+    if not windows:
+        return None
+
+    key = f"{VELOCITY_KEY_PREFIX}{bank_name}:{account_number}"
+    minor = round(flt(amount) * AMOUNT_SCALE)
+    at = time.time()
+    refused = get_store().charge_windows(key, windows, minor, at)
+    if refused:
+        index, wait = refused
+        window = WINDOW_NAMES[windows[index][0]].lower()
+        incr("velocity", {"window": window, "decision": "refused"})
+        raise VelocityLimitExceeded(f"Transfer limit per {window} reached", retry_after=max(1, math.ceil(wait)))
+    return frappe._dict(key=key, windows=windows, amount=minor, at=at)
+
+
+def refund_velocity(charge):
+    """Take back a charge whose transfer was not recorded."""
+    if charge:
+        get_store().refund_windows(charge.key, charge.windows, charge.amount, charge.at)
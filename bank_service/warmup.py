@@ -0,0 +1,74 @@
+# -------------------- warmup.py -------------------- #
+"""
+Worker warm-up.
+
+A fresh worker otherwise pays on its first banking request for importing the
+request path, reading and parsing each bank keypair, converting it for
+OpenSSL and building the key id index. With "bank_service_warmup": 1 in
+site_config.json, the first request a process serves for a site (of any
+kind) starts warm_up in a background thread, so that work is done before
+banking requests arrive instead of inside one. Everything warmed lives in
+the process, so every worker warms itself once.
+"""
+import threading
+
+import frappe
+
+_warmed = set()
+_lock = threading.Lock()
+
+
+def warm_up() -> dict:
+    """Preload the request path, bank keys and caches for the current site. Returns the banks loaded."""
+    import bank_service.api
+    from bank_service.banks import get_bank_names, get_bank_settings, resolve_bank
+    from bank_service.cache import get_store
+    from bank_service.utils import get_bank_key_id, get_rsa_backend, load_bank_keys
+
+    backend = get_rsa_backend()
+    banks = []
+    for bank_name in get_bank_names():
+        get_bank_settings(bank_name)
+        try:
+            _, privkey = load_bank_keys(bank_name)
+        except FileNotFoundError:
+            # Keys are generated by the bank's first create_bank_account, not here
+            continue
+        backend.load_key(privkey)
+        get_bank_key_id(bank_name)
+        banks.append(bank_name)
+
+    # Any key id builds this generation's index
+    resolve_bank(bytes(8))
+    get_store()
+    return {"banks": banks}
+
+
+def _warm_up_site(site, sites_path):
+    frappe.init(site=site, sites_path=sites_path)
+    try:
+        frappe.connect()
+        warm_up()
+    except Exception:
+        from bank_service.instrumentation import get_logger
+
+        get_logger().exception("Warm-up failed for %s", site)
+    finally:
+        frappe.destroy()
+
+
+def before_request():
+    """before_request hook: start warm_up once per process and site when enabled."""
+    site = frappe.local.site
+    if site in _warmed or not frappe.conf.get("bank_service_warmup"):
+        return
+    with _lock:
+        if site in _warmed:
+            return
+        _warmed.add(site)
+    threading.Thread(
+        target=_warm_up_site,
+        args=(site, frappe.local.sites_path),
+        name="bank_service-warmup",
+        daemon=True,
+    ).start()